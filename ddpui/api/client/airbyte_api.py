@@ -45,6 +45,7 @@ from ddpui.models.org import OrgPrefectBlock, OrgWarehouse, OrgDataFlow
 from ddpui.utils.ddp_logger import logger
 from ddpui.ddpairbyte import airbytehelpers
 from ddpui.utils import secretsmanager
+from ddpui.utils.helpers import map_concurrently
 
 
 airbyteapi = NinjaAPI(urls_namespace="airbyte")
@@ -269,11 +270,9 @@ def delete_airbyte_source(request, source_id):
 
     logger.info("fetched airbyte connections block of this org")
 
-    connections = airbyte_service.get_connections(orguser.org.airbyte_workspace_id)[
-        "connections"
-    ]
+    snapshot = airbytehelpers.AirbyteWorkspaceSnapshot(orguser.org.airbyte_workspace_id)
     connections_of_source = [
-        conn["connectionId"] for conn in connections if conn["sourceId"] == source_id
+        conn["connectionId"] for conn in snapshot.connections_of_source(source_id)
     ]
 
     # delete the connection prefect blocks that has connections
@@ -309,14 +308,14 @@ def delete_airbyte_source(request, source_id):
 
 
 @airbyteapi.get("/sources/{source_id}/schema_catalog", auth=auth.CanManagePipelines())
-def get_airbyte_source_schema_catalog(request, source_id):
+def get_airbyte_source_schema_catalog(request, source_id, force_refresh: bool = False):
     """Fetch schema catalog for a source in the user organization workspace"""
     orguser = request.orguser
     if orguser.org.airbyte_workspace_id is None:
         raise HttpError(400, "create an airbyte workspace first")
 
     res = airbyte_service.get_source_schema_catalog(
-        orguser.org.airbyte_workspace_id, source_id
+        orguser.org.airbyte_workspace_id, source_id, force_refresh=force_refresh
     )
     logger.debug(res)
     return res
@@ -505,54 +504,70 @@ def get_airbyte_connections(request):
     if orguser.org.airbyte_workspace_id is None:
         raise HttpError(400, "create an airbyte workspace first")
 
-    org_prefect_blocks = OrgPrefectBlock.objects.filter(
-        org=orguser.org,
-        block_type=AIRBYTECONNECTION,
-    ).all()
-
-    res = []
-
-    for org_block in org_prefect_blocks:
-        # fetch prefect block
-        prefect_block = prefect_service.get_airbyte_connection_block_by_id(
-            org_block.block_id
-        )
-        # fetch airbyte connection
-        airbyte_conn = airbyte_service.get_connection(
-            orguser.org.airbyte_workspace_id, prefect_block["data"]["connection_id"]
+    org_prefect_blocks = list(
+        OrgPrefectBlock.objects.filter(
+            org=orguser.org,
+            block_type=AIRBYTECONNECTION,
+        ).all()
+    )
+    dataflows = {
+        dataflow.connection_id: dataflow
+        for dataflow in OrgDataFlow.objects.filter(
+            org=orguser.org, connection_id__isnull=False
         )
-        dataflow = OrgDataFlow.objects.filter(
-            org=orguser.org, connection_id=airbyte_conn["connectionId"]
-        ).first()
+    }
+    snapshot = airbytehelpers.build_workspace_snapshot(orguser.org.airbyte_workspace_id)
+
+    # blocks saved before OrgPrefectBlock.connection_id existed, which the
+    # migration could not fill in, are looked up in prefect this one time
+    missing = [block for block in org_prefect_blocks if block.connection_id is None]
+
+    def lookup(key):
+        """fetch a prefect connection block or the last flow run of a deployment"""
+        lookup_type, lookup_id = key
+        if lookup_type == "block":
+            return prefect_service.get_airbyte_connection_block_by_id(lookup_id)
+        return prefect_service.get_last_flow_run_by_deployment_id(lookup_id)
+
+    lookup_keys = [("block", org_block.block_id) for org_block in missing]
+    lookup_keys += [
+        ("lastRun", dataflow.deployment_id) for dataflow in dataflows.values()
+    ]
+    lookup_keys = list(dict.fromkeys(lookup_keys))
+    lookups = dict(zip(lookup_keys, map_concurrently(lookup, lookup_keys)))
 
-        # fetch the source and destination names
-        source_name = airbyte_service.get_source(
-            orguser.org.airbyte_workspace_id, airbyte_conn["sourceId"]
-        )["sourceName"]
+    for org_block in missing:
+        prefect_block = lookups[("block", org_block.block_id)]
+        org_block.connection_id = prefect_block["data"]["connection_id"]
+    OrgPrefectBlock.objects.bulk_update(missing, ["connection_id"])
 
-        destination_name = airbyte_service.get_destination(
-            orguser.org.airbyte_workspace_id, airbyte_conn["destinationId"]
-        )["destinationName"]
+    res = []
 
+    for org_block in org_prefect_blocks:
+        airbyte_conn = snapshot.get_connection(org_block.connection_id)
+        dataflow = dataflows.get(airbyte_conn["connectionId"])
         res.append(
             {
                 "name": org_block.display_name,
                 "blockId": org_block.block_id,
-                "blockName": prefect_block["name"],
-                "blockData": prefect_block["data"],
+                "blockName": org_block.block_name,
+                "blockData": {"connection_id": org_block.connection_id},
                 "connectionId": airbyte_conn["connectionId"],
-                "source": {"id": airbyte_conn["sourceId"], "name": source_name},
+                "source": {
+                    "id": airbyte_conn["sourceId"],
+                    "name": snapshot.get_source(airbyte_conn["sourceId"])["sourceName"],
+                },
                 "destination": {
                     "id": airbyte_conn["destinationId"],
-                    "name": destination_name,
+                    "name": snapshot.get_destination(airbyte_conn["destinationId"])[
+                        "destinationName"
+                    ],
                 },
                 "sourceCatalogId": airbyte_conn["sourceCatalogId"],
                 "syncCatalog": airbyte_conn["syncCatalog"],
                 "status": airbyte_conn["status"],
                 "deploymentId": dataflow.deployment_id if dataflow else None,
-                "lastRun": prefect_service.get_last_flow_run_by_deployment_id(
-                    dataflow.deployment_id
-                )
+                "lastRun": lookups[("lastRun", dataflow.deployment_id)]
                 if dataflow
                 else None,
             }
@@ -577,35 +592,31 @@ def get_airbyte_connection(request, connection_block_id):
         org=orguser.org,
         block_id=connection_block_id,
     ).first()
+    if org_block is None:
+        raise HttpError(400, "connection block not found")
 
-    # fetch prefect block
-    # todo add a "connection_id" column to OrgPrefectBlock,
-    # and fetch connection details from airbyte
-    prefect_block = prefect_service.get_airbyte_connection_block_by_id(
-        connection_block_id
-    )
-    # fetch airbyte connection
-    airbyte_conn = airbyte_service.get_connection(
-        orguser.org.airbyte_workspace_id, prefect_block["data"]["connection_id"]
-    )
+    connection_id = airbytehelpers.get_connection_id(org_block)
+    if connection_id is None:
+        raise HttpError(500, "connection is missing from the block")
+
+    # fetch airbyte connection, source and destination
+    snapshot = airbytehelpers.build_workspace_snapshot(orguser.org.airbyte_workspace_id)
+    airbyte_conn = snapshot.get_connection(connection_id)
     dataflow = OrgDataFlow.objects.filter(
         org=orguser.org, connection_id=airbyte_conn["connectionId"]
     ).first()
 
-    # fetch the source and destination names
-    source_name = airbyte_service.get_source(
-        orguser.org.airbyte_workspace_id, airbyte_conn["sourceId"]
-    )["sourceName"]
-
-    destination_name = airbyte_service.get_destination(
-        orguser.org.airbyte_workspace_id, airbyte_conn["destinationId"]
-    )["destinationName"]
+    # the source and destination names
+    source_name = snapshot.get_source(airbyte_conn["sourceId"])["sourceName"]
+    destination_name = snapshot.get_destination(airbyte_conn["destinationId"])[
+        "destinationName"
+    ]
 
     res = {
         "name": org_block.display_name,
-        "blockId": prefect_block["id"],
-        "blockName": prefect_block["name"],
-        "blockData": prefect_block["data"],
+        "blockId": org_block.block_id,
+        "blockName": org_block.block_name,
+        "blockData": {"connection_id": connection_id},
         "connectionId": airbyte_conn["connectionId"],
         "source": {"id": airbyte_conn["sourceId"], "name": source_name},
         "destination": {"id": airbyte_conn["destinationId"], "name": destination_name},
@@ -670,45 +681,30 @@ def post_airbyte_connection(request, payload: AirbyteConnectionCreate):
     connection_name = f"{source_name}-{destination_name}"
     base_block_name = f"{org.slug}-{slugify(connection_name)}"
 
-    # fetch all prefect blocks are being fetched for a particular type
-    prefect_airbyte_connection_block_names = []
-    for orgprefectblock in OrgPrefectBlock.objects.filter(
-        org=org, block_type=AIRBYTECONNECTION
-    ):
-        block = prefect_service.get_airbyte_connection_block_by_id(
-            orgprefectblock.block_id
-        )
-        prefect_airbyte_connection_block_names.append(block["name"])
-
     display_name = payload.name
-    block_name = base_block_name
-    name_index = 0
-    while block_name in prefect_airbyte_connection_block_names:
-        name_index += 1
-        block_name = base_block_name + f"-{name_index}"
-
-    airbyte_connection_block_id = prefect_service.create_airbyte_connection_block(
-        prefect_service.PrefectAirbyteConnectionSetup(
-            serverBlockName=org_airbyte_server_block.block_name,
-            connectionBlockName=block_name,
-            connectionId=airbyte_conn["connectionId"],
-        )
-    )
-    airbyte_connection_block = prefect_service.get_airbyte_connection_block_by_id(
-        airbyte_connection_block_id
-    )
 
-    logger.info(airbyte_connection_block)
+    def create_block(block_name: str) -> dict:
+        airbyte_connection_block_id = prefect_service.create_airbyte_connection_block(
+            prefect_service.PrefectAirbyteConnectionSetup(
+                serverBlockName=org_airbyte_server_block.block_name,
+                connectionBlockName=block_name,
+                connectionId=airbyte_conn["connectionId"],
+            )
+        )
+        return prefect_service.get_airbyte_connection_block_by_id(
+            airbyte_connection_block_id
+        )
 
     # create a prefect AirbyteConnection block
-    connection_block = OrgPrefectBlock(
-        org=org,
-        block_type=AIRBYTECONNECTION,
-        block_id=airbyte_connection_block["id"],
-        block_name=airbyte_connection_block["name"],
+    _, airbyte_connection_block = airbytehelpers.create_named_block(
+        org,
+        AIRBYTECONNECTION,
+        base_block_name,
+        create_block,
         display_name=display_name,
+        connection_id=airbyte_conn["connectionId"],
     )
-    connection_block.save()
+    logger.info(airbyte_connection_block)
 
     # use the actual blockname, which may differ from what we constructed above
     block_name = airbyte_connection_block["name"]
@@ -777,19 +773,10 @@ def post_airbyte_connection_reset(request, connection_block_id):
     if org_prefect_block is None:
         raise HttpError(400, "connection block not found")
 
-    # prefect block
-    airbyte_connection_block = prefect_service.get_airbyte_connection_block_by_id(
-        connection_block_id
-    )
-
-    if (
-        "data" not in airbyte_connection_block
-        or "connection_id" not in airbyte_connection_block["data"]
-    ):
+    connection_id = airbytehelpers.get_connection_id(org_prefect_block)
+    if connection_id is None:
         raise HttpError(500, "connection is missing from the block")
 
-    connection_id = airbyte_connection_block["data"]["connection_id"]
-
     airbyte_service.reset_connection(connection_id)
 
     return {"success": 1}
@@ -826,19 +813,10 @@ def put_airbyte_connection(
         raise HttpError(400, "warehouse has no airbyte_destination_id")
     payload.destinationId = warehouse.airbyte_destination_id
 
-    # prefect block
-    airbyte_connection_block = prefect_service.get_airbyte_connection_block_by_id(
-        connection_block_id
-    )
-
-    if (
-        "data" not in airbyte_connection_block
-        or "connection_id" not in airbyte_connection_block["data"]
-    ):
+    connection_id = airbytehelpers.get_connection_id(org_prefect_block)
+    if connection_id is None:
         raise HttpError(500, "connection if missing from the block")
 
-    connection_id = airbyte_connection_block["data"]["connection_id"]
-
     # fetch connection by id from airbyte
     connection = airbyte_service.get_connection(org.airbyte_workspace_id, connection_id)
 
@@ -884,15 +862,19 @@ def delete_airbyte_connection(request, connection_block_id):
     if org.airbyte_workspace_id is None:
         raise HttpError(400, "create an airbyte workspace first")
 
-    prefect_block = prefect_service.get_airbyte_connection_block_by_id(
-        connection_block_id
-    )
+    org_airbyte_connection_block = OrgPrefectBlock.objects.filter(
+        org=org, block_id=connection_block_id
+    ).first()
+    if org_airbyte_connection_block is None:
+        raise HttpError(400, "connection block not found")
+
+    connection_id = airbytehelpers.get_connection_id(org_airbyte_connection_block)
+    if connection_id is None:
+        raise HttpError(500, "connection is missing from the block")
 
     # delete airbyte connection
     logger.info("deleting airbyte connection")
-    airbyte_service.delete_connection(
-        org.airbyte_workspace_id, prefect_block["data"]["connection_id"]
-    )
+    airbyte_service.delete_connection(org.airbyte_workspace_id, connection_id)
 
     # delete prefect block
     logger.info("deleting prefect block")
@@ -900,9 +882,6 @@ def delete_airbyte_connection(request, connection_block_id):
 
     # delete the org prefect airbyteconnection block
     logger.info("deleting org prefect block")
-    org_airbyte_connection_block = OrgPrefectBlock.objects.filter(
-        org=org, block_id=connection_block_id
-    )
     org_airbyte_connection_block.delete()
     return {"success": 1}
 
@@ -7,6 +7,7 @@ from pydantic.error_wrappers import ValidationError as PydanticValidationError
 # dependencies
 from ddpui.ddpprefect import prefect_service
 from ddpui import auth
+from ddpui.utils.helpers import map_concurrently
 
 # models
 from ddpui.models.org import OrgDataFlow
@@ -53,23 +54,28 @@ def get_dashboard(request):
     if orguser.org is None:
         raise HttpError(400, "register an organization first")
 
-    org_data_flows = (
+    org_data_flows = list(
         OrgDataFlow.objects.filter(org=orguser.org).exclude(cron=None).all()
     )
 
+    # fetch the 50 latest flow runs for each flow
+    flow_runs = map_concurrently(
+        lambda flow: prefect_service.get_recent_flow_runs_by_deployment_id(
+            flow.deployment_id, 50
+        ),
+        org_data_flows,
+    )
+
     res = []
 
-    # fetch 50 (default limit) flow runs for each flow
-    for flow in org_data_flows:
+    for flow, runs in zip(org_data_flows, flow_runs):
         res.append(
             {
                 "name": flow.name,
                 "deploymentId": flow.deployment_id,
                 "cron": flow.cron,
                 "deploymentName": flow.deployment_name,
-                "runs": prefect_service.get_flow_runs_by_deployment_id(
-                    flow.deployment_id, 50
-                ),
+                "runs": runs,
             }
         )
 
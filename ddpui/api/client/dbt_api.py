@@ -11,8 +11,7 @@ from pydantic.error_wrappers import ValidationError as PydanticValidationError
 from ddpui import auth
 from ddpui.ddpprefect.schema import OrgDbtSchema
 from ddpui.models.org_user import OrgUserResponse
-from ddpui.utils.helpers import runcmd
-from ddpui.celeryworkers.tasks import setup_dbtworkspace
+from ddpui.celeryworkers.tasks import setup_dbtworkspace, git_pull_dbtrepo
 from ddpui.ddpprefect import prefect_service
 from ddpui.ddpprefect import DBTCORE
 from ddpui.ddpdbt import dbt_service
@@ -93,7 +92,10 @@ def get_dbt_workspace(request):
 
 @dbtapi.post("/git_pull/", auth=auth.CanManagePipelines())
 def post_dbt_git_pull(request):
-    """Pull the dbt repo from github for the organization"""
+    """
+    Pull the dbt repo from github for the organization, in a celery task
+    whose progress can be followed at /api/tasks/{task_id}
+    """
     orguser = request.orguser
     if orguser.org.dbt is None:
         raise HttpError(400, "dbt is not configured for this client")
@@ -102,11 +104,6 @@ def post_dbt_git_pull(request):
     if not os.path.exists(project_dir):
         raise HttpError(400, "create the dbt env first")
 
-    try:
-        runcmd("git pull", project_dir / "dbtrepo")
-    except Exception as error:
-        raise HttpError(
-            500, f"git pull failed in {str(project_dir / 'dbtrepo')}"
-        ) from error
+    task = git_pull_dbtrepo.delay(orguser.org.id)
 
-    return {"success": True}
+    return {"task_id": task.id}
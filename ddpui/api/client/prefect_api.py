@@ -1,6 +1,6 @@
 import os
 from pathlib import Path
-from datetime import datetime
+from datetime import datetime, timedelta
 
 from ninja import NinjaAPI
 from ninja.errors import HttpError
@@ -8,6 +8,7 @@ from ninja.errors import HttpError
 from ninja.errors import ValidationError
 from ninja.responses import Response
 from pydantic.error_wrappers import ValidationError as PydanticValidationError
+from django.db import transaction
 from django.utils.text import slugify
 
 from ddpui import auth
@@ -29,6 +30,7 @@ from ddpui.ddpprefect.schema import (
 from ddpui.utils.ddp_logger import logger
 from ddpui.utils import secretsmanager
 from ddpui.utils import timezone
+from ddpui.utils.helpers import map_concurrently
 
 prefectapi = NinjaAPI(urls_namespace="prefect")
 # http://127.0.0.1:8000/api/docs
@@ -162,6 +164,8 @@ def get_prefect_dataflows(request):
             else False
         )
 
+    last_runs = prefect_service.get_last_flow_runs_by_deployment_ids(deployment_ids)
+
     res = []
 
     for flow in org_data_flows:
@@ -171,9 +175,7 @@ def get_prefect_dataflows(request):
                 "deploymentId": flow.deployment_id,
                 "cron": flow.cron,
                 "deploymentName": flow.deployment_name,
-                "lastRun": prefect_service.get_last_flow_run_by_deployment_id(
-                    flow.deployment_id
-                ),
+                "lastRun": last_runs.get(flow.deployment_id),
                 "status": is_deployment_active[flow.deployment_id]
                 if flow.deployment_id in is_deployment_active
                 else False,
@@ -324,6 +326,27 @@ def post_prefect_dbt_core_run_flow(
     return result
 
 
+def delete_unrecorded_dbt_core_blocks(deployment_id: str, block_ids: list) -> None:
+    """
+    deletes dbt core blocks, and their deployment, which could not be saved,
+    so that prefect has nothing we have no record of. a deployment we already
+    had a record of was only updated and is kept. failures are logged, so that
+    the caller can raise the error which led here
+    """
+    if (
+        deployment_id is not None
+        and not OrgDataFlow.objects.filter(deployment_id=deployment_id).exists()
+    ):
+        try:
+            prefect_service.delete_deployment_by_id(deployment_id)
+        except Exception as error:  # skipcq PYL-W0703
+            logger.exception(error)
+    try:
+        prefect_service.post_prefect_blocks_bulk_delete(block_ids)
+    except Exception as error:  # skipcq PYL-W0703
+        logger.exception(error)
+
+
 @prefectapi.post("/blocks/dbt/", auth=auth.CanManagePipelines())
 def post_prefect_dbt_core_block(request, payload: PrefectDbtRun):
     """Create five prefect dbt core blocks:
@@ -365,81 +388,89 @@ def post_prefect_dbt_core_block(request, payload: PrefectDbtRun):
         if destination.get("connectionConfiguration"):
             bqlocation = destination["connectionConfiguration"]["dataset_location"]
 
-    block_names = []
-    for sequence_number, command in enumerate(
-        ["clean", "deps", "run", "test", "docs generate"]
-    ):
+    commands = ["clean", "deps", "run", "test", "docs generate"]
+    block_data = []
+    for command in commands:
         block_name = (
             f"{orguser.org.slug}-"
             f"{slugify(payload.profile.name)}-"
             f"{slugify(target)}-"
             f"{slugify(command)}"
         )
-        block_data = PrefectDbtCoreSetup(
-            block_name=block_name,
-            profiles_dir=f"{project_dir}/profiles/",
-            project_dir=project_dir,
-            working_dir=project_dir,
-            env={},
-            commands=[f"{dbt_binary} {command} --target {target}"],
+        block_data.append(
+            PrefectDbtCoreSetup(
+                block_name=block_name,
+                profiles_dir=f"{project_dir}/profiles/",
+                project_dir=project_dir,
+                working_dir=project_dir,
+                env={},
+                commands=[f"{dbt_binary} {command} --target {target}"],
+            )
         )
 
-        try:
-            block_response = prefect_service.create_dbt_core_block(
-                block_data,
-                payload.profile,
-                target,
-                warehouse.wtype,
-                credentials,
-                bqlocation,
-            )
-        except Exception as error:
-            logger.exception(error)
-            raise HttpError(400, str(error)) from error
+    try:
+        block_responses = prefect_service.create_dbt_core_blocks(
+            block_data,
+            payload.profile,
+            target,
+            warehouse.wtype,
+            credentials,
+            bqlocation,
+        )
+    except Exception as error:
+        logger.exception(error)
+        raise HttpError(400, str(error)) from error
 
-        coreprefectblock = OrgPrefectBlock(
+    coreprefectblocks = [
+        OrgPrefectBlock(
             org=orguser.org,
             block_type=DBTCORE,
             block_id=block_response["block_id"],
             block_name=block_response["block_name"],
-            display_name=block_name,
+            display_name=block_data[sequence_number].block_name,
             seq=sequence_number,
             command=slugify(command),
             dbt_target_schema=target,
         )
+        for sequence_number, (command, block_response) in enumerate(
+            zip(commands, block_responses)
+        )
+    ]
+    # cleaned names from the prefect-proxy
+    block_names = [block_response["block_name"] for block_response in block_responses]
 
-        # cleaned name from the prefect-proxy
-        block_name = block_response["block_name"]
-
-        # for the command dbt run create a deployment
-        if command == "run":
-            # create deployment
-            dataflow = prefect_service.create_dataflow(
-                PrefectDataFlowCreateSchema2(
-                    deployment_name=f"manual-run-{block_name}",
-                    flow_name=f"manual-run-{block_name}",
-                    orgslug=orguser.org.slug,
-                    connection_blocks=[],
-                    dbt_blocks=[{"blockName": block_name, "seq": 0}],
-                )
+    # for the command dbt run create a deployment
+    run_block_name = block_names[commands.index("run")]
+    deployment_id = None
+    try:
+        dataflow = prefect_service.create_dataflow(
+            PrefectDataFlowCreateSchema2(
+                deployment_name=f"manual-run-{run_block_name}",
+                flow_name=f"manual-run-{run_block_name}",
+                orgslug=orguser.org.slug,
+                connection_blocks=[],
+                dbt_blocks=[{"blockName": run_block_name, "seq": 0}],
             )
+        )
+        deployment_id = dataflow["deployment"]["id"]
 
-            # store deployment record in django db
-            existing_dataflow = OrgDataFlow.objects.filter(
-                deployment_id=dataflow["deployment"]["id"]
-            ).first()
-            if existing_dataflow:
-                existing_dataflow.delete()
-
+        # store the blocks and the deployment record in django db together
+        with transaction.atomic():
+            OrgDataFlow.objects.filter(deployment_id=deployment_id).delete()
+            OrgPrefectBlock.objects.bulk_create(coreprefectblocks)
             OrgDataFlow.objects.create(
                 org=orguser.org,
-                name=f"manual-run-{block_name}",
+                name=f"manual-run-{run_block_name}",
                 deployment_name=dataflow["deployment"]["name"],
-                deployment_id=dataflow["deployment"]["id"],
+                deployment_id=deployment_id,
             )
-
-        coreprefectblock.save()
-        block_names.append(block_name)
+    except Exception as error:
+        logger.exception(error)
+        delete_unrecorded_dbt_core_blocks(
+            deployment_id,
+            [block_response["block_id"] for block_response in block_responses],
+        )
+        raise HttpError(400, str(error)) from error
 
     return {"success": 1, "block_names": block_names}
 
@@ -548,18 +579,91 @@ def get_flow_run_by_id(request, flow_run_id):
     return flow_run
 
 
+def add_flow_run_logs(flow_runs: list) -> None:
+    """
+    fetches the logs of a list of flow runs concurrently. the proxy only
+    lists finished runs, so their logs are cached
+    """
+    logs_dicts = map_concurrently(
+        lambda flow_run: prefect_service.get_flow_run_logs(
+            flow_run["id"], 0, finished=True
+        ),
+        flow_runs,
+    )
+    for flow_run, logs_dict in zip(flow_runs, logs_dicts):
+        flow_run["logs"] = (
+            logs_dict["logs"]["logs"] if "logs" in logs_dict["logs"] else []
+        )
+
+
 @prefectapi.get(
     "/flows/{deployment_id}/flow_runs/history", auth=auth.CanManagePipelines()
 )
-def get_prefect_flow_runs_log_history(request, deployment_id):
+def get_prefect_flow_runs_log_history(
+    request,
+    deployment_id,
+    limit: int = None,
+    cursor: str = None,
+    logs: bool = False,
+):
     # pylint: disable=unused-argument
-    """Fetch all flow runs for the deployment and the logs for each flow run"""
-    flow_runs = prefect_service.get_flow_runs_by_deployment_id(deployment_id, limit=0)
+    """
+    Fetch a page of the flow runs of a deployment, newest first, as
+    {"flow_runs": [...], "next_cursor": ...}. pass next_cursor back to fetch
+    the next page. the logs of each run are fetched from
+    /flow_runs/{flow_run_id}/logs, or included if logs=true
 
-    for flow_run in flow_runs:
-        logs_dict = prefect_service.get_flow_run_logs(flow_run["id"], 0)
-        flow_run["logs"] = (
-            logs_dict["logs"]["logs"] if "logs" in logs_dict["logs"] else []
+    without a limit or a cursor this returns every flow run with its logs as a
+    bare list, as it always has
+    """
+    if limit is None and cursor is None:
+        flow_runs = prefect_service.get_flow_runs_by_deployment_id(
+            deployment_id, limit=0
         )
-
-    return flow_runs
+        add_flow_run_logs(flow_runs)
+        return flow_runs
+
+    if limit is None:
+        limit = 10
+    if limit < 1 or limit > 100:
+        raise HttpError(400, "limit must be between 1 and 100")
+
+    # the cursor is the start time of the last run returned, followed by the
+    # ids of the runs returned which started at that time, so that runs
+    # starting at the same time are neither skipped nor repeated
+    start_time_lt = None
+    seen_ids = []
+    if cursor:
+        cursor_time, *seen_ids = cursor.split(",")
+        try:
+            start_time_lt = (
+                datetime.fromisoformat(cursor_time) + timedelta(microseconds=1)
+            ).isoformat()
+        except ValueError as error:
+            raise HttpError(400, "invalid cursor") from error
+
+    flow_runs = prefect_service.get_flow_runs_by_deployment_id(
+        deployment_id, limit=limit + len(seen_ids), start_time_lt=start_time_lt
+    )
+    has_more = len(flow_runs) == limit + len(seen_ids)
+    flow_runs = [flow_run for flow_run in flow_runs if flow_run["id"] not in seen_ids]
+    flow_runs = flow_runs[:limit]
+
+    if logs:
+        add_flow_run_logs(flow_runs)
+
+    next_cursor = None
+    if has_more and len(flow_runs) > 0:
+        last_start_time = flow_runs[-1]["startTime"]
+        if cursor and last_start_time == cursor_time:
+            next_ids = seen_ids
+        else:
+            next_ids = []
+        next_ids = next_ids + [
+            flow_run["id"]
+            for flow_run in flow_runs
+            if flow_run["startTime"] == last_start_time
+        ]
+        next_cursor = ",".join([last_start_time] + next_ids)
+
+    return {"flow_runs": flow_runs, "next_cursor": next_cursor}
@@ -1,14 +1,38 @@
+import os
 from ninja import NinjaAPI
 from ninja.errors import HttpError
 from ddpui.utils.taskprogress import TaskProgress
 
 taskapi = NinjaAPI(urls_namespace="tasks")
 
+# long polls hold a server thread, see start.sh
+TASK_PROGRESS_MAX_WAIT = int(os.getenv("TASK_PROGRESS_MAX_WAIT", "30"))
+
 
 @taskapi.get('/{task_id}')
-def get_task(request, task_id): # pylint: disable=unused-argument
-    """returns the progress for a celery task"""
-    result = TaskProgress.fetch(task_id)
-    if result:
-        return {"progress": result}
-    raise HttpError(400, "no such task id")
+def get_task(request, task_id, since: str = None): # pylint: disable=unused-argument
+    """
+    returns the progress for a celery task after the step `since`, along with
+    the value of `since` to poll with next. without since, every step is returned
+    """
+    result = TaskProgress.read(task_id, since)
+    if result is None:
+        raise HttpError(400, "no such task id")
+    return result
+
+
+@taskapi.get('/{task_id}/wait')
+def wait_for_task(request, task_id, since: str = None, timeout: int = 25): # pylint: disable=unused-argument
+    """
+    long-polls for the progress of a celery task: like GET /{task_id}, but
+    if there are no steps after `since` the response is held for up to
+    `timeout` seconds until there are
+    """
+    if timeout < 1 or timeout > TASK_PROGRESS_MAX_WAIT:
+        raise HttpError(
+            400, f"timeout must be between 1 and {TASK_PROGRESS_MAX_WAIT} seconds"
+        )
+    result = TaskProgress.wait(task_id, since, timeout)
+    if result is None:
+        raise HttpError(400, "no such task id")
+    return result
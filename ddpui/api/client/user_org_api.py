@@ -47,6 +47,7 @@ from ddpui.utils.timezone import IST
 from ddpui.utils import secretsmanager
 from ddpui.utils import sendgrid
 from ddpui.utils import helpers
+from ddpui.celeryworkers.tasks import send_template_emails
 
 user_org_api = NinjaAPI(urls_namespace="userorg")
 # http://127.0.0.1:8000/api/docs
@@ -132,7 +133,7 @@ def post_organization_user(
     FRONTEND_URL = os.getenv("FRONTEND_URL")
     reset_url = f"{FRONTEND_URL}/verifyemail/?token={token.hex}"
     try:
-        sendgrid.send_signup_email(payload.email, reset_url)
+        send_template_emails.delay(*sendgrid.signup_email(payload.email, reset_url))
     except Exception as error:
         raise HttpError(400, "failed to send email") from error
     return OrgUserResponse.from_orguser(orguser)
@@ -319,12 +320,11 @@ def delete_organization_warehouses(request):
 
     logger.info("FINISHED Deleting prefect connection blocks")
 
+    snapshot = airbytehelpers.AirbyteWorkspaceSnapshot(orguser.org.airbyte_workspace_id)
+
     # delete airbyte connections
     logger.info("Deleting airbyte connections")
-    for connection in airbyte_service.get_connections(orguser.org.airbyte_workspace_id)[
-        "connections"
-    ]:
-        connection_id = connection["connectionId"]
+    for connection_id in snapshot.connections:
         airbyte_service.delete_connection(
             orguser.org.airbyte_workspace_id, connection_id
         )
@@ -334,10 +334,7 @@ def delete_organization_warehouses(request):
 
     # delete airbyte destinations
     logger.info("Deleting airbyte destinations")
-    for destination in airbyte_service.get_destinations(
-        orguser.org.airbyte_workspace_id
-    )["destinations"]:
-        destination_id = destination["destinationId"]
+    for destination_id in snapshot.destinations:
         airbyte_service.delete_destination(
             orguser.org.airbyte_workspace_id, destination_id
         )
@@ -408,6 +405,25 @@ def post_organization_user_invite(request, payload: InvitationSchema):
         invite_code=payload.invite_code,
     )
     logger.info("created Invitation")
+
+    FRONTEND_URL = os.getenv("FRONTEND_URL")
+    invite_url = f"{FRONTEND_URL}/invitations/?invite_code={payload.invite_code}"
+    template_id, recipients = sendgrid.invite_user_emails(
+        [
+            {
+                "to_email": payload.invited_email,
+                "invited_by": orguser.user.email,
+                "invite_url": invite_url,
+            }
+        ]
+    )
+    if template_id is None:
+        logger.info("SENDGRID_INVITE_USERS_TEMPLATE is not set, not sending invites")
+        return payload
+    try:
+        send_template_emails.delay(template_id, recipients)
+    except Exception as error:
+        raise HttpError(400, "failed to send email") from error
     return payload
 
 
@@ -486,7 +502,9 @@ def post_forgot_password(
     FRONTEND_URL = os.getenv("FRONTEND_URL")
     reset_url = f"{FRONTEND_URL}/resetpassword/?token={token.hex}"
     try:
-        sendgrid.send_password_reset_email(payload.email, reset_url)
+        send_template_emails.delay(
+            *sendgrid.password_reset_email(payload.email, reset_url)
+        )
     except Exception as error:
         raise HttpError(400, "failed to send email") from error
 
@@ -0,0 +1,11 @@
+from django.apps import AppConfig
+
+
+class DdpuiConfig(AppConfig):
+    """the ddpui django app"""
+
+    name = "ddpui"
+
+    def ready(self):
+        # connects the signal receivers which keep the auth cache up to date
+        from ddpui import auth  # pylint: disable=import-outside-toplevel,unused-import
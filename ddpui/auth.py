@@ -1,6 +1,17 @@
+import os
+import json
+import hashlib
+import threading
+import time
+
 from ninja.security import HttpBearer
 from ninja.errors import HttpError
+from redis.exceptions import RedisError
 
+from django.contrib.auth.models import User
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils.functional import SimpleLazyObject
 from rest_framework.authentication import TokenAuthentication
 from rest_framework.authtoken.models import Token
 
@@ -8,9 +19,112 @@ from ddpui.models.org_user import OrgUser
 from ddpui.models.admin_user import AdminUser
 
 from ddpui.models.org_user import OrgUserRole
+from ddpui.utils.ddp_logger import logger
+from ddpui.utils.redis_client import RedisClient
 
 UNAUTHORIZED = "unauthorized"
 
+# how long a resolved token is cached in redis, and in each process. the
+# process-local copy is not invalidated by other processes, so keep it short
+AUTH_CACHE_TTL = int(os.getenv("AUTH_CACHE_TTL", "3600"))
+AUTH_CACHE_LOCAL_TTL = int(os.getenv("AUTH_CACHE_LOCAL_TTL", "5"))
+AUTH_CACHE_KINDS = ["orguser", "adminuser"]
+
+_local_auth_cache = {}
+_local_auth_cache_lock = threading.Lock()
+
+
+def auth_cache_key(kind: str, token: str) -> str:
+    """the cache key for a token, which holds a digest of it and not the token"""
+    digest = hashlib.sha256(token.encode("utf-8")).hexdigest()
+    return f"auth:{kind}:{digest}"
+
+
+def get_cached_auth(kind: str, token: str) -> dict | None:
+    """
+    returns the ids and role resolved from an auth token by an earlier
+    request, or None. the rows themselves are never cached, so that views
+    always load and save current ones
+    """
+    rediskey = auth_cache_key(kind, token)
+    with _local_auth_cache_lock:
+        entry = _local_auth_cache.get(rediskey)
+    if entry is not None and entry[0] > time.monotonic():
+        return json.loads(entry[1])
+
+    try:
+        cached = RedisClient.get_instance().get(rediskey)
+    except RedisError as error:
+        logger.warning("auth cache unavailable: %s", error)
+        return None
+    if cached is None:
+        return None
+    with _local_auth_cache_lock:
+        _local_auth_cache[rediskey] = (time.monotonic() + AUTH_CACHE_LOCAL_TTL, cached)
+    return json.loads(cached)
+
+
+def cache_auth(kind: str, token: str, resolved: dict) -> None:
+    """caches the ids and role resolved from an auth token"""
+    rediskey = auth_cache_key(kind, token)
+    cached = json.dumps(resolved)
+    now = time.monotonic()
+    with _local_auth_cache_lock:
+        for key in [key for key, entry in _local_auth_cache.items() if entry[0] <= now]:
+            del _local_auth_cache[key]
+        _local_auth_cache[rediskey] = (now + AUTH_CACHE_LOCAL_TTL, cached)
+    try:
+        RedisClient.get_instance().set(rediskey, cached, ex=AUTH_CACHE_TTL)
+    except RedisError as error:
+        logger.warning("auth cache unavailable: %s", error)
+
+
+def invalidate_auth_tokens(tokens: list) -> None:
+    """drops whatever was cached for these auth tokens"""
+    rediskeys = [
+        auth_cache_key(kind, token) for token in tokens for kind in AUTH_CACHE_KINDS
+    ]
+    if len(rediskeys) == 0:
+        return
+    with _local_auth_cache_lock:
+        for rediskey in rediskeys:
+            _local_auth_cache.pop(rediskey, None)
+    try:
+        RedisClient.get_instance().delete(*rediskeys)
+    except RedisError as error:
+        logger.error("could not invalidate auth cache: %s", error)
+
+
+@receiver([post_save, post_delete], sender=Token)
+def invalidate_auth_for_token(
+    sender, instance, **kwargs
+):  # pylint: disable=unused-argument
+    """a token was created or deleted"""
+    invalidate_auth_tokens([instance.key])
+
+
+@receiver([post_save, post_delete], sender=User)
+def invalidate_auth_for_user(
+    sender, instance, **kwargs
+):  # pylint: disable=unused-argument
+    """e.g. a user was deactivated"""
+    invalidate_auth_tokens(
+        list(Token.objects.filter(user_id=instance.id).values_list("key", flat=True))
+    )
+
+
+@receiver([post_save, post_delete], sender=OrgUser)
+@receiver([post_save, post_delete], sender=AdminUser)
+def invalidate_auth_for_role(
+    sender, instance, **kwargs
+):  # pylint: disable=unused-argument
+    """e.g. an orguser's role or org was changed"""
+    invalidate_auth_tokens(
+        list(
+            Token.objects.filter(user_id=instance.user_id).values_list("key", flat=True)
+        )
+    )
+
 
 class BearerAuthentication(TokenAuthentication):
     """
@@ -28,28 +142,64 @@ class PlatformAdmin(HttpBearer):
     """
 
     def authenticate(self, request, token):
-        tokenrecord = Token.objects.filter(key=token).first()
-        if tokenrecord and tokenrecord.user:
-            request.user = tokenrecord.user
-            adminuser = AdminUser.objects.filter(user=request.user).first()
+        resolved = get_cached_auth("adminuser", token)
+        if resolved is None:
+            adminuser = (
+                AdminUser.objects.filter(user__auth_token__key=token)
+                .values("id", "user_id")
+                .first()
+            )
             if adminuser is not None:
-                request.adminuser = adminuser
-                return tokenrecord
+                resolved = {
+                    "adminuser_id": adminuser["id"],
+                    "user_id": adminuser["user_id"],
+                }
+                cache_auth("adminuser", token, resolved)
+        if resolved is not None:
+            adminuser = SimpleLazyObject(
+                lambda: AdminUser.objects.select_related("user").get(
+                    id=resolved["adminuser_id"]
+                )
+            )
+            request.user = SimpleLazyObject(lambda: adminuser.user)
+            request.adminuser = adminuser
+            return Token(key=token, user_id=resolved["user_id"])
         raise HttpError(400, UNAUTHORIZED)
 
 
 def authenticate_org_user(request, token, allowed_roles, require_org):
-    """docstring"""
-    tokenrecord = Token.objects.filter(key=token).first()
-    if tokenrecord and tokenrecord.user:
-        request.user = tokenrecord.user
-        orguser = OrgUser.objects.filter(user=request.user).first()
+    """
+    looks up the org-user for an auth token, from the auth cache if possible,
+    and checks its role. request.orguser and request.user are loaded from the
+    db when a view first uses them
+    """
+    resolved = get_cached_auth("orguser", token)
+    if resolved is None:
+        orguser = (
+            OrgUser.objects.filter(user__auth_token__key=token)
+            .values("id", "user_id", "org_id", "role")
+            .first()
+        )
         if orguser is not None:
-            if require_org and orguser.org is None:
-                raise HttpError(400, "register an organization first")
-            if orguser.role in allowed_roles:
-                request.orguser = orguser
-                return request
+            resolved = {
+                "orguser_id": orguser["id"],
+                "user_id": orguser["user_id"],
+                "org_id": orguser["org_id"],
+                "role": orguser["role"],
+            }
+            cache_auth("orguser", token, resolved)
+    if resolved is not None:
+        orguser = SimpleLazyObject(
+            lambda: OrgUser.objects.select_related("user", "org").get(
+                id=resolved["orguser_id"]
+            )
+        )
+        request.user = SimpleLazyObject(lambda: orguser.user)
+        if require_org and resolved["org_id"] is None:
+            raise HttpError(400, "register an organization first")
+        if resolved["role"] in allowed_roles:
+            request.orguser = orguser
+            return request
     raise HttpError(400, UNAUTHORIZED)
 
 
@@ -1,12 +1,19 @@
 import os
 import json
+import time
+import hashlib
+import logging
 from typing import Dict, List
 import requests
 from dotenv import load_dotenv
 from ninja.errors import HttpError
+from redis.exceptions import RedisError
 from ddpui.ddpairbyte import schema
 from ddpui.utils.ab_logger import logger
 from ddpui.utils.helpers import remove_nested_attribute
+from ddpui.utils.httpsession import PooledSession
+from ddpui.utils.redis_client import RedisClient
+from ddpui.utils.tieredcache import TieredCache
 from ddpui.ddpairbyte.schema import (
     AirbyteSourceCreate,
     AirbyteDestinationCreate,
@@ -16,33 +23,72 @@ from ddpui.ddpairbyte.schema import (
 
 load_dotenv()
 
+AIRBYTE_URL = (
+    f"http://{os.getenv('AIRBYTE_SERVER_HOST')}:{os.getenv('AIRBYTE_SERVER_PORT')}"
+    f"/api/{os.getenv('AIRBYTE_SERVER_APIVER')}"
+)
+AIRBYTE_HTTP_TIMEOUT = int(os.getenv("AIRBYTE_HTTP_TIMEOUT", "30"))
+AIRBYTE_JOB_HTTP_TIMEOUT = int(os.getenv("AIRBYTE_JOB_HTTP_TIMEOUT", "120"))
+AIRBYTE_HTTP_POOL_SIZE = int(os.getenv("AIRBYTE_HTTP_POOL_SIZE", "10"))
+AIRBYTE_LOG_BODY_LENGTH = int(os.getenv("AIRBYTE_LOG_BODY_LENGTH", "4096"))
+AIRBYTE_CATALOG_CACHE_TTL = int(os.getenv("AIRBYTE_CATALOG_CACHE_TTL", "3600"))
+AIRBYTE_DEFINITIONS_CACHE_TTL = int(os.getenv("AIRBYTE_DEFINITIONS_CACHE_TTL", "86400"))
+AIRBYTE_DEFINITIONS_CACHE_SIZE = int(os.getenv("AIRBYTE_DEFINITIONS_CACHE_SIZE", "256"))
+
+# these endpoints spin up a connector container inside airbyte and
+# routinely take longer than the default timeout to respond
+AIRBYTE_ENDPOINT_TIMEOUTS = {
+    "sources/discover_schema": AIRBYTE_JOB_HTTP_TIMEOUT,
+    "scheduler/sources/check_connection": AIRBYTE_JOB_HTTP_TIMEOUT,
+    "sources/check_connection_for_update": AIRBYTE_JOB_HTTP_TIMEOUT,
+    "scheduler/destinations/check_connection": AIRBYTE_JOB_HTTP_TIMEOUT,
+    "destinations/check_connection_for_update": AIRBYTE_JOB_HTTP_TIMEOUT,
+}
+
+# connector definitions and their specifications only change when a connector
+# is upgraded or a custom one is added, so they are cached per workspace
+definitions_cache = TieredCache(
+    "airbyte-definitions",
+    ttl=AIRBYTE_DEFINITIONS_CACHE_TTL,
+    maxsize=AIRBYTE_DEFINITIONS_CACHE_SIZE,
+)
+
+absession = PooledSession(
+    AIRBYTE_HTTP_POOL_SIZE,
+    headers={"Authorization": f"Basic {os.getenv('AIRBYTE_API_TOKEN')}"},
+)
 
-def abreq(endpoint, req=None):
-    """Request to the airbyte server"""
-    abhost = os.getenv("AIRBYTE_SERVER_HOST")
-    abport = os.getenv("AIRBYTE_SERVER_PORT")
-    abver = os.getenv("AIRBYTE_SERVER_APIVER")
-    token = os.getenv("AIRBYTE_API_TOKEN")
 
+def abreq(endpoint, req=None, skip_keys: tuple = ()):
+    """
+    Request to the airbyte server. connector icons are stripped from the
+    response, except from under skip_keys, which are known not to hold any
+    """
     logger.info("Making request to Airbyte server: %s", endpoint)
 
+    start = time.monotonic()
     try:
-        res = requests.post(
-            f"http://{abhost}:{abport}/api/{abver}/{endpoint}",
-            headers={"Authorization": f"Basic {token}"},
+        res = absession.post(
+            f"{AIRBYTE_URL}/{endpoint}",
             json=req,
-            timeout=30,
+            timeout=AIRBYTE_ENDPOINT_TIMEOUTS.get(endpoint, AIRBYTE_HTTP_TIMEOUT),
         )
     except requests.exceptions.ConnectionError as conn_error:
         logger.exception(conn_error)
         raise HttpError(500, str(conn_error)) from conn_error
 
-    try:
-        result_obj = remove_nested_attribute(res.json(), "icon")
-        logger.info("Response from Airbyte server:")
-        logger.info(json.dumps(result_obj, indent=2))
-    except ValueError:
-        logger.info("Response from Airbyte server: %s", res.text)
+    # the bodies of catalogs and definition lists run into megabytes, so they
+    # are only logged at DEBUG and then only their first few kilobytes
+    logger.info(
+        "Response from Airbyte server: %s status=%s latency=%dms size=%d",
+        endpoint,
+        res.status_code,
+        (time.monotonic() - start) * 1000,
+        len(res.content),
+    )
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("airbyte connection pool: %s", absession.stats())
+        logger.debug(res.text[:AIRBYTE_LOG_BODY_LENGTH])
 
     try:
         res.raise_for_status()
@@ -51,7 +97,8 @@ def abreq(endpoint, req=None):
         raise HttpError(res.status_code, res.text) from error
 
     if "application/json" in res.headers.get("Content-Type", ""):
-        return res.json()
+        # icons are large base64 blobs which we never pass on
+        return remove_nested_attribute(res.json(), "icon", skip_keys=skip_keys)
     logger.error(
         "abreq result has content-type %s while hitting %s",
         res.headers.get("Content-Type", ""),
@@ -60,6 +107,11 @@ def abreq(endpoint, req=None):
     return {}
 
 
+def get_connection_pool_stats() -> dict:
+    """how many airbyte requests in this process reused a pooled connection"""
+    return absession.stats()
+
+
 def get_workspaces():
     """Fetch all workspaces in airbyte server"""
     logger.info("Fetching workspaces from Airbyte server")
@@ -121,13 +173,19 @@ def get_source_definitions(workspace_id: str) -> List[Dict]:
     if not isinstance(workspace_id, str):
         raise HttpError(400, "Invalid workspace ID")
 
-    res = abreq("source_definitions/list_for_workspace", {"workspaceId": workspace_id})
-    if "sourceDefinitions" not in res:
-        error_message = f"Source definitions not found for workspace: {workspace_id}"
-        logger.error(error_message)
-        raise HttpError(404, error_message)
+    def fetch():
+        res = abreq(
+            "source_definitions/list_for_workspace", {"workspaceId": workspace_id}
+        )
+        if "sourceDefinitions" not in res:
+            error_message = (
+                f"Source definitions not found for workspace: {workspace_id}"
+            )
+            logger.error(error_message)
+            raise HttpError(404, error_message)
+        return res
 
-    return res
+    return definitions_cache.get_or_fetch(workspace_id, "source-definitions", fetch)
 
 
 def get_source_definition_specification(workspace_id: str, sourcedef_id: str) -> dict:
@@ -138,20 +196,24 @@ def get_source_definition_specification(workspace_id: str, sourcedef_id: str) ->
     if not isinstance(sourcedef_id, str):
         raise HttpError(400, "Invalid source definition ID")
 
-    res = abreq(
-        "source_definition_specifications/get",
-        {"sourceDefinitionId": sourcedef_id, "workspaceId": workspace_id},
-    )
-
-    if "connectionSpecification" not in res:
-        error_message = (
-            f"specification not found for source definition {sourcedef_id} "
-            f"in workspace {workspace_id}"
+    def fetch():
+        res = abreq(
+            "source_definition_specifications/get",
+            {"sourceDefinitionId": sourcedef_id, "workspaceId": workspace_id},
+            skip_keys=("connectionSpecification",),
         )
-        logger.error(error_message)
-        raise HttpError(404, error_message)
+        if "connectionSpecification" not in res:
+            error_message = (
+                f"specification not found for source definition {sourcedef_id} "
+                f"in workspace {workspace_id}"
+            )
+            logger.error(error_message)
+            raise HttpError(404, error_message)
+        return res
 
-    return res
+    return definitions_cache.get_or_fetch(
+        workspace_id, f"source-definition-specification:{sourcedef_id}", fetch
+    )
 
 
 def create_custom_source_definition(
@@ -189,6 +251,7 @@ def create_custom_source_definition(
         error_message = f"Source definition not created: {name}"
         logger.error("Source definition not created: %s", name)
         raise HttpError(400, error_message)
+    definitions_cache.invalidate(workspace_id)
     return res
 
 
@@ -228,6 +291,7 @@ def delete_source(workspace_id: str, source_id: str) -> dict:
         raise HttpError(400, "Invalid source ID")
 
     res = abreq("sources/delete", {"sourceId": source_id})
+    invalidate_source_schema_catalog(source_id)
     return res
 
 
@@ -279,6 +343,7 @@ def update_source(source_id: str, name: str, config: dict, sourcedef_id: str) ->
             "sourceDefinitionId": sourcedef_id,
         },
     )
+    invalidate_source_schema_catalog(source_id)
     if "sourceId" not in res:
         logger.error("Failed to update source: %s", res)
         raise HttpError(500, "failed to update source")
@@ -335,15 +400,74 @@ def check_source_connection_for_update(
     return res
 
 
+def source_config_hash(source: dict) -> str:
+    """hashes the parts of a source which determine its discovered catalog"""
+    config = json.dumps(
+        {
+            "sourceDefinitionId": source.get("sourceDefinitionId"),
+            "connectionConfiguration": source.get("connectionConfiguration"),
+        },
+        sort_keys=True,
+    )
+    return hashlib.sha256(config.encode("utf-8")).hexdigest()
+
+
+def get_cached_source_schema_catalog(source_id: str, config_hash: str):
+    """returns the cached catalog if it was discovered for this source config"""
+    try:
+        cached = RedisClient.get_instance().get(f"airbyte-catalog:{source_id}")
+    except RedisError as error:
+        logger.warning("could not read catalog cache for %s: %s", source_id, error)
+        return None
+    if cached is None:
+        return None
+    cached = json.loads(cached)
+    if cached["configHash"] != config_hash:
+        return None
+    return cached["catalog"]
+
+
+def cache_source_schema_catalog(source_id: str, config_hash: str, catalog: dict):
+    """caches a discovered catalog against the source config it came from"""
+    try:
+        RedisClient.get_instance().set(
+            f"airbyte-catalog:{source_id}",
+            json.dumps({"configHash": config_hash, "catalog": catalog}),
+            ex=AIRBYTE_CATALOG_CACHE_TTL,
+        )
+    except RedisError as error:
+        logger.warning("could not cache catalog for %s: %s", source_id, error)
+
+
+def invalidate_source_schema_catalog(source_id: str):
+    """drops the cached catalog for a source"""
+    try:
+        RedisClient.get_instance().delete(f"airbyte-catalog:{source_id}")
+    except RedisError as error:
+        logger.warning("could not invalidate catalog for %s: %s", source_id, error)
+
+
 def get_source_schema_catalog(
-    workspace_id: str, source_id: str
-) -> dict:  # pylint: disable=unused-argument
-    """Fetch source schema catalog for a source in an airbyte workspace"""
+    workspace_id: str, source_id: str, force_refresh: bool = False
+) -> dict:
+    """
+    Fetch source schema catalog for a source in an airbyte workspace
+
+    discovering a schema launches a connector inside airbyte, so the result is
+    cached until the source's configuration changes or the cache expires
+    """
     if not isinstance(workspace_id, str):
         raise HttpError(400, "workspace_id must be a string")
     if not isinstance(source_id, str):
         raise HttpError(400, "source_id must be a string")
 
+    config_hash = source_config_hash(get_source(workspace_id, source_id))
+    if not force_refresh:
+        cached = get_cached_source_schema_catalog(source_id, config_hash)
+        if cached is not None:
+            logger.info("using cached schema catalog for source %s", source_id)
+            return cached
+
     res = abreq("sources/discover_schema", {"sourceId": source_id})
     # is it not possible that the job is long-running
     # and we need to check its status later?
@@ -363,6 +487,7 @@ def get_source_schema_catalog(
         )
     if "catalog" not in res and "jobInfo" not in res:
         raise HttpError(400, res["message"])
+    cache_source_schema_catalog(source_id, config_hash, res)
     return res
 
 
@@ -371,15 +496,20 @@ def get_destination_definitions(workspace_id: str) -> dict:
     if not isinstance(workspace_id, str):
         raise HttpError(400, "workspace_id must be a string")
 
-    res = abreq(
-        "destination_definitions/list_for_workspace", {"workspaceId": workspace_id}
-    )
-    if "destinationDefinitions" not in res:
-        logger.error(
-            "Destination definitions not found for workspace: %s", workspace_id
+    def fetch():
+        res = abreq(
+            "destination_definitions/list_for_workspace", {"workspaceId": workspace_id}
         )
-        raise HttpError(404, "destination definitions not found")
-    return res
+        if "destinationDefinitions" not in res:
+            logger.error(
+                "Destination definitions not found for workspace: %s", workspace_id
+            )
+            raise HttpError(404, "destination definitions not found")
+        return res
+
+    return definitions_cache.get_or_fetch(
+        workspace_id, "destination-definitions", fetch
+    )
 
 
 def get_destination_definition_specification(
@@ -391,16 +521,23 @@ def get_destination_definition_specification(
     if not isinstance(destinationdef_id, str):
         raise HttpError(400, "destinationdef_id must be a string")
 
-    res = abreq(
-        "destination_definition_specifications/get",
-        {"destinationDefinitionId": destinationdef_id, "workspaceId": workspace_id},
-    )
-    if "connectionSpecification" not in res:
-        logger.error(
-            "Specification not found for destination definition: %s", destinationdef_id
+    def fetch():
+        res = abreq(
+            "destination_definition_specifications/get",
+            {"destinationDefinitionId": destinationdef_id, "workspaceId": workspace_id},
+            skip_keys=("connectionSpecification",),
         )
-        raise HttpError(404, "Failed to get destination definition specification")
-    return res
+        if "connectionSpecification" not in res:
+            logger.error(
+                "Specification not found for destination definition: %s",
+                destinationdef_id,
+            )
+            raise HttpError(404, "Failed to get destination definition specification")
+        return res
+
+    return definitions_cache.get_or_fetch(
+        workspace_id, f"destination-definition-specification:{destinationdef_id}", fetch
+    )
 
 
 def get_destinations(workspace_id: str) -> dict:
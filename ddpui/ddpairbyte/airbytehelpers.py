@@ -1,10 +1,16 @@
+import re
+from uuid import uuid4
+from typing import Callable
+from django.db import transaction, IntegrityError
 from django.utils.text import slugify
+from ninja.errors import HttpError
 from ddpui.ddpairbyte import airbyte_service
 from ddpui.ddpairbyte.schema import AirbyteWorkspace
 from ddpui.ddpprefect import prefect_service
 from ddpui.ddpprefect import AIRBYTESERVER
 from ddpui.models.org import OrgPrefectBlock
 from ddpui.utils.ddp_logger import logger
+from ddpui.utils.helpers import map_concurrently
 
 
 def setup_airbyte_workspace(wsname, org) -> AirbyteWorkspace:
@@ -80,3 +86,181 @@ def setup_airbyte_workspace(wsname, org) -> AirbyteWorkspace:
         workspaceId=workspace["workspaceId"],
         initialSetupComplete=workspace["initialSetupComplete"],
     )
+
+
+class AirbyteWorkspaceSnapshot:
+    """
+    the sources, destinations and connections of an airbyte workspace indexed
+    by id. each of the three lists is fetched from airbyte at most once, so
+    looking up any number of them costs a constant number of upstream calls
+    """
+
+    def __init__(self, workspace_id: str) -> None:
+        self.workspace_id = workspace_id
+        self._sources = None
+        self._destinations = None
+        self._connections = None
+
+    @property
+    def sources(self) -> dict:
+        """{sourceId: source}"""
+        if self._sources is None:
+            self._sources = {
+                source["sourceId"]: source
+                for source in airbyte_service.get_sources(self.workspace_id)["sources"]
+            }
+        return self._sources
+
+    @property
+    def destinations(self) -> dict:
+        """{destinationId: destination}"""
+        if self._destinations is None:
+            self._destinations = {
+                destination["destinationId"]: destination
+                for destination in airbyte_service.get_destinations(self.workspace_id)[
+                    "destinations"
+                ]
+            }
+        return self._destinations
+
+    @property
+    def connections(self) -> dict:
+        """{connectionId: connection}"""
+        if self._connections is None:
+            self._connections = {
+                connection["connectionId"]: connection
+                for connection in airbyte_service.get_connections(self.workspace_id)[
+                    "connections"
+                ]
+            }
+        return self._connections
+
+    def prefetch(self) -> None:
+        """fetch all three lists concurrently"""
+        map_concurrently(
+            lambda attr: getattr(self, attr),
+            ["sources", "destinations", "connections"],
+        )
+
+    def get_source(self, source_id: str) -> dict:
+        """look up a source, failing like airbyte_service.get_source"""
+        if source_id not in self.sources:
+            logger.error("Source not found: %s", source_id)
+            raise HttpError(404, "source not found")
+        return self.sources[source_id]
+
+    def get_destination(self, destination_id: str) -> dict:
+        """look up a destination, failing like airbyte_service.get_destination"""
+        if destination_id not in self.destinations:
+            logger.error("Destination not found: %s", destination_id)
+            raise HttpError(404, "destination not found")
+        return self.destinations[destination_id]
+
+    def get_connection(self, connection_id: str) -> dict:
+        """look up a connection, failing like airbyte_service.get_connection"""
+        if connection_id not in self.connections:
+            error_message = f"Connection not found: {connection_id}"
+            logger.error(error_message)
+            raise HttpError(404, error_message)
+        return self.connections[connection_id]
+
+    def connections_of_source(self, source_id: str) -> list:
+        """all connections which read from this source"""
+        return [
+            connection
+            for connection in self.connections.values()
+            if connection["sourceId"] == source_id
+        ]
+
+
+def build_workspace_snapshot(workspace_id: str) -> AirbyteWorkspaceSnapshot:
+    """fetches the sources, destinations and connections of a workspace"""
+    snapshot = AirbyteWorkspaceSnapshot(workspace_id)
+    snapshot.prefetch()
+    return snapshot
+
+
+def get_connection_id(org_block: OrgPrefectBlock) -> str | None:
+    """
+    the airbyte connection id of an airbyte-connection block. blocks which
+    predate OrgPrefectBlock.connection_id, and which the migration could not
+    fill in, have it looked up in prefect once and saved
+    """
+    if org_block.connection_id is None:
+        block = prefect_service.get_airbyte_connection_block_by_id(org_block.block_id)
+        connection_id = block.get("data", {}).get("connection_id")
+        if connection_id is None:
+            return None
+        org_block.connection_id = connection_id
+        org_block.save(update_fields=["connection_id"])
+    return org_block.connection_id
+
+
+# how many names to try before giving up when concurrent requests keep
+# taking the one we picked
+BLOCK_NAME_ATTEMPTS = 5
+
+
+def next_block_name(base_name: str) -> str:
+    """
+    the first free name of the form base_name or base_name-<n>, numbering
+    after the highest one taken. one query, answered from the block_name index
+    """
+    taken = OrgPrefectBlock.objects.filter(
+        block_name__startswith=base_name,
+        block_name__regex=rf"^{re.escape(base_name)}(-[0-9]+)?$",
+    ).values_list("block_name", flat=True)
+    if not taken:
+        return base_name
+    suffix = max(int(name[len(base_name) + 1 :] or 0) for name in taken)
+    return f"{base_name}-{suffix + 1}"
+
+
+def create_named_block(
+    org, block_type: str, base_name: str, create_block: Callable, **fields
+) -> tuple:
+    """
+    creates a prefect block under the first free name derived from base_name
+    and saves it as an OrgPrefectBlock. create_block(block_name) creates the
+    block and returns it as it is returned by the proxy. the name is reserved
+    by inserting the row before the block is created, so a concurrent request
+    which picks the same name fails on the unique constraint and tries the
+    next one; the proxy is called outside any transaction. returns the
+    OrgPrefectBlock and the block
+    """
+    for _ in range(BLOCK_NAME_ATTEMPTS):
+        block_name = next_block_name(base_name)
+        try:
+            with transaction.atomic():
+                org_block = OrgPrefectBlock.objects.create(
+                    org=org,
+                    block_type=block_type,
+                    block_id=str(uuid4()),  # until the block is created
+                    block_name=block_name,
+                    **fields,
+                )
+        except IntegrityError:
+            logger.info("block name %s is taken, trying the next one", block_name)
+            continue
+
+        try:
+            block = create_block(block_name)
+        except Exception:
+            org_block.delete()
+            raise
+
+        # the proxy may have changed the name
+        org_block.block_id = block["id"]
+        org_block.block_name = block["name"]
+        try:
+            with transaction.atomic():
+                org_block.save()
+            return org_block, block
+        except IntegrityError:
+            logger.info("block name %s is taken, trying the next one", block["name"])
+            org_block.delete()
+            try:
+                prefect_service.prefect_delete_a_block(block["id"])
+            except Exception as error:  # skipcq PYL-W0703
+                logger.exception(error)
+    raise HttpError(500, "could not find a free name for the block")
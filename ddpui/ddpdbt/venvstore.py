@@ -0,0 +1,127 @@
+"""
+a store of dbt virtualenvs shared by every org's dbt workspace
+
+a venv is built once for each combination of dbt-core version and warehouse
+adapter, under $CLIENTDBT_ROOT/.venvs/<digest>, and each workspace symlinks
+its "venv" to it. the digest is computed from the pinned requirements and the
+python interpreter, so two workspaces asking for the same versions always get
+the same venv. packages are installed from a wheelhouse under
+$CLIENTDBT_ROOT/.wheelhouse, which is filled from the network only when a
+wheel is missing from it
+"""
+import os
+import sys
+import json
+import shutil
+import hashlib
+from pathlib import Path
+from subprocess import CalledProcessError
+
+from ddpui.utils.helpers import runcmd, locked
+from ddpui.utils.ddp_logger import logger
+
+# the adapter package and version installed for each warehouse type
+DBT_ADAPTERS = {
+    "postgres": ("dbt-postgres", "1.4.5"),
+    "bigquery": ("dbt-bigquery", "1.4.3"),
+}
+
+# written last, so that a venv without it is a build which did not finish
+COMPLETE_MARKER = "ddp-venv.json"
+
+
+def get_store_dir() -> Path:
+    """the directory holding the shared venvs"""
+    return Path(os.getenv("CLIENTDBT_ROOT")) / ".venvs"
+
+
+def get_requirements(dbt_version: str, wtype: str) -> list:
+    """the pinned packages for a venv running dbt-core against a warehouse type"""
+    if wtype not in DBT_ADAPTERS:
+        raise ValueError(f"unsupported warehouse type {wtype}")
+    adapter, adapter_version = DBT_ADAPTERS[wtype]
+    return [f"dbt-core=={dbt_version}", f"{adapter}=={adapter_version}"]
+
+
+def get_venv_digest(requirements: list) -> str:
+    """the content address of the venv for a set of requirements"""
+    python = f"{sys.implementation.name}-{sys.version_info[0]}.{sys.version_info[1]}"
+    spec = "\n".join([python] + sorted(requirements))
+    return hashlib.sha256(spec.encode("utf-8")).hexdigest()[:16]
+
+
+def get_wheelhouse_dir() -> Path:
+    """the directory holding the wheels every venv is installed from"""
+    return Path(os.getenv("CLIENTDBT_ROOT")) / ".wheelhouse"
+
+
+def runpip(pip: Path, args: str, cwd: Path) -> None:
+    """runs pip, treating exit status 120 as success as we always have"""
+    try:
+        runcmd(f"{pip} {args}", cwd)
+    except CalledProcessError as error:
+        if error.returncode != 120:
+            raise
+
+
+def pip_install(pip: Path, requirements: list, cwd: Path, upgrade=False) -> None:
+    """
+    installs requirements from the wheelhouse without going to the network.
+    if any are missing, pip downloads them into the wheelhouse (building
+    wheels for sdists) and the install is retried
+    """
+    wheelhouse = get_wheelhouse_dir()
+    wheelhouse.mkdir(parents=True, exist_ok=True)
+    upgrade = "--upgrade " if upgrade else ""
+    packages = " ".join(requirements)
+    install = f"install {upgrade}--no-index --find-links {wheelhouse} {packages}"
+    try:
+        runpip(pip, install, cwd)
+        return
+    except CalledProcessError:
+        logger.info("wheelhouse is missing some of %s, downloading", packages)
+    with locked(wheelhouse.parent / ".wheelhouse.lock"):
+        runpip(pip, f"wheel --wheel-dir {wheelhouse} {packages}", cwd)
+    runpip(pip, install, cwd)
+
+
+def build_venv(venv_dir: Path, requirements: list) -> None:
+    """creates a venv and installs requirements into it"""
+    if venv_dir.exists():
+        # left behind by an interrupted build
+        shutil.rmtree(str(venv_dir))
+    runcmd(f"{sys.executable} -m venv {venv_dir.name}", venv_dir.parent)
+    pip = venv_dir / "bin/pip"
+    pip_install(pip, ["pip"], venv_dir, upgrade=True)
+    pip_install(pip, requirements, venv_dir)
+    with open(venv_dir / COMPLETE_MARKER, "w", encoding="utf-8") as marker:
+        json.dump({"requirements": requirements}, marker)
+
+
+def ensure_venv(dbt_version: str, wtype: str) -> Path:
+    """
+    returns the shared venv for dbt_version and wtype, building it first if
+    required. concurrent callers on the same machine wait for a single build
+    """
+    requirements = get_requirements(dbt_version, wtype)
+    store_dir = get_store_dir()
+    store_dir.mkdir(parents=True, exist_ok=True)
+    venv_dir = store_dir / get_venv_digest(requirements)
+    if (venv_dir / COMPLETE_MARKER).exists():
+        return venv_dir
+
+    with locked(store_dir / f"{venv_dir.name}.lock"):
+        if not (venv_dir / COMPLETE_MARKER).exists():
+            logger.info("building dbt venv %s for %s", venv_dir, requirements)
+            build_venv(venv_dir, requirements)
+    return venv_dir
+
+
+def link_venv(project_dir: Path, venv_dir: Path) -> None:
+    """points a dbt workspace's "venv" at a shared venv"""
+    link = project_dir / "venv"
+    if link.is_symlink() or link.is_file():
+        link.unlink()
+    elif link.exists():
+        shutil.rmtree(str(link))
+    link.symlink_to(venv_dir, target_is_directory=True)
@@ -1,8 +1,13 @@
 import os
+# aliased since prefect_get / prefect_post take a json argument
+import json as jsonlib
+import time
+from datetime import datetime, timedelta
 import requests
 
 from ninja.errors import HttpError
 from dotenv import load_dotenv
+from redis.exceptions import RedisError
 from ddpui.ddpprefect.schema import (
     PrefectDbtCoreSetup,
     PrefectShellSetup,
@@ -13,11 +18,28 @@ from ddpui.ddpprefect.schema import (
     PrefectDbtCore,
 )
 from ddpui.utils.ddp_logger import logger
+from ddpui.utils.helpers import map_concurrently
+from ddpui.utils.redis_client import RedisClient
 
 load_dotenv()
 
 PREFECT_PROXY_API_URL = os.getenv("PREFECT_PROXY_API_URL")
 http_timeout = int(os.getenv("PREFECT_HTTP_TIMEOUT", "5"))
+flow_runs_cache_ttl = int(os.getenv("PREFECT_FLOW_RUNS_CACHE_TTL", "86400"))
+flow_run_logs_cache_ttl = int(
+    os.getenv("PREFECT_FLOW_RUN_LOGS_CACHE_TTL", str(30 * 86400))
+)
+# runs are only returned once finished, so a run may show up after runs which
+# started later than it. this is how far back from the newest cached run to look
+flow_runs_refetch_window = int(os.getenv("PREFECT_FLOW_RUNS_REFETCH_WINDOW", "21600"))
+# how long to go without the batch flow_runs/last endpoint once the proxy turns
+# out not to have it, before trying it again
+batch_endpoint_recheck = int(os.getenv("PREFECT_BATCH_ENDPOINT_RECHECK", "3600"))
+# when to next try the batch flow_runs/last endpoint, in time.monotonic()
+batch_flow_runs_retry_at = 0.0
+
+# prefect state types after which a flow run does nothing more
+FINISHED_STATE_TYPES = ["COMPLETED", "FAILED", "CANCELLED", "CRASHED"]
 
 
 # ================================================================================================
@@ -242,6 +264,70 @@ def create_dbt_core_block(
     return response
 
 
+def create_dbt_core_blocks(
+    dbtcores: list,
+    profile: DbtProfile,
+    target: str,
+    wtype: str,
+    credentials: dict,
+    bqlocation: str,
+) -> list:
+    """
+    Create several dbt core blocks sharing a profile and warehouse in a single
+    request, which sends the credentials once. The proxy creates either all of
+    them or none, and returns a {"block_id", "block_name"} for each, in order.
+    Proxies which don't have the bulk endpoint yet are sent one request per
+    block, and the blocks already created are deleted if one fails
+    """
+    if len(dbtcores) == 0:
+        return []
+    try:
+        response = prefect_post(
+            "blocks/dbtcore/bulk/",
+            {
+                "profile": {
+                    "name": profile.name,
+                    "target": target,
+                    "target_configs_schema": target,
+                },
+                "wtype": wtype,
+                "credentials": credentials,
+                "bqlocation": bqlocation,
+                "blocks": [
+                    {
+                        "blockName": dbtcore.block_name,
+                        "commands": dbtcore.commands,
+                        "env": dbtcore.env,
+                        "working_dir": dbtcore.working_dir,
+                        "profiles_dir": dbtcore.profiles_dir,
+                        "project_dir": dbtcore.project_dir,
+                    }
+                    for dbtcore in dbtcores
+                ],
+            },
+        )
+    except HttpError as error:
+        if error.status_code not in [404, 405]:
+            raise
+        logger.info("proxy has no bulk blocks/dbtcore, creating one by one")
+    else:
+        return response["blocks"]
+
+    blocks = []
+    try:
+        for dbtcore in dbtcores:
+            blocks.append(
+                create_dbt_core_block(
+                    dbtcore, profile, target, wtype, credentials, bqlocation
+                )
+            )
+    except Exception:
+        if len(blocks) > 0:
+            post_prefect_blocks_bulk_delete([block["block_id"] for block in blocks])
+        raise
+    return blocks
+
+
 def delete_dbt_core_block(block_id):
     """Delete a dbt core block in prefect"""
     prefect_delete_a_block(block_id)
@@ -300,18 +386,73 @@ def create_dataflow(payload: PrefectDataFlowCreateSchema2) -> dict:  # pragma: n
     return res
 
 
-def get_flow_runs_by_deployment_id(deployment_id: str, limit=None):  # pragma: no cover
+def get_flow_runs_by_deployment_id(
+    deployment_id: str, limit=None, start_time_gt: str = None, start_time_lt: str = None
+):  # pragma: no cover
     """
     Fetch flow runs of a deployment that are FAILED/COMPLETED
     sorted by descending start time of each run
     """
     res = prefect_get(
         "flow_runs",
-        params={"deployment_id": deployment_id, "limit": limit},
+        params={
+            "deployment_id": deployment_id,
+            "limit": limit,
+            "start_time_gt": start_time_gt,
+            "start_time_lt": start_time_lt,
+        },
     )
     return res["flow_runs"]
 
 
+def get_recent_flow_runs_by_deployment_id(deployment_id: str, limit: int) -> list:
+    """
+    Fetch the latest `limit` FAILED/COMPLETED flow runs of a deployment.
+    Finished runs never change, so they are cached in redis and only the runs
+    which started within flow_runs_refetch_window of the newest cached run, or
+    after it, are fetched from the proxy
+    """
+    rediskey = f"flow-runs:{deployment_id}"
+    try:
+        cached = RedisClient.get_instance().get(rediskey)
+        cached = jsonlib.loads(cached) if cached else []
+    except RedisError as error:
+        logger.warning("flow-runs cache unavailable: %s", error)
+        cached = []
+
+    start_time_gt = None
+    if len(cached) > 0:
+        start_time_gt = (
+            datetime.fromisoformat(cached[0]["startTime"])
+            - timedelta(seconds=flow_runs_refetch_window)
+        ).isoformat()
+    flow_runs = get_flow_runs_by_deployment_id(deployment_id, limit, start_time_gt)
+
+    # the runs we fetched again replace their cached copies
+    flow_run_ids = set(flow_run["id"] for flow_run in flow_runs)
+    flow_runs = flow_runs + [
+        flow_run for flow_run in cached if flow_run["id"] not in flow_run_ids
+    ]
+    flow_runs.sort(key=lambda flow_run: flow_run["startTime"], reverse=True)
+    flow_runs = flow_runs[:limit]
+
+    try:
+        RedisClient.get_instance().set(
+            rediskey,
+            jsonlib.dumps(
+                [
+                    flow_run
+                    for flow_run in flow_runs
+                    if flow_run.get("status") in FINISHED_STATE_TYPES
+                ]
+            ),
+            ex=flow_runs_cache_ttl,
+        )
+    except RedisError as error:
+        logger.warning("flow-runs cache unavailable: %s", error)
+    return flow_runs
+
+
 def get_last_flow_run_by_deployment_id(deployment_id: str):  # pragma: no cover
     """Fetch most recent flow run of a deployment that is FAILED/COMPLETED"""
     res = get_flow_runs_by_deployment_id(deployment_id, limit=1)
@@ -320,6 +461,37 @@ def get_last_flow_run_by_deployment_id(deployment_id: str):  # pragma: no cover
     return None
 
 
+def get_last_flow_runs_by_deployment_ids(deployment_ids: list) -> dict:
+    """
+    Fetch the most recent FAILED/COMPLETED flow run of each deployment, as
+    {deployment_id: flow_run or None}, in a single request to the proxy.
+    Proxies which don't have the batch endpoint yet are queried concurrently,
+    one deployment at a time, for the next batch_endpoint_recheck seconds
+    """
+    global batch_flow_runs_retry_at  # pylint: disable=global-statement
+    if len(deployment_ids) == 0:
+        return {}
+    if time.monotonic() < batch_flow_runs_retry_at:
+        last_runs = map_concurrently(get_last_flow_run_by_deployment_id, deployment_ids)
+        return dict(zip(deployment_ids, last_runs))
+    try:
+        res = prefect_post("flow_runs/last", {"deployment_ids": deployment_ids})
+    except HttpError as error:
+        if error.status_code not in [404, 405]:
+            raise
+        logger.warning(
+            "proxy has no batch flow_runs/last, fetching one by one for %ds",
+            batch_endpoint_recheck,
+        )
+        batch_flow_runs_retry_at = time.monotonic() + batch_endpoint_recheck
+        last_runs = map_concurrently(get_last_flow_run_by_deployment_id, deployment_ids)
+        return dict(zip(deployment_ids, last_runs))
+    return {
+        deployment_id: res["flow_runs"].get(deployment_id)
+        for deployment_id in deployment_ids
+    }
+
+
 def set_deployment_schedule(deployment_id: str, status: str):
     """activates / deactivates a deployment"""
     prefect_post(f"deployments/{deployment_id}/set_schedule/{status}", {})
@@ -354,12 +526,35 @@ def get_deployment(deployment_id) -> dict:
     return res
 
 
-def get_flow_run_logs(flow_run_id: str, offset: int) -> dict:  # pragma: no cover
-    """retreive the logs from a flow-run from prefect"""
+def get_flow_run_logs(
+    flow_run_id: str, offset: int, finished: bool = False
+) -> dict:  # pragma: no cover
+    """
+    retreive the logs from a flow-run from prefect. the logs of a finished run
+    never change, so callers which know the run has finished pass finished=True
+    to have them cached in redis for flow_run_logs_cache_ttl. cached logs are
+    served to every caller
+    """
+    rediskey = f"flow-run-logs:{flow_run_id}:{offset}"
+    try:
+        cached = RedisClient.get_instance().get(rediskey)
+        if cached:
+            return {"logs": jsonlib.loads(cached)}
+    except RedisError as error:
+        logger.warning("flow-run-logs cache unavailable: %s", error)
+
     res = prefect_get(
         f"flow_runs/logs/{flow_run_id}",
         params={"offset": offset},
     )
+
+    if finished:
+        try:
+            RedisClient.get_instance().set(
+                rediskey, jsonlib.dumps(res), ex=flow_run_logs_cache_ttl
+            )
+        except RedisError as error:
+            logger.warning("flow-run-logs cache unavailable: %s", error)
     return {"logs": res}
 
 
@@ -2,6 +2,7 @@ from django.core.management.base import BaseCommand
 
 from ddpui.models.org_user import Org
 from ddpui.utils.deleteorg import delete_one_org
+from ddpui.celeryworkers.tasks import delete_org
 
 
 class Command(BaseCommand):
@@ -16,16 +17,31 @@ class Command(BaseCommand):
         """The main parameter is the org name"""
         parser.add_argument("--org-name", required=True)
         parser.add_argument("--yes-really", action="store_true")
+        parser.add_argument(
+            "--in-celery",
+            action="store_true",
+            help="queue the deletion on a celery worker and print the task id",
+        )
+
+    def delete_one_org(self, org: Org, options: dict):
+        """deletes here or queues the deletion, as asked"""
+        if not options["yes_really"]:
+            delete_one_org(org, False)
+        elif options["in_celery"]:
+            task = delete_org.delay(org.id)
+            print(f"deleting {org.name} in task {task.id}")
+        elif not delete_one_org(org, True):
+            print(f"{org.name} was not fully deleted, run again to retry")
 
     def handle(self, *args, **options):
         """Docstring"""
         if options["org_name"] == "ALL":
             for org in Org.objects.all():
-                self.delete_one_org(org, options["yes_really"])
+                self.delete_one_org(org, options)
         else:
             org = Org.objects.filter(name=options["org_name"]).first()
             if org is None:
                 print("no such org")
                 return
 
-            delete_one_org(org, options["yes_really"])
+            self.delete_one_org(org, options)
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from ddpui.ddpdbt import venvstore
+
+
+class Command(BaseCommand):
+    """
+    This script builds the shared dbt venvs ahead of time, so that
+    setting up an org's dbt workspace only has to link one
+    """
+
+    help = "Builds the shared dbt venvs for the given dbt-core versions"
+
+    def add_arguments(self, parser):  # skipcq: PYL-R0201
+        """one or more dbt-core versions, and optionally the warehouse types"""
+        parser.add_argument("--dbt-version", action="append", required=True)
+        parser.add_argument(
+            "--warehouse",
+            action="append",
+            choices=sorted(venvstore.DBT_ADAPTERS),
+            help="defaults to every supported warehouse type",
+        )
+
+    def handle(self, *args, **options):
+        """builds each missing venv in turn"""
+        for dbt_version in options["dbt_version"]:
+            for wtype in options["warehouse"] or sorted(venvstore.DBT_ADAPTERS):
+                venv_dir = venvstore.ensure_venv(dbt_version, wtype)
+                print(f"dbt-core=={dbt_version} {wtype}: {venv_dir}")
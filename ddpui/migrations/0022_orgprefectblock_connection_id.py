@@ -0,0 +1,19 @@
+# Generated by Django 4.1.7 on 2026-10-18 05:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """add connection_id to OrgPrefectBlock"""
+
+    dependencies = [
+        ("ddpui", "0021_orguser_email_verified"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="orgprefectblock",
+            name="connection_id",
+            field=models.CharField(max_length=36, null=True),
+        ),
+    ]
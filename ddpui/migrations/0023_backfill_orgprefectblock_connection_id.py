@@ -0,0 +1,48 @@
+from django.db import migrations
+
+# as in ddpui.ddpprefect, but fixed here since migrations must not change
+AIRBYTECONNECTION = "Airbyte Connection"
+
+
+def backfill_connection_ids(apps, schema_editor):  # pylint: disable=unused-argument
+    """
+    fills in OrgPrefectBlock.connection_id for airbyte-connection blocks from
+    the manual-sync deployment named after each of them, which holds the
+    connection id. blocks without one are looked up in prefect by the api the
+    first time they are used
+    """
+    OrgPrefectBlock = apps.get_model("ddpui", "OrgPrefectBlock")
+    OrgDataFlow = apps.get_model("ddpui", "OrgDataFlow")
+
+    blocks = list(
+        OrgPrefectBlock.objects.filter(
+            block_type=AIRBYTECONNECTION, connection_id__isnull=True
+        )
+    )
+    manual_sync_connection_ids = dict(
+        OrgDataFlow.objects.filter(
+            name__startswith="manual-sync-", connection_id__isnull=False
+        ).values_list("name", "connection_id")
+    )
+    for block in blocks:
+        block.connection_id = manual_sync_connection_ids.get(
+            f"manual-sync-{block.block_name}"
+        )
+
+    OrgPrefectBlock.objects.bulk_update(
+        [block for block in blocks if block.connection_id is not None],
+        ["connection_id"],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+    """backfill connection_id on OrgPrefectBlock"""
+
+    dependencies = [
+        ("ddpui", "0022_orgprefectblock_connection_id"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_connection_ids, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 4.1.7 on 2026-10-18 05:14
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    """composite indexes for the org-scoped lookups made by most requests"""
+
+    dependencies = [
+        ("ddpui", "0023_backfill_orgprefectblock_connection_id"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="orgdataflow",
+            index=models.Index(fields=["org", "cron"], name="orgdataflow_org_cron"),
+        ),
+        migrations.AddIndex(
+            model_name="orgdataflow",
+            index=models.Index(
+                condition=models.Q(("cron__isnull", True)),
+                fields=["org"],
+                name="orgdataflow_org_manual",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="orgprefectblock",
+            index=models.Index(
+                fields=["org", "block_type"], name="orgprefectblock_org_type"
+            ),
+        ),
+        # the indexes above all lead with org, which makes the foreign keys' own
+        # indexes redundant
+        migrations.AlterField(
+            model_name="orgdataflow",
+            name="org",
+            field=models.ForeignKey(
+                db_index=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                to="ddpui.org",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="orgprefectblock",
+            name="org",
+            field=models.ForeignKey(
+                db_index=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                to="ddpui.org",
+            ),
+        ),
+    ]
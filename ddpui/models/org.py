@@ -27,7 +27,8 @@ class Org(models.Model):
 class OrgPrefectBlock(models.Model):
     """Docstring"""
 
-    org = models.ForeignKey(Org, on_delete=models.CASCADE)
+    # indexed by the composite indexes below, which all lead with org
+    org = models.ForeignKey(Org, on_delete=models.CASCADE, db_index=False)
     block_type = models.CharField(max_length=25)  # all dbt blocks have the same type!
     block_id = models.CharField(max_length=36, unique=True)
     block_name = models.CharField(
@@ -37,6 +38,13 @@ class OrgPrefectBlock(models.Model):
     command = models.CharField(max_length=100, null=True)
     dbt_target_schema = models.CharField(max_length=50, null=True)
     seq = models.SmallIntegerField(null=True)
+    # the airbyte connection behind an airbyte-connection block
+    connection_id = models.CharField(max_length=36, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["org", "block_type"], name="orgprefectblock_org_type"),
+        ]
 
     def __str__(self) -> str:
         return f"{self.org.name} {self.block_type} {self.block_name}"
@@ -45,7 +53,8 @@ class OrgPrefectBlock(models.Model):
 class OrgDataFlow(models.Model):
     """This contains the deployment id of an organization to schedule flows/pipelines"""
 
-    org = models.ForeignKey(Org, on_delete=models.CASCADE)
+    # indexed by the composite indexes below, which all lead with org
+    org = models.ForeignKey(Org, on_delete=models.CASCADE, db_index=False)
     name = models.CharField(max_length=100)
     deployment_name = models.CharField(max_length=100, null=True)
     deployment_id = models.CharField(max_length=36, unique=True, null=True)
@@ -53,6 +62,17 @@ class OrgDataFlow(models.Model):
     # and if deployment is manual airbyte-connection-sync,then we store the conn_id
     connection_id = models.CharField(max_length=36, unique=True, null=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["org", "cron"], name="orgdataflow_org_cron"),
+            # manual deployments, which have no schedule
+            models.Index(
+                fields=["org"],
+                name="orgdataflow_org_manual",
+                condition=models.Q(cron__isnull=True),
+            ),
+        ]
+
 
 class OrgSchema(Schema):
     """Docstring"""
@@ -1,4 +1,5 @@
 import os
+import importlib
 import django
 
 from unittest.mock import Mock, patch, MagicMock
@@ -9,6 +10,7 @@ os.environ.setdefault("DJANGO_SETTINGS_MODULE", "ddpui.settings")
 os.environ["DJANGO_ALLOW_ASYNC_UNSAFE"] = "true"
 django.setup()
 
+from django.apps import apps as django_apps
 from ddpui.models.org import Org, OrgPrefectBlock, OrgDataFlow, OrgWarehouse
 from ddpui.api.client.airbyte_api import (
     post_airbyte_detach_workspace,
@@ -53,6 +55,7 @@ from ddpui.ddpairbyte.schema import (
     AirbyteConnectionUpdate,
 )
 from ddpui import ddpprefect
+from ddpui.ddpairbyte import airbyte_service, airbytehelpers
 
 pytestmark = pytest.mark.django_db
 
@@ -577,7 +580,11 @@ def test_delete_airbyte_source_without_workspace(org_without_workspace):
 @patch.multiple(
     "ddpui.ddpairbyte.airbyte_service",
     get_connections=Mock(
-        return_value={"connections": [{"sourceId": "fake-source-id-1"}]}
+        return_value={
+            "connections": [
+                {"sourceId": "fake-source-id-1", "connectionId": "fake-connection-id-1"}
+            ]
+        }
     ),
     delete_source=Mock(),
 )
@@ -1055,18 +1062,37 @@ def test_get_airbyte_connections_without_workspace(org_without_workspace):
 
 @patch.multiple(
     "ddpui.ddpairbyte.airbyte_service",
-    get_connection=Mock(
+    get_connections=Mock(
         return_value={
-            "sourceId": "fake-source-id-1",
-            "connectionId": "fake-connection-id-1",
-            "destinationId": "fake-destination-id-1",
-            "sourceCatalogId": "fake-source-catalog-id-1",
-            "syncCatalog": "sync-catalog",
-            "status": "conn-status",
+            "connections": [
+                {
+                    "sourceId": "fake-source-id-1",
+                    "connectionId": "fake-connection-id",
+                    "destinationId": "fake-destination-id-1",
+                    "sourceCatalogId": "fake-source-catalog-id-1",
+                    "syncCatalog": "sync-catalog",
+                    "status": "conn-status",
+                }
+            ]
+        }
+    ),
+    get_sources=Mock(
+        return_value={
+            "sources": [
+                {"sourceId": "fake-source-id-1", "sourceName": "fake-source-name-1"}
+            ]
+        }
+    ),
+    get_destinations=Mock(
+        return_value={
+            "destinations": [
+                {
+                    "destinationId": "fake-destination-id-1",
+                    "destinationName": "fake-destination-name-1",
+                }
+            ]
         }
     ),
-    get_source=Mock(return_value={"sourceName": "fake-source-name-1"}),
-    get_destination=Mock(return_value={"destinationName": "fake-destination-name-1"}),
 )
 @patch.multiple(
     "ddpui.ddpprefect.prefect_service",
@@ -1095,7 +1121,7 @@ def test_get_airbyte_connectionn_success(org_with_workspace):
 
     OrgDataFlow.objects.create(
         org=org_with_workspace,
-        connection_id="fake-connection-id-1",
+        connection_id="fake-connection-id",
         deployment_id="fake-deployment-id",
     )
 
@@ -1117,6 +1143,150 @@ def test_get_airbyte_connectionn_success(org_with_workspace):
     assert result[0]["lastRun"] == "lastRun"
 
 
+@patch.multiple(
+    "ddpui.ddpairbyte.airbyte_service",
+    get_connections=Mock(
+        return_value={
+            "connections": [
+                {
+                    "sourceId": "fake-source-id",
+                    "connectionId": f"conn-fake-block-id-{idx}",
+                    "destinationId": "fake-destination-id",
+                    "sourceCatalogId": "fake-source-catalog-id",
+                    "syncCatalog": {},
+                    "status": "active",
+                }
+                for idx in range(5)
+            ]
+        }
+    ),
+    get_sources=Mock(
+        return_value={
+            "sources": [
+                {"sourceId": "fake-source-id", "sourceName": "fake-source-name"}
+            ]
+        }
+    ),
+    get_destinations=Mock(
+        return_value={
+            "destinations": [
+                {
+                    "destinationId": "fake-destination-id",
+                    "destinationName": "fake-destination-name",
+                }
+            ]
+        }
+    ),
+    get_connection=Mock(),
+    get_source=Mock(),
+    get_destination=Mock(),
+)
+@patch.multiple(
+    "ddpui.ddpprefect.prefect_service",
+    get_airbyte_connection_block_by_id=Mock(
+        side_effect=lambda block_id: {
+            "data": {"connection_id": f"conn-{block_id}"},
+            "name": f"name-{block_id}",
+        }
+    ),
+    get_last_flow_run_by_deployment_id=Mock(return_value=None),
+)
+def test_get_airbyte_connections_constant_airbyte_calls(org_with_workspace):
+    """connections, sources and destinations are listed once per request"""
+    mock_orguser = Mock()
+    mock_orguser.org = org_with_workspace
+
+    mock_request = Mock()
+    mock_request.orguser = mock_orguser
+
+    block_ids = [f"fake-block-id-{idx}" for idx in range(5)]
+    for block_id in block_ids:
+        OrgPrefectBlock.objects.create(
+            org=org_with_workspace,
+            block_type=ddpprefect.AIRBYTECONNECTION,
+            block_id=block_id,
+            block_name=block_id,
+        )
+
+    result = get_airbyte_connections(mock_request)
+
+    assert [conn["blockId"] for conn in result] == block_ids
+    assert [conn["connectionId"] for conn in result] == [
+        f"conn-{block_id}" for block_id in block_ids
+    ]
+    assert all(conn["source"]["name"] == "fake-source-name" for conn in result)
+    assert airbyte_service.get_connections.call_count == 1
+    assert airbyte_service.get_sources.call_count == 1
+    assert airbyte_service.get_destinations.call_count == 1
+    airbyte_service.get_connection.assert_not_called()
+    airbyte_service.get_source.assert_not_called()
+    airbyte_service.get_destination.assert_not_called()
+    # the connection ids looked up in prefect are saved
+    assert list(
+        OrgPrefectBlock.objects.filter(org=org_with_workspace)
+        .order_by("block_id")
+        .values_list("connection_id", flat=True)
+    ) == [f"conn-{block_id}" for block_id in block_ids]
+
+
+@patch.multiple(
+    "ddpui.ddpairbyte.airbyte_service",
+    get_connections=Mock(
+        return_value={
+            "connections": [
+                {
+                    "sourceId": "fake-source-id",
+                    "connectionId": "fake-connection-id",
+                    "destinationId": "fake-destination-id",
+                    "sourceCatalogId": "fake-source-catalog-id",
+                    "syncCatalog": {},
+                    "status": "active",
+                }
+            ]
+        }
+    ),
+    get_sources=Mock(
+        return_value={
+            "sources": [
+                {"sourceId": "fake-source-id", "sourceName": "fake-source-name"}
+            ]
+        }
+    ),
+    get_destinations=Mock(
+        return_value={
+            "destinations": [
+                {
+                    "destinationId": "fake-destination-id",
+                    "destinationName": "fake-destination-name",
+                }
+            ]
+        }
+    ),
+)
+def test_get_airbyte_connections_reads_connection_id(org_with_workspace):
+    """blocks which know their connection id are not looked up in prefect"""
+    mock_request = Mock()
+    mock_request.orguser = Mock()
+    mock_request.orguser.org = org_with_workspace
+    OrgPrefectBlock.objects.create(
+        org=org_with_workspace,
+        block_type=ddpprefect.AIRBYTECONNECTION,
+        block_id="fake-block-id",
+        block_name="fake-block-name",
+        connection_id="fake-connection-id",
+    )
+
+    with patch(
+        "ddpui.ddpprefect.prefect_service.get_airbyte_connection_block_by_id"
+    ) as get_block_mock:
+        result = get_airbyte_connections(mock_request)
+
+    get_block_mock.assert_not_called()
+    assert result[0]["connectionId"] == "fake-connection-id"
+    assert result[0]["blockName"] == "fake-block-name"
+    assert result[0]["blockData"] == {"connection_id": "fake-connection-id"}
+
+
 # ================================================================================
 def test_get_airbyte_connection_without_workspace(org_without_workspace):
     mock_orguser = Mock()
@@ -1133,19 +1303,38 @@ def test_get_airbyte_connection_without_workspace(org_without_workspace):
 
 @patch.multiple(
     "ddpui.ddpairbyte.airbyte_service",
-    get_connection=Mock(
+    get_connections=Mock(
         return_value={
-            "sourceId": "fake-source-id-1",
-            "connectionId": "fake-connection-id-1",
-            "destinationId": "fake-destination-id-1",
-            "sourceCatalogId": "fake-source-catalog-id-1",
-            "syncCatalog": "sync-catalog",
-            "namespaceDefinition": "namespace-definition",
-            "status": "conn-status",
+            "connections": [
+                {
+                    "sourceId": "fake-source-id-1",
+                    "connectionId": "fake-connection-id",
+                    "destinationId": "fake-destination-id-1",
+                    "sourceCatalogId": "fake-source-catalog-id-1",
+                    "syncCatalog": "sync-catalog",
+                    "namespaceDefinition": "namespace-definition",
+                    "status": "conn-status",
+                }
+            ]
+        }
+    ),
+    get_sources=Mock(
+        return_value={
+            "sources": [
+                {"sourceId": "fake-source-id-1", "sourceName": "fake-source-name-1"}
+            ]
+        }
+    ),
+    get_destinations=Mock(
+        return_value={
+            "destinations": [
+                {
+                    "destinationId": "fake-destination-id-1",
+                    "destinationName": "fake-destination-name-1",
+                }
+            ]
         }
     ),
-    get_source=Mock(return_value={"sourceName": "fake-source-name-1"}),
-    get_destination=Mock(return_value={"destinationName": "fake-destination-name-1"}),
 )
 @patch.multiple(
     "ddpui.ddpprefect.prefect_service",
@@ -1175,7 +1364,7 @@ def test_get_airbyte_connection_success(org_with_workspace):
 
     OrgDataFlow.objects.create(
         org=org_with_workspace,
-        connection_id="fake-connection-id-1",
+        connection_id="fake-connection-id",
         deployment_id="fake-deployment-id",
     )
 
@@ -1427,6 +1616,153 @@ def test_post_airbyte_connection_success(
     assert response["deployment_id"] == "fake-deployment-id"
 
 
+@patch.multiple(
+    "ddpui.ddpairbyte.airbyte_service",
+    create_connection=Mock(
+        return_value={
+            "sourceId": "fake-source-id",
+            "destinationId": "fake-destination-id",
+            "connectionId": "fake-connection-id",
+            "sourceCatalogId": "fake-source-catalog-id",
+            "syncCatalog": "sync-catalog",
+            "status": "running",
+        }
+    ),
+    get_source=Mock(return_value={"sourceName": "source-name"}),
+    get_destination=Mock(return_value={"destinationName": "destination-name"}),
+)
+@patch.multiple(
+    "ddpui.ddpprefect.prefect_service",
+    create_dataflow=Mock(
+        return_value={
+            "deployment": {"id": "fake-deployment-id", "name": "fake-deployment-name"}
+        }
+    ),
+)
+def test_post_airbyte_connection_numbers_block_name(
+    org_with_workspace, warehouse_with_destination, airbyte_server_block
+):
+    """the block name is numbered after existing ones without asking prefect"""
+    warehouse_with_destination.airbyte_norm_op_id = "fake-operation-id"
+    warehouse_with_destination.save()
+    base_block_name = "test-org-slug-source-name-destination-name"
+    OrgPrefectBlock.objects.create(
+        org=org_with_workspace,
+        block_type=ddpprefect.AIRBYTECONNECTION,
+        block_id="existing-block-id",
+        block_name=base_block_name,
+    )
+    mock_request = Mock()
+    mock_request.orguser = Mock()
+    mock_request.orguser.org = org_with_workspace
+    payload = AirbyteConnectionCreate(
+        name="conn-name",
+        sourceId="source-id",
+        destinationId="dest-id",
+        destinationSchema="dest-schema",
+        streams=["stream_1"],
+        normalize=False,
+    )
+
+    with patch(
+        "ddpui.ddpprefect.prefect_service.create_airbyte_connection_block",
+        return_value="new-block-id",
+    ) as create_block_mock, patch(
+        "ddpui.ddpprefect.prefect_service.get_airbyte_connection_block_by_id",
+        return_value={
+            "id": "new-block-id",
+            "name": f"{base_block_name}-1",
+            "data": {"connection_id": "fake-connection-id"},
+        },
+    ) as get_block_mock:
+        response = post_airbyte_connection(mock_request, payload)
+
+    assert (
+        create_block_mock.call_args[0][0].connectionBlockName == f"{base_block_name}-1"
+    )
+    get_block_mock.assert_called_once_with("new-block-id")
+    assert response["blockName"] == f"{base_block_name}-1"
+    org_block = OrgPrefectBlock.objects.get(block_id="new-block-id")
+    assert org_block.block_name == f"{base_block_name}-1"
+    assert org_block.connection_id == "fake-connection-id"
+
+
+def test_next_block_name(org_with_workspace, django_assert_num_queries):
+    """the suffix is one more than the highest taken, in a single query"""
+    with django_assert_num_queries(1):
+        assert airbytehelpers.next_block_name("base") == "base"
+
+    for block_name in ["base", "base-1", "base-3", "base-other", "base-2-x"]:
+        OrgPrefectBlock.objects.create(
+            org=org_with_workspace, block_id=block_name, block_name=block_name
+        )
+    with django_assert_num_queries(1):
+        assert airbytehelpers.next_block_name("base") == "base-4"
+
+
+def test_create_named_block_retries_taken_name(org_with_workspace):
+    """a name taken between choosing it and inserting it is given up for the next"""
+    OrgPrefectBlock.objects.create(
+        org=org_with_workspace, block_id="taken-id", block_name="base"
+    )
+    create_block = Mock(return_value={"id": "block-id", "name": "base-1"})
+
+    with patch(
+        "ddpui.ddpairbyte.airbytehelpers.next_block_name",
+        side_effect=["base", "base-1"],
+    ):
+        org_block, block = airbytehelpers.create_named_block(
+            org_with_workspace, ddpprefect.AIRBYTECONNECTION, "base", create_block
+        )
+
+    create_block.assert_called_once_with("base-1")
+    assert block["id"] == "block-id"
+    assert org_block.block_id == "block-id"
+    assert OrgPrefectBlock.objects.filter(block_name="base-1").count() == 1
+
+
+def test_create_named_block_renamed_to_taken_name(org_with_workspace):
+    """a block the proxy renamed to a taken name is deleted before trying again"""
+    OrgPrefectBlock.objects.create(
+        org=org_with_workspace, block_id="taken-id", block_name="base-1"
+    )
+    create_block = Mock(
+        side_effect=[
+            {"id": "orphan-id", "name": "base-1"},
+            {"id": "block-id", "name": "base-2"},
+        ]
+    )
+
+    with patch(
+        "ddpui.ddpairbyte.airbytehelpers.next_block_name",
+        side_effect=["base", "base-2"],
+    ), patch(
+        "ddpui.ddpprefect.prefect_service.prefect_delete_a_block"
+    ) as delete_block_mock:
+        org_block, _ = airbytehelpers.create_named_block(
+            org_with_workspace, ddpprefect.AIRBYTECONNECTION, "base", create_block
+        )
+
+    delete_block_mock.assert_called_once_with("orphan-id")
+    assert org_block.block_name == "base-2"
+    assert sorted(
+        OrgPrefectBlock.objects.filter(org=org_with_workspace).values_list(
+            "block_id", flat=True
+        )
+    ) == ["block-id", "taken-id"]
+
+
+def test_create_named_block_failure_frees_name(org_with_workspace):
+    """the name is not kept when the block could not be created"""
+    create_block = Mock(side_effect=Exception("prefect is down"))
+
+    with pytest.raises(Exception):
+        airbytehelpers.create_named_block(
+            org_with_workspace, ddpprefect.AIRBYTECONNECTION, "base", create_block
+        )
+    assert not OrgPrefectBlock.objects.filter(block_name="base").exists()
+
+
 # ================================================================================
 def test_post_airbyte_connection_reset_no_workspace(org_without_workspace):
     mock_request = Mock()
@@ -1509,6 +1845,32 @@ def test_post_airbyte_connection_success(org_with_workspace):
         result = post_airbyte_connection_reset(mock_request, connection_block_id)
         assert result["success"] == 1
     reset_connection_mock.assert_called_once_with("the-connection-id")
+    assert (
+        OrgPrefectBlock.objects.get(block_id=connection_block_id).connection_id
+        == "the-connection-id"
+    )
+
+
+def test_post_airbyte_connection_reset_reads_connection_id(org_with_workspace):
+    """blocks which know their connection id are not looked up in prefect"""
+    mock_request = Mock()
+    mock_request.orguser = Mock()
+    mock_request.orguser.org = org_with_workspace
+
+    OrgPrefectBlock.objects.create(
+        org=org_with_workspace,
+        block_id="connection_block_id",
+        connection_id="the-connection-id",
+    )
+
+    with patch(
+        "ddpui.ddpprefect.prefect_service.get_airbyte_connection_block_by_id"
+    ) as get_block_mock, patch(
+        "ddpui.ddpairbyte.airbyte_service.reset_connection"
+    ) as reset_connection_mock:
+        post_airbyte_connection_reset(mock_request, "connection_block_id")
+    get_block_mock.assert_not_called()
+    reset_connection_mock.assert_called_once_with("the-connection-id")
 
 
 # ================================================================================
@@ -1792,6 +2154,17 @@ def test_delete_airbyte_connection_without_workspace(org_without_workspace):
     assert str(excinfo.value) == "create an airbyte workspace first"
 
 
+def test_delete_airbyte_connection_no_block(org_with_workspace):
+    mock_request = Mock()
+    mock_request.orguser = Mock()
+    mock_request.orguser.org = org_with_workspace
+
+    with pytest.raises(HttpError) as excinfo:
+        delete_airbyte_connection(mock_request, "conn-block-id")
+
+    assert str(excinfo.value) == "connection block not found"
+
+
 @patch.multiple(
     "ddpui.ddpprefect.prefect_service",
     get_airbyte_connection_block_by_id=Mock(
@@ -1897,3 +2270,41 @@ def test_get_job_status():
     result = get_job_status(mock_request, "fake-job-id")
     assert result["status"] == "completed"
     assert len(result["logs"]) == 3
+
+
+# ================================================================================
+def test_backfill_orgprefectblock_connection_id(org_with_workspace):
+    """the migration fills in connection ids from manual-sync deployments only"""
+    backfill = importlib.import_module(
+        "ddpui.migrations.0023_backfill_orgprefectblock_connection_id"
+    )
+    OrgPrefectBlock.objects.create(
+        org=org_with_workspace,
+        block_type=ddpprefect.AIRBYTECONNECTION,
+        block_id="block-id-1",
+        block_name="block-name-1",
+    )
+    OrgPrefectBlock.objects.create(
+        org=org_with_workspace,
+        block_type=ddpprefect.AIRBYTECONNECTION,
+        block_id="block-id-2",
+        block_name="block-name-2",
+    )
+    OrgDataFlow.objects.create(
+        org=org_with_workspace,
+        name="manual-sync-block-name-1",
+        connection_id="connection-id-1",
+    )
+
+    with patch(
+        "ddpui.ddpprefect.prefect_service.get_airbyte_connection_block_by_id"
+    ) as get_block_mock:
+        backfill.backfill_connection_ids(django_apps, None)
+
+    # the rest are looked up by the api when they are used
+    get_block_mock.assert_not_called()
+    assert dict(
+        OrgPrefectBlock.objects.filter(org=org_with_workspace).values_list(
+            "block_id", "connection_id"
+        )
+    ) == {"block-id-1": "connection-id-1", "block-id-2": None}
@@ -0,0 +1,163 @@
+import os
+import json
+import django
+
+from unittest.mock import Mock, patch
+import pytest
+from ninja.errors import HttpError
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "ddpui.settings")
+os.environ["DJANGO_ALLOW_ASYNC_UNSAFE"] = "true"
+django.setup()
+
+from ddpui.models.org import Org, OrgDataFlow
+from ddpui.api.client.dashboard_api import get_dashboard
+from ddpui.tests.helper.fake_prefect_proxy import FakePrefectProxy
+from ddpui.tests.helper.fake_redis import FakeRedis
+
+pytestmark = pytest.mark.django_db
+
+
+# ================================================================================
+@pytest.fixture
+def org_with_flows():
+    """a pytest fixture which creates an Org having two scheduled flows"""
+    print("creating org_with_flows")
+    org = Org.objects.create(name="org-name", slug="test-org-slug")
+    for idx in range(2):
+        OrgDataFlow.objects.create(
+            org=org,
+            name=f"flow-{idx}",
+            deployment_name=f"deployment-name-{idx}",
+            deployment_id=f"deployment-id-{idx}",
+            cron="0 */2 * * *",
+        )
+    yield org
+    print("deleting org_with_flows")
+    org.delete()
+
+
+def mock_request(org):
+    """a request from an orguser of org"""
+    mock_orguser = Mock()
+    mock_orguser.org = org
+    request = Mock()
+    request.orguser = mock_orguser
+    return request
+
+
+def flow_run(run_id: str, start_time: str) -> dict:
+    """a finished flow run as returned by the proxy"""
+    return {"id": run_id, "startTime": start_time, "status": "COMPLETED"}
+
+
+# ================================================================================
+def test_get_dashboard_no_org():
+    """tests GET /dashboard/ for an orguser without an org"""
+    with pytest.raises(HttpError) as excinfo:
+        get_dashboard(mock_request(None))
+    assert str(excinfo.value) == "register an organization first"
+
+
+def test_get_dashboard_fetches_only_new_runs(org_with_flows):
+    """a repeat view only asks the proxy for runs newer than the cached ones"""
+    proxy = FakePrefectProxy(
+        {
+            "deployment-id-0": [
+                flow_run("run-0b", "2023-06-01T02:00:00+00:00"),
+                flow_run("run-0a", "2023-06-01T00:00:00+00:00"),
+            ],
+            "deployment-id-1": [],
+        }
+    )
+    mock_prefect_get = Mock(side_effect=proxy.prefect_get)
+    with patch("ddpui.ddpprefect.prefect_service.prefect_get", mock_prefect_get), patch(
+        "ddpui.ddpprefect.prefect_service.RedisClient.get_instance",
+        return_value=FakeRedis(),
+    ):
+        result = get_dashboard(mock_request(org_with_flows))
+        assert [flow["deploymentId"] for flow in result] == [
+            "deployment-id-0",
+            "deployment-id-1",
+        ]
+        assert [run["id"] for run in result[0]["runs"]] == ["run-0b", "run-0a"]
+        assert result[1]["runs"] == []
+
+        proxy.flow_runs["deployment-id-0"].insert(
+            0, flow_run("run-0c", "2023-06-01T04:00:00+00:00")
+        )
+        mock_prefect_get.reset_mock()
+        result = get_dashboard(mock_request(org_with_flows))
+        assert [run["id"] for run in result[0]["runs"]] == [
+            "run-0c",
+            "run-0b",
+            "run-0a",
+        ]
+        params = {
+            call.kwargs["params"]["deployment_id"]: call.kwargs["params"]
+            for call in mock_prefect_get.call_args_list
+        }
+        # six hours before the newest cached run
+        assert params["deployment-id-0"]["start_time_gt"] == "2023-05-31T20:00:00+00:00"
+        assert params["deployment-id-1"]["start_time_gt"] is None
+
+
+def test_get_dashboard_run_which_finishes_late(org_with_flows):
+    """a run which finishes after a later one started still shows up"""
+    proxy = FakePrefectProxy(
+        {"deployment-id-0": [flow_run("run-0b", "2023-06-01T02:00:00+00:00")]}
+    )
+    with patch(
+        "ddpui.ddpprefect.prefect_service.prefect_get", proxy.prefect_get
+    ), patch(
+        "ddpui.ddpprefect.prefect_service.RedisClient.get_instance",
+        return_value=FakeRedis(),
+    ):
+        get_dashboard(mock_request(org_with_flows))
+        proxy.flow_runs["deployment-id-0"].append(
+            flow_run("run-0a", "2023-06-01T01:00:00+00:00")
+        )
+        result = get_dashboard(mock_request(org_with_flows))
+        assert [run["id"] for run in result[0]["runs"]] == ["run-0b", "run-0a"]
+
+
+def test_get_dashboard_caches_finished_runs_only(org_with_flows):
+    """a run which is not finished is fetched again on the next view"""
+    fakeredis = FakeRedis()
+    proxy = FakePrefectProxy(
+        {
+            "deployment-id-0": [
+                dict(flow_run("run-0b", "2023-06-01T02:00:00+00:00"), status="RUNNING"),
+                flow_run("run-0a", "2023-06-01T00:00:00+00:00"),
+            ]
+        }
+    )
+    with patch(
+        "ddpui.ddpprefect.prefect_service.prefect_get", proxy.prefect_get
+    ), patch(
+        "ddpui.ddpprefect.prefect_service.RedisClient.get_instance",
+        return_value=fakeredis,
+    ):
+        result = get_dashboard(mock_request(org_with_flows))
+    assert [run["id"] for run in result[0]["runs"]] == ["run-0b", "run-0a"]
+    cached = json.loads(fakeredis.store["flow-runs:deployment-id-0"])
+    assert [run["id"] for run in cached] == ["run-0a"]
+
+
+def test_get_dashboard_proxy_ignores_start_time(org_with_flows):
+    """runs the proxy sends again are not duplicated"""
+    proxy = FakePrefectProxy(
+        {"deployment-id-0": [flow_run("run-0a", "2023-06-01T00:00:00+00:00")]}
+    )
+
+    def prefect_get(endpoint, **kwargs):
+        kwargs["params"] = dict(kwargs["params"], start_time_gt=None)
+        return proxy.prefect_get(endpoint, **kwargs)
+
+    with patch("ddpui.ddpprefect.prefect_service.prefect_get", prefect_get), patch(
+        "ddpui.ddpprefect.prefect_service.RedisClient.get_instance",
+        return_value=FakeRedis(),
+    ):
+        get_dashboard(mock_request(org_with_flows))
+        result = get_dashboard(mock_request(org_with_flows))
+        assert [run["id"] for run in result[0]["runs"]] == ["run-0a"]
@@ -0,0 +1,424 @@
+import os
+import django
+
+from unittest.mock import Mock, patch
+import pytest
+from ninja.errors import HttpError
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "ddpui.settings")
+os.environ["DJANGO_ALLOW_ASYNC_UNSAFE"] = "true"
+django.setup()
+
+from ddpui.models.org import (
+    Org,
+    OrgDbt,
+    OrgDataFlow,
+    OrgPrefectBlock,
+    OrgWarehouse,
+)
+from ddpui.api.client.prefect_api import (
+    post_prefect_dbt_core_block,
+    get_prefect_dataflows,
+    get_prefect_flow_runs_log_history,
+    get_flow_runs_logs,
+)
+from ddpui.ddpprefect import prefect_service, DBTCORE
+from ddpui.ddpprefect.schema import DbtProfile, PrefectDbtCoreSetup, PrefectDbtRun
+from ddpui.tests.helper.fake_prefect_proxy import FakePrefectProxy
+from ddpui.tests.helper.fake_redis import FakeRedis
+
+pytestmark = pytest.mark.django_db
+
+
+# ================================================================================
+@pytest.fixture
+def org_with_flows():
+    """a pytest fixture which creates an Org having three scheduled flows"""
+    print("creating org_with_flows")
+    org = Org.objects.create(name="org-name", slug="test-org-slug")
+    for idx in range(3):
+        OrgDataFlow.objects.create(
+            org=org,
+            name=f"flow-{idx}",
+            deployment_name=f"deployment-name-{idx}",
+            deployment_id=f"deployment-id-{idx}",
+            cron="0 */2 * * *",
+        )
+    yield org
+    print("deleting org_with_flows")
+    org.delete()
+
+
+def mock_request(org):
+    """a request from an orguser of org"""
+    mock_orguser = Mock()
+    mock_orguser.org = org
+    request = Mock()
+    request.orguser = mock_orguser
+    return request
+
+
+FLOW_RUNS = {
+    "deployment-id-0": [{"id": "run-0b"}, {"id": "run-0a"}],
+    "deployment-id-2": [{"id": "run-2a"}],
+}
+
+
+# ================================================================================
+def test_get_prefect_dataflows_no_org():
+    """tests GET /flows/ for an orguser without an org"""
+    with pytest.raises(HttpError) as excinfo:
+        get_prefect_dataflows(mock_request(None))
+    assert str(excinfo.value) == "register an organization first"
+
+
+@patch.multiple(
+    "ddpui.ddpprefect.prefect_service",
+    get_filtered_deployments=Mock(
+        return_value=[{"deploymentId": "deployment-id-0", "isScheduleActive": True}]
+    ),
+)
+def test_get_prefect_dataflows_batched(org_with_flows):
+    """one upstream call fetches the last run of every flow"""
+    proxy = FakePrefectProxy(FLOW_RUNS)
+    with patch.multiple(
+        "ddpui.ddpprefect.prefect_service",
+        prefect_get=proxy.prefect_get,
+        prefect_post=proxy.prefect_post,
+    ):
+        result = get_prefect_dataflows(mock_request(org_with_flows))
+
+    assert [flow["lastRun"] for flow in result] == [
+        {"id": "run-0b"},
+        None,
+        {"id": "run-2a"},
+    ]
+    assert [flow["status"] for flow in result] == [True, False, False]
+    assert proxy.calls == [("POST", "flow_runs/last")]
+
+
+@patch.multiple(
+    "ddpui.ddpprefect.prefect_service",
+    get_filtered_deployments=Mock(return_value=[]),
+)
+def test_get_prefect_dataflows_without_batch_endpoint(org_with_flows):
+    """older proxies are queried once per deployment"""
+    proxy = FakePrefectProxy(FLOW_RUNS, batch=False)
+    with patch.multiple(
+        "ddpui.ddpprefect.prefect_service",
+        prefect_get=proxy.prefect_get,
+        prefect_post=proxy.prefect_post,
+        batch_flow_runs_retry_at=0.0,
+    ), patch("ddpui.ddpprefect.prefect_service.logger") as logger_mock:
+        result = get_prefect_dataflows(mock_request(org_with_flows))
+        # the proxy is not asked for the missing endpoint again
+        get_prefect_dataflows(mock_request(org_with_flows))
+
+    assert [flow["lastRun"] for flow in result] == [
+        {"id": "run-0b"},
+        None,
+        {"id": "run-2a"},
+    ]
+    assert proxy.calls.count(("GET", "flow_runs")) == 6
+    assert proxy.calls.count(("POST", "flow_runs/last")) == 1
+    logger_mock.warning.assert_called_once()
+
+
+def test_get_last_flow_runs_by_deployment_ids_error():
+    """errors other than a missing endpoint are not swallowed"""
+    with patch.multiple(
+        "ddpui.ddpprefect.prefect_service",
+        prefect_post=Mock(side_effect=HttpError(500, "connection error")),
+    ):
+        with pytest.raises(HttpError) as excinfo:
+            prefect_service.get_last_flow_runs_by_deployment_ids(["deployment-id"])
+    assert str(excinfo.value) == "connection error"
+
+
+HISTORY = {
+    "deployment-id": [
+        {"id": f"run-{idx}", "startTime": f"2023-06-01T{idx:02}:00:00+00:00"}
+        for idx in range(5, 0, -1)
+    ]
+}
+
+
+def test_get_prefect_flow_runs_log_history_pages():
+    """the history is returned a page at a time, without logs"""
+    proxy = FakePrefectProxy(HISTORY, logs={"run-5": [{"message": "hello"}]})
+    with patch("ddpui.ddpprefect.prefect_service.prefect_get", proxy.prefect_get):
+        page = get_prefect_flow_runs_log_history(Mock(), "deployment-id", limit=2)
+        assert [flow_run["id"] for flow_run in page["flow_runs"]] == ["run-5", "run-4"]
+        assert "logs" not in page["flow_runs"][0]
+
+        page = get_prefect_flow_runs_log_history(
+            Mock(), "deployment-id", limit=2, cursor=page["next_cursor"]
+        )
+        assert [flow_run["id"] for flow_run in page["flow_runs"]] == ["run-3", "run-2"]
+
+        page = get_prefect_flow_runs_log_history(
+            Mock(), "deployment-id", limit=2, cursor=page["next_cursor"]
+        )
+        assert [flow_run["id"] for flow_run in page["flow_runs"]] == ["run-1"]
+        assert page["next_cursor"] is None
+    assert not any(endpoint.startswith("flow_runs/logs") for _, endpoint in proxy.calls)
+
+
+def test_get_prefect_flow_runs_log_history_bad_limit():
+    """pages are bounded"""
+    with pytest.raises(HttpError) as excinfo:
+        get_prefect_flow_runs_log_history(Mock(), "deployment-id", limit=0)
+    assert str(excinfo.value) == "limit must be between 1 and 100"
+
+
+def test_get_prefect_flow_runs_log_history_with_logs():
+    """logs of finished runs are cached for good"""
+    proxy = FakePrefectProxy(HISTORY, logs={"run-5": [{"message": "hello"}]})
+    with patch(
+        "ddpui.ddpprefect.prefect_service.prefect_get", proxy.prefect_get
+    ), patch(
+        "ddpui.ddpprefect.prefect_service.RedisClient.get_instance",
+        return_value=FakeRedis(),
+    ):
+        page = get_prefect_flow_runs_log_history(
+            Mock(), "deployment-id", limit=2, logs=True
+        )
+        assert page["flow_runs"][0]["logs"] == [{"message": "hello"}]
+        assert page["flow_runs"][1]["logs"] == []
+        assert proxy.calls.count(("GET", "flow_runs/logs/run-5")) == 1
+
+        get_prefect_flow_runs_log_history(Mock(), "deployment-id", limit=2, logs=True)
+        assert proxy.calls.count(("GET", "flow_runs/logs/run-5")) == 1
+
+
+def test_get_prefect_flow_runs_log_history_same_start_time():
+    """runs which started at the same time are not skipped at a page boundary"""
+    proxy = FakePrefectProxy(
+        {
+            "deployment-id": [
+                {"id": f"run-{idx}", "startTime": "2023-06-01T00:00:00+00:00"}
+                for idx in range(5)
+            ]
+            + [{"id": "run-early", "startTime": "2023-05-31T00:00:00+00:00"}]
+        }
+    )
+    seen = []
+    cursor = None
+    with patch("ddpui.ddpprefect.prefect_service.prefect_get", proxy.prefect_get):
+        while True:
+            page = get_prefect_flow_runs_log_history(
+                Mock(), "deployment-id", limit=2, cursor=cursor
+            )
+            seen += [flow_run["id"] for flow_run in page["flow_runs"]]
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+    assert seen == ["run-0", "run-1", "run-2", "run-3", "run-4", "run-early"]
+
+
+def test_get_prefect_flow_runs_log_history_unpaged():
+    """without a limit or cursor every run is returned with its logs, as before"""
+    proxy = FakePrefectProxy(HISTORY, logs={"run-5": [{"message": "hello"}]})
+    with patch(
+        "ddpui.ddpprefect.prefect_service.prefect_get", proxy.prefect_get
+    ), patch(
+        "ddpui.ddpprefect.prefect_service.RedisClient.get_instance",
+        return_value=FakeRedis(),
+    ):
+        flow_runs = get_prefect_flow_runs_log_history(Mock(), "deployment-id")
+    assert [flow_run["id"] for flow_run in flow_runs] == [
+        "run-5",
+        "run-4",
+        "run-3",
+        "run-2",
+        "run-1",
+    ]
+    assert flow_runs[0]["logs"] == [{"message": "hello"}]
+
+
+def test_get_flow_runs_logs_uses_cached_logs_only():
+    """the logs endpoint serves cached logs but caches nothing itself, since it
+    does not know whether the run has finished"""
+    proxy = FakePrefectProxy(HISTORY, logs={"run-5": [{"message": "hello"}]})
+    with patch(
+        "ddpui.ddpprefect.prefect_service.prefect_get", proxy.prefect_get
+    ), patch(
+        "ddpui.ddpprefect.prefect_service.RedisClient.get_instance",
+        return_value=FakeRedis(),
+    ):
+        for _ in range(2):
+            result = get_flow_runs_logs(Mock(), "run-4")
+            assert result["logs"]["logs"] == []
+        get_prefect_flow_runs_log_history(Mock(), "deployment-id", limit=1, logs=True)
+        result = get_flow_runs_logs(Mock(), "run-5")
+        assert result["logs"]["logs"] == [{"message": "hello"}]
+    assert proxy.calls.count(("GET", "flow_runs/logs/run-4")) == 2
+    assert proxy.calls.count(("GET", "flow_runs/logs/run-5")) == 1
+    assert not any(endpoint.startswith("flow_runs/run") for _, endpoint in proxy.calls)
+
+
+# ================================================================================
+@pytest.fixture
+def org_with_dbt(tmp_path):
+    """an org with a dbt workspace and a postgres warehouse"""
+    org = Org.objects.create(
+        name="org-name",
+        slug="test-org-slug",
+        dbt=OrgDbt.objects.create(
+            gitrepo_url="https://github.com/org/repo",
+            project_dir="project-dir",
+            dbt_version="1.4.5",
+            target_type="postgres",
+            default_schema="default-schema",
+        ),
+    )
+    OrgWarehouse.objects.create(org=org, wtype="postgres", credentials="secret-name")
+    (tmp_path / org.slug).mkdir()
+    with patch.dict(os.environ, {"CLIENTDBT_ROOT": str(tmp_path)}), patch(
+        "ddpui.utils.secretsmanager.retrieve_warehouse_credentials",
+        return_value={"host": "localhost"},
+    ):
+        yield org
+    org.delete()
+
+
+def dbt_blocks_response(json: dict) -> dict:
+    """what the proxy returns from blocks/dbtcore/bulk/"""
+    return {
+        "blocks": [
+            {"block_id": f"block-id-{idx}", "block_name": block["blockName"]}
+            for idx, block in enumerate(json["blocks"])
+        ]
+    }
+
+
+DBT_RUN_PAYLOAD = PrefectDbtRun(
+    profile=DbtProfile(name="profile-name", target_configs_schema="dest-schema")
+)
+
+
+def test_post_prefect_dbt_core_block_in_one_request(org_with_dbt):
+    """the five blocks are created in one proxy request and saved together"""
+    with patch(
+        "ddpui.ddpprefect.prefect_service.prefect_post",
+        side_effect=lambda endpoint, json: dbt_blocks_response(json),
+    ) as prefect_post_mock, patch(
+        "ddpui.ddpprefect.prefect_service.create_dataflow",
+        return_value={"deployment": {"id": "dep-id", "name": "dep-name"}},
+    ):
+        response = post_prefect_dbt_core_block(
+            mock_request(org_with_dbt), DBT_RUN_PAYLOAD
+        )
+
+    prefect_post_mock.assert_called_once()
+    assert prefect_post_mock.call_args[0][0] == "blocks/dbtcore/bulk/"
+    prefix = "test-org-slug-profile-name-dest-schema"
+    assert response["block_names"] == [
+        f"{prefix}-clean",
+        f"{prefix}-deps",
+        f"{prefix}-run",
+        f"{prefix}-test",
+        f"{prefix}-docs-generate",
+    ]
+    blocks = OrgPrefectBlock.objects.filter(
+        org=org_with_dbt, block_type=DBTCORE
+    ).order_by("seq")
+    assert [block.command for block in blocks] == [
+        "clean",
+        "deps",
+        "run",
+        "test",
+        "docs-generate",
+    ]
+    assert blocks[2].block_id == "block-id-2"
+    dataflow = OrgDataFlow.objects.get(org=org_with_dbt)
+    assert dataflow.name == f"manual-run-{prefix}-run"
+    assert dataflow.deployment_id == "dep-id"
+
+
+def test_post_prefect_dbt_core_block_deployment_fails(org_with_dbt):
+    """if the deployment cannot be created the blocks are deleted and not saved"""
+    with patch(
+        "ddpui.ddpprefect.prefect_service.prefect_post",
+        side_effect=lambda endpoint, json: dbt_blocks_response(json),
+    ), patch(
+        "ddpui.ddpprefect.prefect_service.create_dataflow",
+        side_effect=HttpError(500, "prefect is down"),
+    ), patch(
+        "ddpui.ddpprefect.prefect_service.post_prefect_blocks_bulk_delete"
+    ) as bulk_delete_mock:
+        with pytest.raises(HttpError) as excinfo:
+            post_prefect_dbt_core_block(mock_request(org_with_dbt), DBT_RUN_PAYLOAD)
+
+    assert str(excinfo.value) == "prefect is down"
+    assert len(bulk_delete_mock.call_args[0][0]) == 5
+    assert not OrgPrefectBlock.objects.filter(org=org_with_dbt).exists()
+    assert not OrgDataFlow.objects.filter(org=org_with_dbt).exists()
+
+
+def test_post_prefect_dbt_core_block_save_fails(org_with_dbt):
+    """if the records cannot be saved the deployment goes too, and the error is
+    the save's even when the cleanup fails"""
+    with patch(
+        "ddpui.ddpprefect.prefect_service.prefect_post",
+        side_effect=lambda endpoint, json: dbt_blocks_response(json),
+    ), patch(
+        "ddpui.ddpprefect.prefect_service.create_dataflow",
+        return_value={"deployment": {"id": "dep-id", "name": "dep-name"}},
+    ), patch(
+        "ddpui.api.client.prefect_api.OrgDataFlow.objects.create",
+        side_effect=Exception("database is down"),
+    ), patch(
+        "ddpui.ddpprefect.prefect_service.delete_deployment_by_id"
+    ) as delete_deployment_mock, patch(
+        "ddpui.ddpprefect.prefect_service.post_prefect_blocks_bulk_delete",
+        side_effect=HttpError(500, "prefect is down"),
+    ) as bulk_delete_mock:
+        with pytest.raises(HttpError) as excinfo:
+            post_prefect_dbt_core_block(mock_request(org_with_dbt), DBT_RUN_PAYLOAD)
+
+    assert str(excinfo.value) == "database is down"
+    delete_deployment_mock.assert_called_once_with("dep-id")
+    bulk_delete_mock.assert_called_once()
+    assert not OrgPrefectBlock.objects.filter(org=org_with_dbt).exists()
+
+
+def test_create_dbt_core_blocks_without_bulk_endpoint():
+    """older proxies get one request per block, and a failure undoes the others"""
+    dbtcores = [
+        PrefectDbtCoreSetup(
+            block_name=f"block-{idx}",
+            profiles_dir="profiles",
+            project_dir="project",
+            working_dir="project",
+            env={},
+            commands=["dbt run"],
+        )
+        for idx in range(3)
+    ]
+    created = []
+
+    def prefect_post(endpoint, json):
+        if endpoint == "blocks/dbtcore/bulk/":
+            raise HttpError(404, "Not Found")
+        if json["blockName"] == "block-2":
+            raise HttpError(400, "bad block")
+        created.append(json["blockName"])
+        return {"block_id": f"id-{json['blockName']}", "block_name": json["blockName"]}
+
+    with patch(
+        "ddpui.ddpprefect.prefect_service.prefect_post", side_effect=prefect_post
+    ), patch(
+        "ddpui.ddpprefect.prefect_service.post_prefect_blocks_bulk_delete"
+    ) as bulk_delete_mock:
+        with pytest.raises(HttpError):
+            prefect_service.create_dbt_core_blocks(
+                dbtcores,
+                DbtProfile(name="profile", target_configs_schema="schema"),
+                "schema",
+                "postgres",
+                {},
+                None,
+            )
+    assert created == ["block-0", "block-1"]
+    bulk_delete_mock.assert_called_once_with(["id-block-0", "id-block-1"])
@@ -0,0 +1,97 @@
+import os
+import django
+
+from unittest.mock import Mock, patch
+import pytest
+from ninja.errors import HttpError
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "ddpui.settings")
+os.environ["DJANGO_ALLOW_ASYNC_UNSAFE"] = "true"
+django.setup()
+
+from ddpui.api.client.task_api import get_task, wait_for_task
+from ddpui.utils.taskprogress import TaskProgress
+from ddpui.tests.helper.fake_redis import FakeRedis
+
+
+@pytest.fixture
+def fakeredis():
+    """a fake redis behind TaskProgress"""
+    fakeredis = FakeRedis()
+    with patch(
+        "ddpui.utils.taskprogress.RedisClient.get_instance", return_value=fakeredis
+    ):
+        yield fakeredis
+
+
+def test_get_task_no_such_task(fakeredis):  # pylint: disable=unused-argument
+    """tests GET /tasks/{task_id} for an unknown task"""
+    with pytest.raises(HttpError) as excinfo:
+        get_task(Mock(), "task-id")
+    assert str(excinfo.value) == "no such task id"
+
+
+def test_get_task_since(fakeredis):  # pylint: disable=unused-argument
+    """each poll returns only the steps added since the last one"""
+    taskprogress = TaskProgress("task-id")
+    taskprogress.add({"message": "started"})
+    taskprogress.add({"message": "cloned"})
+
+    result = get_task(Mock(), "task-id")
+    assert result["progress"] == [{"message": "started"}, {"message": "cloned"}]
+    since = result["next"]
+    assert get_task(Mock(), "task-id", since=since) == {
+        "progress": [],
+        "next": since,
+    }
+
+    taskprogress.add({"message": "completed"})
+    result = get_task(Mock(), "task-id", since=since)
+    assert result["progress"] == [{"message": "completed"}]
+    assert result["next"] != since
+
+
+def test_get_task_reads_from_since(fakeredis):
+    """a poll asks redis only for the entries after since"""
+    taskprogress = TaskProgress("task-id")
+    taskprogress.add({"message": "started"})
+    since = get_task(Mock(), "task-id")["next"]
+    fakeredis.xrange = Mock(wraps=fakeredis.xrange)
+    get_task(Mock(), "task-id", since=since)
+    fakeredis.xrange.assert_called_once_with("taskprogress:task-id", min=f"({since}")
+
+
+def test_wait_for_task_returns_new_steps(fakeredis):  # pylint: disable=unused-argument
+    """a long poll returns as soon as there are new steps"""
+    taskprogress = TaskProgress("task-id")
+    taskprogress.add({"message": "started"})
+    since = get_task(Mock(), "task-id")["next"]
+    taskprogress.add({"message": "cloned"})
+    result = wait_for_task(Mock(), "task-id", since=since)
+    assert result["progress"] == [{"message": "cloned"}]
+
+
+def test_wait_for_task_blocks_on_redis(fakeredis):
+    """with nothing new the poll blocks in redis rather than in python"""
+    TaskProgress("task-id").add({"message": "started"})
+    since = get_task(Mock(), "task-id")["next"]
+    fakeredis.xread = Mock(return_value=[])
+    assert wait_for_task(Mock(), "task-id", since=since, timeout=5) == {
+        "progress": [],
+        "next": since,
+    }
+    fakeredis.xread.assert_called_once_with({"taskprogress:task-id": since}, block=5000)
+
+
+def test_wait_for_task_no_such_task(fakeredis):  # pylint: disable=unused-argument
+    """a task which never reports anything is unknown"""
+    with pytest.raises(HttpError) as excinfo:
+        wait_for_task(Mock(), "task-id", timeout=1)
+    assert str(excinfo.value) == "no such task id"
+
+
+def test_wait_for_task_bad_timeout():
+    """long polls are bounded"""
+    with pytest.raises(HttpError) as excinfo:
+        wait_for_task(Mock(), "task-id", timeout=3600)
+    assert str(excinfo.value) == "timeout must be between 1 and 30 seconds"
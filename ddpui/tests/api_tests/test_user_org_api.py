@@ -194,7 +194,7 @@ def test_post_organization_user_invalid_email(authuser):
     assert str(excinfo.value) == "that is not a valid email address"
 
 
-@patch.multiple("ddpui.utils.sendgrid", send_signup_email=Mock(return_value=1))
+@patch("ddpui.api.client.user_org_api.send_template_emails", Mock())
 def test_post_organization_user_success():
     """a success test"""
     mock_request = Mock()
@@ -476,7 +476,9 @@ def test_post_organization_user_invite_failure(orguser):
     invitation.delete()
 
 
-def test_post_organization_user_invite(orguser):
+@patch.dict(os.environ, {"SENDGRID_INVITE_USERS_TEMPLATE": "invite-template"})
+@patch("ddpui.api.client.user_org_api.send_template_emails")
+def test_post_organization_user_invite(send_template_emails_mock, orguser):
     """success test, inviting a new user"""
     payload = InvitationSchema(
         invited_email="inivted_email",
@@ -508,6 +510,33 @@ def test_post_organization_user_invite(orguser):
     assert response.invited_role == payload.invited_role
     assert response.invited_on == payload.invited_on
     assert response.invite_code == payload.invite_code
+    send_template_emails_mock.delay.assert_called_once()
+    template_id, recipients = send_template_emails_mock.delay.call_args.args
+    assert template_id == "invite-template"
+    assert recipients[0]["to_email"] == payload.invited_email
+    assert recipients[0]["template_vars"]["url"].endswith(
+        f"/invitations/?invite_code={response.invite_code}"
+    )
+
+
+@patch.dict(os.environ, {"SENDGRID_INVITE_USERS_TEMPLATE": ""})
+@patch("ddpui.api.client.user_org_api.send_template_emails")
+def test_post_organization_user_invite_without_template(
+    send_template_emails_mock, orguser
+):
+    """the invitation is created but not emailed when there is no template"""
+    payload = InvitationSchema(
+        invited_email="inivted_email",
+        invited_role=1,
+        invited_by=None,
+        invited_on=timezone.as_ist(datetime.now()),
+        invite_code="invite_code",
+    )
+    mock_request = Mock()
+    mock_request.orguser = orguser
+    post_organization_user_invite(mock_request, payload)
+    assert Invitation.objects.filter(invited_email=payload.invited_email).exists()
+    send_template_emails_mock.delay.assert_not_called()
 
 
 # ================================================================================
@@ -607,9 +636,9 @@ def test_post_forgot_password_nosuchuser():
     assert response["success"] == 1
 
 
-@patch.multiple(
-    "ddpui.utils.sendgrid",
-    send_password_reset_email=Mock(side_effect=Exception("error")),
+@patch(
+    "ddpui.api.client.user_org_api.send_template_emails",
+    Mock(delay=Mock(side_effect=Exception("error"))),
 )
 def test_post_forgot_password_emailfailed():
     """failure test, could not send email"""
@@ -622,7 +651,7 @@ def test_post_forgot_password_emailfailed():
     assert str(excinfo.value) == "failed to send email"
 
 
-@patch.multiple("ddpui.utils.sendgrid", send_password_reset_email=Mock(return_value=1))
+@patch("ddpui.api.client.user_org_api.send_template_emails", Mock())
 def test_post_forgot_password_success():
     """success test, forgot password email sent"""
     mock_request = Mock()
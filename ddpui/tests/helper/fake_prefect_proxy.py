@@ -0,0 +1,69 @@
+"""an in-memory stand-in for the prefect proxy's flow-run endpoints"""
+from ninja.errors import HttpError
+
+
+class FakePrefectProxy:
+    """
+    answers prefect_service.prefect_get / prefect_post from a dict of
+    {deployment_id: [flow_run, ...]} with the newest run first, the way the
+    proxy does, and from a dict of {flow_run_id: [log, ...]}. with batch=False
+    it behaves like a proxy which predates the batch flow_runs/last endpoint
+    """
+
+    def __init__(self, flow_runs: dict, batch: bool = True, logs: dict = None) -> None:
+        self.flow_runs = flow_runs
+        self.batch = batch
+        self.logs = logs or {}
+        self.calls = []
+
+    def prefect_get(self, endpoint: str, **kwargs) -> dict:
+        """
+        GET flow_runs?deployment_id=...&limit=...&start_time_gt=...&start_time_lt=...
+        GET flow_runs/logs/{flow_run_id}?offset=...
+        GET flow_runs/{flow_run_id}
+        """
+        self.calls.append(("GET", endpoint))
+        params = kwargs.get("params", {})
+        if endpoint.startswith("flow_runs/logs/"):
+            flow_run_id = endpoint.split("/")[-1]
+            logs = self.logs.get(flow_run_id, [])[params.get("offset", 0) :]
+            return {"offset": params.get("offset", 0), "logs": logs}
+        if endpoint.startswith("flow_runs/"):
+            flow_run_id = endpoint.split("/")[-1]
+            for flow_runs in self.flow_runs.values():
+                for flow_run in flow_runs:
+                    if flow_run["id"] == flow_run_id:
+                        return flow_run
+            raise HttpError(404, "Not Found")
+        if endpoint != "flow_runs":
+            raise HttpError(404, "Not Found")
+        flow_runs = list(self.flow_runs.get(params["deployment_id"], []))
+        if params.get("start_time_gt"):
+            flow_runs = [
+                flow_run
+                for flow_run in flow_runs
+                if flow_run["startTime"] > params["start_time_gt"]
+            ]
+        if params.get("start_time_lt"):
+            flow_runs = [
+                flow_run
+                for flow_run in flow_runs
+                if flow_run["startTime"] < params["start_time_lt"]
+            ]
+        if params.get("limit"):
+            flow_runs = flow_runs[: params["limit"]]
+        return {"flow_runs": [dict(flow_run) for flow_run in flow_runs]}
+
+    def prefect_post(self, endpoint: str, json: dict) -> dict:
+        """POST flow_runs/last {"deployment_ids": [...]}"""
+        self.calls.append(("POST", endpoint))
+        if endpoint != "flow_runs/last" or not self.batch:
+            raise HttpError(404, "Not Found")
+        return {
+            "flow_runs": {
+                deployment_id: self.flow_runs[deployment_id][0]
+                if self.flow_runs.get(deployment_id)
+                else None
+                for deployment_id in json["deployment_ids"]
+            }
+        }
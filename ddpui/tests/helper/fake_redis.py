@@ -0,0 +1,116 @@
+"""an in-memory stand-in for the few redis commands the app uses"""
+
+
+class FakeRedis:
+    """stores values the way redis returns them, as bytes"""
+
+    def __init__(self):
+        self.store = {}
+
+    def get(self, key):
+        """GET"""
+        return self.store.get(key)
+
+    def set(self, key, value, ex=None):  # pylint: disable=unused-argument
+        """SET, ignoring the expiry"""
+        self.store[key] = value.encode("utf-8") if isinstance(value, str) else value
+
+    def delete(self, *keys):
+        """DEL"""
+        for key in keys:
+            self.store.pop(key, None)
+
+    def ttl(self, key):  # pylint: disable=unused-argument
+        """TTL"""
+        return 60
+
+    def incr(self, key):
+        """INCR"""
+        value = int(self.store.get(key, b"0")) + 1
+        self.store[key] = str(value).encode("utf-8")
+        return value
+
+    def exists(self, *keys):
+        """EXISTS"""
+        return sum(1 for key in keys if key in self.store)
+
+    def expire(self, key, seconds):  # pylint: disable=unused-argument
+        """EXPIRE, which does nothing here"""
+        return key in self.store
+
+    def xadd(self, key, fields, id="*"):  # pylint: disable=redefined-builtin
+        """XADD, numbering the entries 1-0, 2-0, ... when no id is given"""
+        entries = self.store.setdefault(key, [])
+        if id == "*":
+            id = f"{stream_id(entries[-1][0])[0] + 1 if entries else 1}-0"
+        if entries and stream_id(entries[-1][0]) >= stream_id(id):
+            raise ValueError("stream ids must increase")
+        entries.append(
+            (
+                id.encode("utf-8"),
+                {
+                    field.encode("utf-8"): str(value).encode("utf-8")
+                    for field, value in fields.items()
+                },
+            )
+        )
+        return id.encode("utf-8")
+
+    def xrange(self, key, min="-", max="+"):  # pylint: disable=redefined-builtin
+        """XRANGE, where "(" before min excludes it"""
+        exclusive = min.startswith("(")
+        low = (0, 0) if min == "-" else stream_id(min.lstrip("("))
+        high = None if max == "+" else stream_id(max)
+        return [
+            (entry_id, fields)
+            for entry_id, fields in self.store.get(key, [])
+            if (low < stream_id(entry_id) if exclusive else low <= stream_id(entry_id))
+            and (high is None or stream_id(entry_id) <= high)
+        ]
+
+    def xread(self, streams, block=None):  # pylint: disable=unused-argument
+        """XREAD, which never blocks"""
+        result = []
+        for key, last_id in streams.items():
+            entries = [
+                (entry_id, fields)
+                for entry_id, fields in self.store.get(key, [])
+                if stream_id(entry_id) > stream_id(last_id)
+            ]
+            if entries:
+                result.append([key.encode("utf-8"), entries])
+        return result
+
+    def pipeline(self):
+        """a pipeline which runs each command straight away"""
+        return FakePipeline(self)
+
+
+def stream_id(entry_id) -> tuple:
+    """parses a stream entry id like "3-0" """
+    if isinstance(entry_id, bytes):
+        entry_id = entry_id.decode("utf-8")
+    millis, _, seq = entry_id.partition("-")
+    return (int(millis), int(seq or 0))
+
+
+class FakePipeline:
+    """collects the results of commands until execute() is called"""
+
+    def __init__(self, redis):
+        self.redis = redis
+        self.results = []
+
+    def __getattr__(self, name):
+        command = getattr(self.redis, name)
+
+        def queue(*args, **kwargs):
+            self.results.append(command(*args, **kwargs))
+            return self
+
+        return queue
+
+    def execute(self):
+        """returns the results of the queued commands"""
+        results, self.results = self.results, []
+        return results
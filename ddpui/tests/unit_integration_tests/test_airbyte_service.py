@@ -1,4 +1,5 @@
 import os
+import json
 from unittest import mock
 from unittest.mock import patch, Mock
 import django
@@ -12,6 +13,8 @@ django.setup()
 from ninja.errors import HttpError
 from ddpui.tests.helper.test_airbyte_unit_schemas import *
 from ddpui.ddpairbyte.airbyte_service import *
+from ddpui.utils.httpsession import PooledSession
+from redis.exceptions import RedisError
 
 
 @pytest.fixture(scope="module")
@@ -49,6 +52,17 @@ def valid_sourcedef_id(valid_workspace_id):
     return source_definition_id
 
 
+@pytest.fixture(autouse=True)
+def bypass_definitions_cache():
+    """every test sees the response of its own mocked airbyte server"""
+    with patch.object(
+        definitions_cache,
+        "get_or_fetch",
+        side_effect=lambda scope, key, fetch: fetch(),
+    ):
+        yield
+
+
 def mock_abreq(endpoint, data):
     return {"connectionSpecification": {"test": "data"}}
 
@@ -59,7 +73,7 @@ def test_abreq_success():
         "workspaces": [{"workspaceId": "1", "name": "Example Workspace"}]
     }
 
-    with patch("ddpui.ddpairbyte.airbyte_service.requests.post") as mock_post:
+    with patch("ddpui.ddpairbyte.airbyte_service.absession.post") as mock_post:
         mock_post.return_value.status_code = 200
         mock_post.return_value.headers = {"Content-Type": "application/json"}
         mock_post.return_value.json.return_value = expected_response
@@ -75,7 +89,7 @@ def test_abreq_success():
 def test_abreq_connection_error():
     endpoint = "my_endpoint"
 
-    with patch("ddpui.ddpairbyte.airbyte_service.requests.post") as mock_post:
+    with patch("ddpui.ddpairbyte.airbyte_service.absession.post") as mock_post:
         mock_post.side_effect = requests.exceptions.ConnectionError(
             "Error connecting to Airbyte server"
         )
@@ -88,11 +102,62 @@ def test_abreq_connection_error():
         assert str(excinfo.value) == "Error connecting to Airbyte server"
 
 
+def test_abreq_endpoint_timeout():
+    with patch("ddpui.ddpairbyte.airbyte_service.absession.post") as mock_post:
+        mock_post.return_value.status_code = 200
+        mock_post.return_value.headers = {"Content-Type": "application/json"}
+        mock_post.return_value.json.return_value = {"catalog": {}}
+
+        abreq("sources/discover_schema", {"sourceId": "source-id"})
+        assert mock_post.call_args.kwargs["timeout"] == AIRBYTE_JOB_HTTP_TIMEOUT
+
+        abreq("sources/get", {"sourceId": "source-id"})
+        assert mock_post.call_args.kwargs["timeout"] == AIRBYTE_HTTP_TIMEOUT
+
+
+def test_abreq_decodes_response_once():
+    with patch("ddpui.ddpairbyte.airbyte_service.absession.post") as mock_post:
+        mock_post.return_value.status_code = 200
+        mock_post.return_value.headers = {"Content-Type": "application/json"}
+        mock_post.return_value.content = b'{"sources": []}'
+        mock_post.return_value.json.return_value = {"sources": []}
+
+        assert abreq("sources/list", {"workspaceId": "workspace-id"}) == {"sources": []}
+        mock_post.return_value.json.assert_called_once()
+
+
+def test_abreq_strips_icons():
+    """connector icons are not passed on in any response"""
+    with patch("ddpui.ddpairbyte.airbyte_service.absession.post") as mock_post:
+        mock_post.return_value.status_code = 200
+        mock_post.return_value.headers = {"Content-Type": "application/json"}
+        mock_post.return_value.json.return_value = {
+            "sourceId": "source-id",
+            "icon": "<svg/>",
+            "connections": [{"connectionId": "connection-id", "icon": "<svg/>"}],
+        }
+
+        assert abreq("sources/get", {"sourceId": "source-id"}) == {
+            "sourceId": "source-id",
+            "connections": [{"connectionId": "connection-id"}],
+        }
+
+
+def test_pooled_session_is_rebuilt_after_fork():
+    pooled = PooledSession(2)
+    session = pooled.session()
+    assert pooled.session() is session
+    assert pooled.stats() == {"requests": 0, "hits": 0, "misses": 0}
+
+    with patch("ddpui.utils.httpsession.os.getpid", return_value=-1):
+        assert pooled.session() is not session
+
+
 # def test_abreq_invalid_request_data():
 #     endpoint = "workspaces/create"
 #     req = {"invalid_key": "invalid_value"}
 
-#     with patch("ddpui.ddpairbyte.airbyte_service.requests.post") as mock_post:
+#     with patch("ddpui.ddpairbyte.airbyte_service.absession.post") as mock_post:
 #         mock_post.return_value.status_code = 400
 #         mock_post.return_value.headers = {"Content-Type": "application/json"}
 #         mock_post.return_value.json.return_value = {"error": "Invalid request data"}
@@ -103,7 +168,7 @@ def test_abreq_connection_error():
 
 
 def test_get_workspaces_success():
-    with patch("ddpui.ddpairbyte.airbyte_service.requests.post") as mock_post:
+    with patch("ddpui.ddpairbyte.airbyte_service.absession.post") as mock_post:
         mock_post.return_value.status_code = 200
         mock_post.return_value.headers = {"Content-Type": "application/json"}
         mock_post.return_value.json.return_value = {
@@ -116,7 +181,7 @@ def test_get_workspaces_success():
 
 
 def test_get_workspaces_failure():
-    with patch("ddpui.ddpairbyte.airbyte_service.requests.post") as mock_post:
+    with patch("ddpui.ddpairbyte.airbyte_service.absession.post") as mock_post:
         mock_post.return_value.status_code = 404
         mock_post.return_value.headers = {"Content-Type": "application/json"}
         mock_post.return_value.json.return_value = {"error": "Invalid request data"}
@@ -128,7 +193,7 @@ def test_get_workspaces_failure():
 
 def test_create_workspace_with_valid_name(valid_name):
     # check if workspace is created successfully using mock_abreq
-    with patch("ddpui.ddpairbyte.airbyte_service.requests.post") as mock_post:
+    with patch("ddpui.ddpairbyte.airbyte_service.absession.post") as mock_post:
         mock_post.return_value.status_code = 200
         mock_post.return_value.headers = {"Content-Type": "application/json"}
         mock_post.return_value.json.return_value = {
@@ -148,7 +213,7 @@ def test_create_workspace_invalid_name():
 
 
 def test_create_workspace_failure():
-    with patch("ddpui.ddpairbyte.airbyte_service.requests.post") as mock_post:
+    with patch("ddpui.ddpairbyte.airbyte_service.absession.post") as mock_post:
         mock_post.return_value.status_code = 400
         mock_post.return_value.headers = {"Content-Type": "application/json"}
         mock_post.return_value.json.return_value = {"error": "Invalid request data"}
@@ -159,7 +224,7 @@ def test_create_workspace_failure():
 
 
 def test_get_workspace_success():
-    with patch("ddpui.ddpairbyte.airbyte_service.requests.post") as mock_post:
+    with patch("ddpui.ddpairbyte.airbyte_service.absession.post") as mock_post:
         mock_post.return_value.status_code = 200
         mock_post.return_value.headers = {"Content-Type": "application/json"}
         mock_post.return_value.json.return_value = {
@@ -178,7 +243,7 @@ def test_get_workspace_success_with_invalid_workspace_id():
 
 
 def test_get_workspace_failure():
-    with patch("ddpui.ddpairbyte.airbyte_service.requests.post") as mock_post:
+    with patch("ddpui.ddpairbyte.airbyte_service.absession.post") as mock_post:
         mock_post.return_value.status_code = 404
         mock_post.return_value.headers = {"Content-Type": "application/json"}
         mock_post.return_value.json.return_value = {"error": "Invalid request data"}
@@ -189,7 +254,7 @@ def test_get_workspace_failure():
 
 
 def test_set_workspace_name_success():
-    with patch("ddpui.ddpairbyte.airbyte_service.requests.post") as mock_post:
+    with patch("ddpui.ddpairbyte.airbyte_service.absession.post") as mock_post:
         mock_post.return_value.status_code = 200
         mock_post.return_value.headers = {"Content-Type": "application/json"}
         mock_post.return_value.json.return_value = {
@@ -214,7 +279,7 @@ def test_set_workspace_name_with_invalid_name():
 
 
 def test_set_workspace_name_failure():
-    with patch("ddpui.ddpairbyte.airbyte_service.requests.post") as mock_post:
+    with patch("ddpui.ddpairbyte.airbyte_service.absession.post") as mock_post:
         mock_post.return_value.status_code = 404
         mock_post.return_value.headers = {"Content-Type": "application/json"}
         mock_post.return_value.json.return_value = {"error": "Invalid request data"}
@@ -225,7 +290,7 @@ def test_set_workspace_name_failure():
 
 
 def test_get_source_definitions_success():
-    with patch("ddpui.ddpairbyte.airbyte_service.requests.post") as mock_post:
+    with patch("ddpui.ddpairbyte.airbyte_service.absession.post") as mock_post:
         mock_post.return_value.status_code = 200
         mock_post.return_value.headers = {"Content-Type": "application/json"}
         mock_post.return_value.json.return_value = {
@@ -238,8 +303,26 @@ def test_get_source_definitions_success():
         assert isinstance(result, list)
 
 
+def test_get_source_definitions_strips_icons():
+    with patch("ddpui.ddpairbyte.airbyte_service.absession.post") as mock_post:
+        mock_post.return_value.status_code = 200
+        mock_post.return_value.headers = {"Content-Type": "application/json"}
+        mock_post.return_value.json.return_value = {
+            "sourceDefinitions": [
+                {"sourceDefinitionId": "1", "name": "source-1", "icon": "<svg/>"},
+            ]
+        }
+        result = get_source_definitions("test")["sourceDefinitions"]
+        assert result == [{"sourceDefinitionId": "1", "name": "source-1"}]
+        definitions_cache.get_or_fetch.assert_called_once()
+        assert definitions_cache.get_or_fetch.call_args[0][:2] == (
+            "test",
+            "source-definitions",
+        )
+
+
 def test_get_source_definitions_failure():
-    with patch("ddpui.ddpairbyte.airbyte_service.requests.post") as mock_post:
+    with patch("ddpui.ddpairbyte.airbyte_service.absession.post") as mock_post:
         mock_post.return_value.status_code = 404
         mock_post.return_value.headers = {"Content-Type": "application/json"}
         mock_post.return_value.json.return_value = {"error": "Invalid request data"}
@@ -271,7 +354,7 @@ def test_get_source_definition_specification_success():
 
 
 def test_get_source_definition_specification_failure():
-    with patch("ddpui.ddpairbyte.airbyte_service.requests.post") as mock_post:
+    with patch("ddpui.ddpairbyte.airbyte_service.absession.post") as mock_post:
         mock_post.return_value.status_code = 404
         mock_post.return_value.headers = {"Content-Type": "application/json"}
         mock_post.return_value.json.return_value = {"error": "Invalid request data"}
@@ -334,7 +417,9 @@ def test_create_custom_source_definition_success():
     documentation_url = "test"
     expected_response = {"sourceDefinitionId": "1", "name": "test"}
 
-    with patch("ddpui.ddpairbyte.airbyte_service.requests.post") as mock_post:
+    with patch(
+        "ddpui.ddpairbyte.airbyte_service.absession.post"
+    ) as mock_post, patch.object(definitions_cache, "invalidate") as mock_invalidate:
         mock_post.return_value.status_code = 200
         mock_post.return_value.headers = {"Content-Type": "application/json"}
         mock_post.return_value.json.return_value = expected_response
@@ -343,6 +428,7 @@ def test_create_custom_source_definition_success():
         )
         assert result == expected_response
         assert isinstance(result, dict)
+        mock_invalidate.assert_called_once_with(workspace_id)
 
 
 def test_create_custom_source_definition_failure():
@@ -351,7 +437,7 @@ def test_create_custom_source_definition_failure():
     docker_repository = "test"
     docker_image_tag = "test"
     documentation_url = "test"
-    with patch("ddpui.ddpairbyte.airbyte_service.requests.post") as mock_post:
+    with patch("ddpui.ddpairbyte.airbyte_service.absession.post") as mock_post:
         mock_post.return_value.status_code = 404
         mock_post.return_value.headers = {"Content-Type": "application/json"}
         mock_post.return_value.json.return_value = {"error": "Invalid request data"}
@@ -371,7 +457,7 @@ def test_get_sources_success():
     workspace_id = "my_workspace_id"
     expected_response = {"sources": [{"sourceId": "1", "name": "Example Source 1"}]}
 
-    with patch("ddpui.ddpairbyte.airbyte_service.requests.post") as mock_post:
+    with patch("ddpui.ddpairbyte.airbyte_service.absession.post") as mock_post:
         mock_post.return_value.status_code = 200
         mock_post.return_value.headers = {"Content-Type": "application/json"}
         mock_post.return_value.json.return_value = expected_response
@@ -381,7 +467,7 @@ def test_get_sources_success():
 
 def test_get_sources_failure():
     workspace_id = "my_workspace_id"
-    with patch("ddpui.ddpairbyte.airbyte_service.requests.post") as mock_post:
+    with patch("ddpui.ddpairbyte.airbyte_service.absession.post") as mock_post:
         mock_post.return_value.status_code = 404
         mock_post.return_value.headers = {"Content-Type": "application/json"}
         mock_post.return_value.json.return_value = {"error": "Invalid request data"}
@@ -402,7 +488,7 @@ def test_get_source_success():
     source_id = "1"
     expected_response = {"sourceId": "1", "name": "Example Source 1"}
 
-    with patch("ddpui.ddpairbyte.airbyte_service.requests.post") as mock_post:
+    with patch("ddpui.ddpairbyte.airbyte_service.absession.post") as mock_post:
         mock_post.return_value.status_code = 200
         mock_post.return_value.headers = {"Content-Type": "application/json"}
         mock_post.return_value.json.return_value = expected_response
@@ -415,7 +501,7 @@ def test_get_source_success():
 def test_get_source_failure():
     workspace_id = "my_workspace_id"
     source_id = "1"
-    with patch("ddpui.ddpairbyte.airbyte_service.requests.post") as mock_post:
+    with patch("ddpui.ddpairbyte.airbyte_service.absession.post") as mock_post:
         mock_post.return_value.status_code = 404
         mock_post.return_value.headers = {"Content-Type": "application/json"}
         mock_post.return_value.json.return_value = {"error": "Invalid request data"}
@@ -442,7 +528,7 @@ def test_delete_source_success():
     source_id = "1"
     expected_response = {"sourceId": "1", "name": "Example Source 1"}
 
-    with patch("ddpui.ddpairbyte.airbyte_service.requests.post") as mock_post:
+    with patch("ddpui.ddpairbyte.airbyte_service.absession.post") as mock_post:
         mock_post.return_value.status_code = 200
         mock_post.return_value.headers = {"Content-Type": "application/json"}
         mock_post.return_value.json.return_value = expected_response
@@ -455,7 +541,7 @@ def test_delete_source_success():
 def test_delete_source_failure():
     workspace_id = "my_workspace_id"
     source_id = "1"
-    with patch("ddpui.ddpairbyte.airbyte_service.requests.post") as mock_post:
+    with patch("ddpui.ddpairbyte.airbyte_service.absession.post") as mock_post:
         mock_post.return_value.status_code = 404
         mock_post.return_value.headers = {"Content-Type": "application/json"}
         with pytest.raises(HttpError) as excinfo:
@@ -483,7 +569,7 @@ def test_create_source_success():
         "sourcedef_id": "1",
         "config": {"test": "test"},
     }
-    with patch("ddpui.ddpairbyte.airbyte_service.requests.post") as mock_post:
+    with patch("ddpui.ddpairbyte.airbyte_service.absession.post") as mock_post:
         mock_post.return_value.status_code = 200
         mock_post.return_value.json.return_value = expected_response
         mock_post.return_value.headers = {"Content-Type": "application/json"}
@@ -495,7 +581,7 @@ def test_create_source_success():
 
 def test_create_source_failure():
     workspace_id = "my_workspace_id"
-    with patch("ddpui.ddpairbyte.airbyte_service.requests.post") as mock_post:
+    with patch("ddpui.ddpairbyte.airbyte_service.absession.post") as mock_post:
         mock_post.return_value.status_code = 500
         mock_post.return_value.headers = {"Content-Type": "application/json"}
         mock_post.return_value.json.return_value = {"error": "Invalid request data"}
@@ -539,7 +625,7 @@ def test_update_source_success():
         "config": {"test": "test"},
         "sourcedef_id": "1",
     }
-    with patch("ddpui.ddpairbyte.airbyte_service.requests.post") as mock_post:
+    with patch("ddpui.ddpairbyte.airbyte_service.absession.post") as mock_post:
         mock_post.return_value.status_code = 200
         mock_post.return_value.json.return_value = expected_response
         mock_post.return_value.headers = {"Content-Type": "application/json"}
@@ -553,7 +639,7 @@ def test_update_source_failure():
     name = "source"
     source_id = "1"
     sourcedef_id = "1"
-    with patch("ddpui.ddpairbyte.airbyte_service.requests.post") as mock_post:
+    with patch("ddpui.ddpairbyte.airbyte_service.absession.post") as mock_post:
         mock_post.return_value.status_code = 500
         mock_post.return_value.headers = {"Content-Type": "application/json"}
         mock_post.return_value.json.return_value = {"error": "Invalid request data"}
@@ -596,7 +682,7 @@ def test_check_source_connection_success():
     )
     expected_response = {"status": "succeeded", "jobInfo": {}}
 
-    with patch("ddpui.ddpairbyte.airbyte_service.requests.post") as mock_post:
+    with patch("ddpui.ddpairbyte.airbyte_service.absession.post") as mock_post:
         mock_post.return_value.status_code = 200
         mock_post.return_value.json.return_value = expected_response
         mock_post.return_value.headers = {"Content-Type": "application/json"}
@@ -613,8 +699,9 @@ def test_check_source_connection_failure():
         sourceDefId="my_sourcedef_id",
         config={"key": "value"},
     )
-    with patch("ddpui.ddpairbyte.airbyte_service.requests.post") as mock_post:
+    with patch("ddpui.ddpairbyte.airbyte_service.absession.post") as mock_post:
         mock_response = Mock(spec=requests.Response)
+        mock_response.content = b"{}"
         mock_response.headers = {}
         mock_response.status_code = 500
         mock_response.json.return_value = {
@@ -636,7 +723,7 @@ def test_check_source_connection_with_invalid_workspace_id():
         sourceDefId="my_sourcedef_id",
         config={"key": "value"},
     )
-    with patch("ddpui.ddpairbyte.airbyte_service.requests.post") as mock_post:
+    with patch("ddpui.ddpairbyte.airbyte_service.absession.post") as mock_post:
         mock_post.return_value.status_code = 500
         mock_post.return_value.json.return_value = {"error": "Invalid request data"}
         with pytest.raises(HttpError) as excinfo:
@@ -650,8 +737,9 @@ def test_check_source_connection_for_update_success():
         name="my_source_name",
         config={"key": "value"},
     )
-    with patch("ddpui.ddpairbyte.airbyte_service.requests.post") as mock_post:
+    with patch("ddpui.ddpairbyte.airbyte_service.absession.post") as mock_post:
         mock_response = Mock(spec=requests.Response)
+        mock_response.content = b"{}"
         mock_response.headers = {"Content-Type": "application/json"}
         mock_response.status_code = 200
         mock_response.json.return_value = {"mykey": "myval", "jobInfo": {}}
@@ -666,8 +754,9 @@ def test_check_source_connection_for_update_failure():
         name="my_source_name",
         config={"key": "value"},
     )
-    with patch("ddpui.ddpairbyte.airbyte_service.requests.post") as mock_post:
+    with patch("ddpui.ddpairbyte.airbyte_service.absession.post") as mock_post:
         mock_response = Mock(spec=requests.Response)
+        mock_response.content = b"{}"
         mock_response.headers = {"Content-Type": "application/json"}
         mock_response.status_code = 500
         mock_response.json.return_value = {
@@ -682,12 +771,18 @@ def test_check_source_connection_for_update_failure():
             assert str(excinfo.value) == "failed to check source connection"
 
 
-def test_get_source_schema_catalog_success():
+@patch.multiple(
+    "ddpui.ddpairbyte.airbyte_service",
+    get_source=Mock(return_value={"sourceId": "my_source_id"}),
+    get_cached_source_schema_catalog=Mock(return_value=None),
+    cache_source_schema_catalog=Mock(),
+)
+def test_get_source_schema_catalog_success(**kwargs):
     workspace_id = "my_workspace_id"
     source_id = "my_source_id"
     expected_response = {"catalog": "catalog"}
 
-    with patch("ddpui.ddpairbyte.airbyte_service.requests.post") as mock_post:
+    with patch("ddpui.ddpairbyte.airbyte_service.absession.post") as mock_post:
         mock_post.return_value.status_code = 200
         mock_post.return_value.json.return_value = expected_response
         mock_post.return_value.headers = {"Content-Type": "application/json"}
@@ -697,11 +792,18 @@ def test_get_source_schema_catalog_success():
         assert isinstance(result, dict)
 
 
-def test_get_source_schema_catalog_failure_1():
+@patch.multiple(
+    "ddpui.ddpairbyte.airbyte_service",
+    get_source=Mock(return_value={"sourceId": "my_source_id"}),
+    get_cached_source_schema_catalog=Mock(return_value=None),
+    cache_source_schema_catalog=Mock(),
+)
+def test_get_source_schema_catalog_failure_1(**kwargs):
     workspace_id = "my_workspace_id"
     source_id = "my_source_id"
-    with patch("ddpui.ddpairbyte.airbyte_service.requests.post") as mock_post:
+    with patch("ddpui.ddpairbyte.airbyte_service.absession.post") as mock_post:
         mock_response = Mock(spec=requests.Response)
+        mock_response.content = b"{}"
         mock_response.status_code = 500
         mock_response.headers = {"Content-Type": "application/json"}
         mock_response.json.return_value = {
@@ -715,11 +817,18 @@ def test_get_source_schema_catalog_failure_1():
         assert str(excinfo.value) == "error-message"
 
 
-def test_get_source_schema_catalog_failure_2():
+@patch.multiple(
+    "ddpui.ddpairbyte.airbyte_service",
+    get_source=Mock(return_value={"sourceId": "my_source_id"}),
+    get_cached_source_schema_catalog=Mock(return_value=None),
+    cache_source_schema_catalog=Mock(),
+)
+def test_get_source_schema_catalog_failure_2(**kwargs):
     workspace_id = "my_workspace_id"
     source_id = "my_source_id"
-    with patch("ddpui.ddpairbyte.airbyte_service.requests.post") as mock_post:
+    with patch("ddpui.ddpairbyte.airbyte_service.absession.post") as mock_post:
         mock_response = Mock(spec=requests.Response)
+        mock_response.content = b"{}"
         mock_response.status_code = 500
         mock_response.headers = {"Content-Type": "application/json"}
         mock_response.json.return_value = {
@@ -737,7 +846,7 @@ def test_get_source_schema_catalog_failure_2():
 def test_get_source_schema_catalog_with_invalid_workspace_id():
     workspace_id = 123
     source_id = "my_source_id"
-    with patch("ddpui.ddpairbyte.airbyte_service.requests.post") as mock_post:
+    with patch("ddpui.ddpairbyte.airbyte_service.absession.post") as mock_post:
         mock_post.return_value.status_code = 500
         mock_post.return_value.json.return_value = {"error": "Invalid request data"}
         with pytest.raises(HttpError) as excinfo:
@@ -748,7 +857,7 @@ def test_get_source_schema_catalog_with_invalid_workspace_id():
 def test_get_source_schema_catalog_with_invalid_source_id():
     workspace_id = "my_workspace_id"
     source_id = 123
-    with patch("ddpui.ddpairbyte.airbyte_service.requests.post") as mock_post:
+    with patch("ddpui.ddpairbyte.airbyte_service.absession.post") as mock_post:
         mock_post.return_value.status_code = 500
         mock_post.return_value.json.return_value = {"error": "Invalid request data"}
         with pytest.raises(HttpError) as excinfo:
@@ -756,9 +865,121 @@ def test_get_source_schema_catalog_with_invalid_source_id():
         assert str(excinfo.value) == "source_id must be a string"
 
 
+def test_source_config_hash_ignores_unrelated_fields():
+    source = {
+        "sourceId": "my_source_id",
+        "sourceDefinitionId": "my_sourcedef_id",
+        "connectionConfiguration": {"host": "localhost", "port": 5432},
+    }
+    renamed = dict(source, name="renamed")
+    reconfigured = dict(source, connectionConfiguration={"host": "remotehost"})
+    assert source_config_hash(source) == source_config_hash(renamed)
+    assert source_config_hash(source) != source_config_hash(reconfigured)
+
+
+def test_get_source_schema_catalog_from_cache():
+    source = {"sourceId": "my_source_id", "connectionConfiguration": {"a": 1}}
+    cached = {"configHash": source_config_hash(source), "catalog": {"catalog": 1}}
+    mock_redis = Mock()
+    mock_redis.get.return_value = json.dumps(cached)
+    mock_abreq = Mock()
+    with patch.multiple(
+        "ddpui.ddpairbyte.airbyte_service",
+        get_source=Mock(return_value=source),
+        abreq=mock_abreq,
+    ), patch(
+        "ddpui.ddpairbyte.airbyte_service.RedisClient.get_instance",
+        return_value=mock_redis,
+    ):
+        result = get_source_schema_catalog("my_workspace_id", "my_source_id")
+        assert result == {"catalog": 1}
+        mock_abreq.assert_not_called()
+        mock_redis.get.assert_called_once_with("airbyte-catalog:my_source_id")
+
+
+def test_get_source_schema_catalog_stale_config():
+    source = {"sourceId": "my_source_id", "connectionConfiguration": {"a": 1}}
+    cached = {"configHash": "old-config-hash", "catalog": {"catalog": 1}}
+    mock_redis = Mock()
+    mock_redis.get.return_value = json.dumps(cached)
+    mock_abreq = Mock(return_value={"catalog": 2})
+    with patch.multiple(
+        "ddpui.ddpairbyte.airbyte_service",
+        get_source=Mock(return_value=source),
+        abreq=mock_abreq,
+    ), patch(
+        "ddpui.ddpairbyte.airbyte_service.RedisClient.get_instance",
+        return_value=mock_redis,
+    ):
+        result = get_source_schema_catalog("my_workspace_id", "my_source_id")
+        assert result == {"catalog": 2}
+        mock_abreq.assert_called_once_with(
+            "sources/discover_schema", {"sourceId": "my_source_id"}
+        )
+        mock_redis.set.assert_called_once_with(
+            "airbyte-catalog:my_source_id",
+            json.dumps(
+                {"configHash": source_config_hash(source), "catalog": {"catalog": 2}}
+            ),
+            ex=AIRBYTE_CATALOG_CACHE_TTL,
+        )
+
+
+def test_get_source_schema_catalog_force_refresh():
+    source = {"sourceId": "my_source_id", "connectionConfiguration": {"a": 1}}
+    mock_redis = Mock()
+    mock_abreq = Mock(return_value={"catalog": 2})
+    with patch.multiple(
+        "ddpui.ddpairbyte.airbyte_service",
+        get_source=Mock(return_value=source),
+        abreq=mock_abreq,
+    ), patch(
+        "ddpui.ddpairbyte.airbyte_service.RedisClient.get_instance",
+        return_value=mock_redis,
+    ):
+        result = get_source_schema_catalog(
+            "my_workspace_id", "my_source_id", force_refresh=True
+        )
+        assert result == {"catalog": 2}
+        mock_redis.get.assert_not_called()
+        mock_abreq.assert_called_once()
+        mock_redis.set.assert_called_once()
+
+
+def test_get_source_schema_catalog_redis_unavailable():
+    mock_redis = Mock()
+    mock_redis.get.side_effect = RedisError("connection refused")
+    mock_redis.set.side_effect = RedisError("connection refused")
+    with patch.multiple(
+        "ddpui.ddpairbyte.airbyte_service",
+        get_source=Mock(return_value={"sourceId": "my_source_id"}),
+        abreq=Mock(return_value={"catalog": 2}),
+    ), patch(
+        "ddpui.ddpairbyte.airbyte_service.RedisClient.get_instance",
+        return_value=mock_redis,
+    ):
+        result = get_source_schema_catalog("my_workspace_id", "my_source_id")
+        assert result == {"catalog": 2}
+
+
+def test_update_and_delete_source_invalidate_catalog():
+    mock_invalidate = Mock()
+    with patch.multiple(
+        "ddpui.ddpairbyte.airbyte_service",
+        abreq=Mock(return_value={"sourceId": "my_source_id"}),
+        invalidate_source_schema_catalog=mock_invalidate,
+    ):
+        update_source("my_source_id", "name", {}, "my_sourcedef_id")
+        mock_invalidate.assert_called_once_with("my_source_id")
+        mock_invalidate.reset_mock()
+        delete_source("my_workspace_id", "my_source_id")
+        mock_invalidate.assert_called_once_with("my_source_id")
+
+
 def test_get_destination_definitions_success():
-    with patch("ddpui.ddpairbyte.airbyte_service.requests.post") as mock_post:
+    with patch("ddpui.ddpairbyte.airbyte_service.absession.post") as mock_post:
         mock_response = Mock(spec=requests.Response)
+        mock_response.content = b"{}"
         mock_response.status_code = 200
         mock_response.headers = {"Content-Type": "application/json"}
         mock_response.json.return_value = {
@@ -778,8 +999,9 @@ def test_get_destination_definitions_failure_with_invalid_workspace_id():
 
 
 def test_get_destination_definitions_failure():
-    with patch("ddpui.ddpairbyte.airbyte_service.requests.post") as mock_post:
+    with patch("ddpui.ddpairbyte.airbyte_service.absession.post") as mock_post:
         mock_response = Mock(spec=requests.Response)
+        mock_response.content = b"{}"
         mock_response.status_code = 200
         mock_response.headers = {"Content-Type": "application/json"}
         mock_response.json.return_value = {"not-the-right-key": ""}
@@ -792,8 +1014,9 @@ def test_get_destination_definitions_failure():
 
 
 def test_get_destination_definition_specification_success():
-    with patch("ddpui.ddpairbyte.airbyte_service.requests.post") as mock_post:
+    with patch("ddpui.ddpairbyte.airbyte_service.absession.post") as mock_post:
         mock_response = Mock(spec=requests.Response)
+        mock_response.content = b"{}"
         mock_response.status_code = 200
         mock_response.headers = {"Content-Type": "application/json"}
         mock_response.json.return_value = {
@@ -821,8 +1044,9 @@ def test_get_destination_definition_specification_with_invalid_destinationdef():
 
 
 def test_get_destination_definition_specification_failure():
-    with patch("ddpui.ddpairbyte.airbyte_service.requests.post") as mock_post:
+    with patch("ddpui.ddpairbyte.airbyte_service.absession.post") as mock_post:
         mock_response = Mock(spec=requests.Response)
+        mock_response.content = b"{}"
         mock_response.status_code = 200
         mock_response.headers = {"Content-Type": "application/json"}
         mock_response.json.return_value = {"wrong-key": "theConnectionSpecification"}
@@ -838,8 +1062,9 @@ def test_get_destination_definition_specification_failure():
 
 
 def test_get_destinations_success():
-    with patch("ddpui.ddpairbyte.airbyte_service.requests.post") as mock_post:
+    with patch("ddpui.ddpairbyte.airbyte_service.absession.post") as mock_post:
         mock_response = Mock(spec=requests.Response)
+        mock_response.content = b"{}"
         mock_response.status_code = 200
         mock_response.headers = {"Content-Type": "application/json"}
         mock_response.json.return_value = {"destinations": "the-destinations"}
@@ -857,8 +1082,9 @@ def test_get_destinations_with_invalid_workspace_id():
 
 
 def test_get_destinations_failure():
-    with patch("ddpui.ddpairbyte.airbyte_service.requests.post") as mock_post:
+    with patch("ddpui.ddpairbyte.airbyte_service.absession.post") as mock_post:
         mock_response = Mock(spec=requests.Response)
+        mock_response.content = b"{}"
         mock_response.status_code = 200
         mock_response.headers = {"Content-Type": "application/json"}
         mock_response.json.return_value = {"wrong-key": "theConnectionSpecification"}
@@ -870,8 +1096,9 @@ def test_get_destinations_failure():
 
 
 def test_get_destination_success():
-    with patch("ddpui.ddpairbyte.airbyte_service.requests.post") as mock_post:
+    with patch("ddpui.ddpairbyte.airbyte_service.absession.post") as mock_post:
         mock_response = Mock(spec=requests.Response)
+        mock_response.content = b"{}"
         mock_response.status_code = 200
         mock_response.headers = {"Content-Type": "application/json"}
         mock_response.json.return_value = {"destinationId": "the-destination"}
@@ -895,8 +1122,9 @@ def test_get_destination_failure_with_invalid_destination_id():
 
 
 def test_get_destination_failure():
-    with patch("ddpui.ddpairbyte.airbyte_service.requests.post") as mock_post:
+    with patch("ddpui.ddpairbyte.airbyte_service.absession.post") as mock_post:
         mock_response = Mock(spec=requests.Response)
+        mock_response.content = b"{}"
         mock_response.status_code = 200
         mock_response.headers = {"Content-Type": "application/json"}
         mock_response.json.return_value = {"wrong-key": "theConnectionSpecification"}
@@ -908,8 +1136,9 @@ def test_get_destination_failure():
 
 
 def test_create_destination_success():
-    with patch("ddpui.ddpairbyte.airbyte_service.requests.post") as mock_post:
+    with patch("ddpui.ddpairbyte.airbyte_service.absession.post") as mock_post:
         mock_response = Mock(spec=requests.Response)
+        mock_response.content = b"{}"
         mock_response.status_code = 200
         mock_response.headers = {"Content-Type": "application/json"}
         mock_response.json.return_value = {"destinationId": "the-destination"}
@@ -945,8 +1174,9 @@ def test_create_destination_failure_with_invalid_config():
 
 
 def test_create_destination_failure():
-    with patch("ddpui.ddpairbyte.airbyte_service.requests.post") as mock_post:
+    with patch("ddpui.ddpairbyte.airbyte_service.absession.post") as mock_post:
         mock_response = Mock(spec=requests.Response)
+        mock_response.content = b"{}"
         mock_response.status_code = 200
         mock_response.headers = {"Content-Type": "application/json"}
         mock_response.json.return_value = {"wrong-key": "theConnectionSpecification"}
@@ -958,8 +1188,9 @@ def test_create_destination_failure():
 
 
 def test_update_destination_success():
-    with patch("ddpui.ddpairbyte.airbyte_service.requests.post") as mock_post:
+    with patch("ddpui.ddpairbyte.airbyte_service.absession.post") as mock_post:
         mock_response = Mock(spec=requests.Response)
+        mock_response.content = b"{}"
         mock_response.status_code = 200
         mock_response.headers = {"Content-Type": "application/json"}
         mock_response.json.return_value = {"destinationId": "the-destination"}
@@ -995,8 +1226,9 @@ def test_update_destination_failure_with_invalid_destinationdef_id():
 
 
 def test_update_destination_failure():
-    with patch("ddpui.ddpairbyte.airbyte_service.requests.post") as mock_post:
+    with patch("ddpui.ddpairbyte.airbyte_service.absession.post") as mock_post:
         mock_response = Mock(spec=requests.Response)
+        mock_response.content = b"{}"
         mock_response.status_code = 200
         mock_response.headers = {"Content-Type": "application/json"}
         mock_response.json.return_value = {"wrong-key": "theConnectionSpecification"}
@@ -1011,8 +1243,9 @@ def test_check_destination_connection_success():
     payload = AirbyteDestinationCreate(
         name="destinationname", destinationDefId="destinationdef-id", config={}
     )
-    with patch("ddpui.ddpairbyte.airbyte_service.requests.post") as mock_post:
+    with patch("ddpui.ddpairbyte.airbyte_service.absession.post") as mock_post:
         mock_response = Mock(spec=requests.Response)
+        mock_response.content = b"{}"
         mock_response.status_code = 200
         mock_response.headers = {"Content-Type": "application/json"}
         mock_response.json.return_value = {"jobInfo": {}, "status": "succeeded"}
@@ -1035,8 +1268,9 @@ def test_check_destination_connection_failure_1():
     payload = AirbyteDestinationCreate(
         name="destinationname", destinationDefId="destinationdef-id", config={}
     )
-    with patch("ddpui.ddpairbyte.airbyte_service.requests.post") as mock_post:
+    with patch("ddpui.ddpairbyte.airbyte_service.absession.post") as mock_post:
         mock_response = Mock(spec=requests.Response)
+        mock_response.content = b"{}"
         mock_response.status_code = 200
         mock_response.headers = {"Content-Type": "application/json"}
         mock_response.json.return_value = {"wrong-key": "theConnectionSpecification"}
@@ -1051,8 +1285,9 @@ def test_check_destination_connection_failure_2():
     payload = AirbyteDestinationCreate(
         name="destinationname", destinationDefId="destinationdef-id", config={}
     )
-    with patch("ddpui.ddpairbyte.airbyte_service.requests.post") as mock_post:
+    with patch("ddpui.ddpairbyte.airbyte_service.absession.post") as mock_post:
         mock_response = Mock(spec=requests.Response)
+        mock_response.content = b"{}"
         mock_response.status_code = 200
         mock_response.headers = {"Content-Type": "application/json"}
         mock_response.json.return_value = {"jobInfo": {}, "status": "failed"}
@@ -1065,8 +1300,9 @@ def test_check_destination_connection_failure_2():
 
 def test_check_destination_connection_for_update_success():
     payload = AirbyteDestinationUpdateCheckConnection(name="destinationname", config={})
-    with patch("ddpui.ddpairbyte.airbyte_service.requests.post") as mock_post:
+    with patch("ddpui.ddpairbyte.airbyte_service.absession.post") as mock_post:
         mock_response = Mock(spec=requests.Response)
+        mock_response.content = b"{}"
         mock_response.status_code = 200
         mock_response.headers = {"Content-Type": "application/json"}
         mock_response.json.return_value = {"jobInfo": {}, "status": "succeeded"}
@@ -1085,8 +1321,9 @@ def test_check_destination_connection_for_update_with_invalid_destination_id():
 
 def test_check_destination_connection_for_update_failure_1():
     payload = AirbyteDestinationUpdateCheckConnection(name="destinationname", config={})
-    with patch("ddpui.ddpairbyte.airbyte_service.requests.post") as mock_post:
+    with patch("ddpui.ddpairbyte.airbyte_service.absession.post") as mock_post:
         mock_response = Mock(spec=requests.Response)
+        mock_response.content = b"{}"
         mock_response.status_code = 200
         mock_response.headers = {"Content-Type": "application/json"}
         mock_response.json.return_value = {"wrong-key": "theConnectionSpecification"}
@@ -1099,8 +1336,9 @@ def test_check_destination_connection_for_update_failure_1():
 
 def test_check_destination_connection_for_update_failure_2():
     payload = AirbyteDestinationUpdateCheckConnection(name="destinationname", config={})
-    with patch("ddpui.ddpairbyte.airbyte_service.requests.post") as mock_post:
+    with patch("ddpui.ddpairbyte.airbyte_service.absession.post") as mock_post:
         mock_response = Mock(spec=requests.Response)
+        mock_response.content = b"{}"
         mock_response.status_code = 200
         mock_response.headers = {"Content-Type": "application/json"}
         mock_response.json.return_value = {"jobInfo": {}, "status": "failed"}
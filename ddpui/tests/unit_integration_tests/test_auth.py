@@ -0,0 +1,139 @@
+import os
+import json
+from types import SimpleNamespace
+from unittest.mock import patch
+import django
+import pytest
+from ninja.errors import HttpError
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "ddpui.settings")
+os.environ["DJANGO_ALLOW_ASYNC_UNSAFE"] = "true"
+django.setup()
+
+from django.contrib.auth.models import User
+from rest_framework.authtoken.models import Token
+
+from ddpui import auth
+from ddpui.models.org import Org
+from ddpui.models.org_user import OrgUser, OrgUserRole
+from ddpui.models.admin_user import AdminUser
+from ddpui.tests.helper.fake_redis import FakeRedis
+
+# requests are plain objects: a Mock would load the lazy orguser as soon as
+# it was assigned
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture(autouse=True)
+def fake_redis():
+    """every test starts with empty caches"""
+    fakeredis = FakeRedis()
+    auth._local_auth_cache.clear()
+    with patch("ddpui.auth.RedisClient.get_instance", return_value=fakeredis):
+        yield fakeredis
+    auth._local_auth_cache.clear()
+
+
+@pytest.fixture
+def orguser():
+    """an account manager with an auth token"""
+    org = Org.objects.create(name="org-name", slug="test-org-slug")
+    user = User.objects.create(username="tempuser", email="tempuser@example.com")
+    orguser = OrgUser.objects.create(
+        user=user, org=org, role=OrgUserRole.ACCOUNT_MANAGER
+    )
+    Token.objects.create(user=user, key="test-token")
+    yield orguser
+    user.delete()
+    org.delete()
+
+
+def test_authenticate_org_user_warm_needs_no_queries(
+    orguser, django_assert_num_queries
+):
+    """the second request with a token resolves it from the cache"""
+    with django_assert_num_queries(1):
+        auth.FullAccess().authenticate(SimpleNamespace(), "test-token")
+    request = SimpleNamespace()
+    with django_assert_num_queries(0):
+        auth.FullAccess().authenticate(request, "test-token")
+    # the orguser is loaded when the view first uses it
+    with django_assert_num_queries(1):
+        assert request.orguser.id == orguser.id
+        assert request.orguser.org.slug == "test-org-slug"
+        assert request.orguser.user.email == "tempuser@example.com"
+        assert request.user.id == orguser.user.id
+
+
+def test_auth_cache_holds_ids_under_a_digest(orguser, fake_redis):
+    """neither the token nor any row is stored in the cache"""
+    auth.FullAccess().authenticate(SimpleNamespace(), "test-token")
+    assert all("test-token" not in key for key in fake_redis.store)
+    assert json.loads(
+        fake_redis.store[auth.auth_cache_key("orguser", "test-token")]
+    ) == {
+        "orguser_id": orguser.id,
+        "user_id": orguser.user.id,
+        "org_id": orguser.org.id,
+        "role": OrgUserRole.ACCOUNT_MANAGER,
+    }
+
+
+def test_authenticate_org_user_survives_process_cache_expiry(
+    orguser, django_assert_num_queries
+):
+    """another process finds the token in redis"""
+    auth.FullAccess().authenticate(SimpleNamespace(), "test-token")
+    auth._local_auth_cache.clear()
+    with django_assert_num_queries(0):
+        auth.FullAccess().authenticate(SimpleNamespace(), "test-token")
+
+
+def test_authenticate_org_user_role_change(orguser):
+    """changing an orguser's role invalidates the cache"""
+    auth.FullAccess().authenticate(SimpleNamespace(), "test-token")
+    orguser.role = OrgUserRole.REPORT_VIEWER
+    orguser.save()
+    with pytest.raises(HttpError) as excinfo:
+        auth.FullAccess().authenticate(SimpleNamespace(), "test-token")
+    assert str(excinfo.value) == auth.UNAUTHORIZED
+    auth.AnyOrgUser().authenticate(SimpleNamespace(), "test-token")
+
+
+def test_authenticate_org_user_user_and_org_changes(orguser, fake_redis):
+    """changes to the user invalidate the cache, and the org is always current"""
+    rediskey = auth.auth_cache_key("orguser", "test-token")
+    auth.FullAccess().authenticate(SimpleNamespace(), "test-token")
+    assert rediskey in fake_redis.store
+    orguser.user.is_active = False
+    orguser.user.save()
+    assert rediskey not in fake_redis.store
+    assert len(auth._local_auth_cache) == 0
+
+    auth.FullAccess().authenticate(SimpleNamespace(), "test-token")
+    Org.objects.filter(id=orguser.org.id).update(name="new-name")
+    request = SimpleNamespace()
+    auth.FullAccess().authenticate(request, "test-token")
+    assert request.orguser.org.name == "new-name"
+
+
+def test_authenticate_org_user_token_deleted(orguser):
+    """a deleted token stops working at once"""
+    auth.FullAccess().authenticate(SimpleNamespace(), "test-token")
+    Token.objects.filter(key="test-token").first().delete()
+    with pytest.raises(HttpError) as excinfo:
+        auth.FullAccess().authenticate(SimpleNamespace(), "test-token")
+    assert str(excinfo.value) == auth.UNAUTHORIZED
+
+
+def test_platform_admin_cached(orguser, django_assert_num_queries):
+    """PlatformAdmin also resolves warm tokens from the cache"""
+    with pytest.raises(HttpError):
+        auth.PlatformAdmin().authenticate(SimpleNamespace(), "test-token")
+    AdminUser.objects.create(user=orguser.user)
+    auth.PlatformAdmin().authenticate(SimpleNamespace(), "test-token")
+    request = SimpleNamespace()
+    with django_assert_num_queries(0):
+        tokenrecord = auth.PlatformAdmin().authenticate(request, "test-token")
+    assert tokenrecord.key == "test-token"
+    assert request.adminuser.user.id == orguser.user.id
@@ -0,0 +1,72 @@
+import os
+import django
+
+import pytest
+from django.db import connection
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "ddpui.settings")
+os.environ["DJANGO_ALLOW_ASYNC_UNSAFE"] = "true"
+django.setup()
+
+from ddpui.models.org import Org, OrgPrefectBlock, OrgDataFlow
+from ddpui.ddpprefect import AIRBYTESERVER, AIRBYTECONNECTION, DBTCORE
+
+pytestmark = pytest.mark.django_db
+
+NUM_ORGS = 3000
+
+
+@pytest.fixture
+def many_orgs():
+    """thousands of orgs, each with a few blocks and flows, with fresh statistics"""
+    orgs = Org.objects.bulk_create(
+        [Org(name=f"org-{idx}", slug=f"org-{idx}") for idx in range(NUM_ORGS)]
+    )
+    blocks = []
+    dataflows = []
+    for org in orgs:
+        for block_type in [AIRBYTESERVER, AIRBYTECONNECTION, DBTCORE]:
+            blocks.append(
+                OrgPrefectBlock(
+                    org=org,
+                    block_type=block_type,
+                    block_id=f"{org.slug}-{block_type}",
+                    block_name=f"{org.slug}-{block_type}",
+                )
+            )
+        for idx, cron in enumerate(["0 1 * * *", "0 2 * * *", None]):
+            dataflows.append(
+                OrgDataFlow(
+                    org=org,
+                    name=f"{org.slug}-{idx}",
+                    cron=cron,
+                    deployment_id=f"{org.slug}-deployment-{idx}",
+                    connection_id=f"{org.slug}-connection" if cron is None else None,
+                )
+            )
+    OrgPrefectBlock.objects.bulk_create(blocks)
+    OrgDataFlow.objects.bulk_create(dataflows)
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE ddpui_org, ddpui_orgprefectblock, ddpui_orgdataflow")
+    return orgs
+
+
+def plan(queryset) -> str:
+    """the query plan postgres chooses for a queryset"""
+    return queryset.explain()
+
+
+def test_query_plans(many_orgs):
+    """the org-scoped lookups the api makes are answered from indexes"""
+    org = many_orgs[len(many_orgs) // 2]
+    querysets = [
+        OrgPrefectBlock.objects.filter(org=org, block_type=AIRBYTECONNECTION),
+        OrgPrefectBlock.objects.filter(org=org, block_id=f"{org.slug}-{DBTCORE}"),
+        OrgDataFlow.objects.filter(org=org, cron__isnull=False),
+        OrgDataFlow.objects.filter(org=org, cron__isnull=True),
+        OrgDataFlow.objects.filter(org=org, connection_id=f"{org.slug}-connection"),
+        OrgDataFlow.objects.filter(org=org, deployment_id=f"{org.slug}-deployment-0"),
+    ]
+    for queryset in querysets:
+        queryplan = plan(queryset)
+        assert "seq scan" not in queryplan.lower(), queryplan
@@ -1,7 +1,16 @@
 import os
+import json
+import logging
+import threading
+import time
 from unittest.mock import patch, Mock
 import django
 import pytest
+from redis.exceptions import RedisError
+from ninja.errors import HttpError
+from celery.exceptions import Retry
+from python_http_client.exceptions import HTTPError
+from cryptography.fernet import Fernet
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "ddpui.settings")
 os.environ["DJANGO_ALLOW_ASYNC_UNSAFE"] = "true"
@@ -11,12 +20,25 @@ from ddpui.models.org import Org, OrgDataFlow, OrgPrefectBlock, OrgWarehouse
 from ddpui.models.org_user import OrgUser, User
 
 from ddpui.utils.deleteorg import (
+    delete_prefect_blocks,
     delete_prefect_deployments,
     delete_prefect_shell_blocks,
     delete_dbt_workspace,
     delete_orgusers,
     delete_airbyte_workspace,
 )
+from ddpui.utils.tieredcache import TieredCache
+from ddpui.tests.helper.fake_redis import FakeRedis
+from ddpui.utils.helpers import remove_nested_attribute
+from ddpui.utils import secretsmanager, sendgrid, queuedlogging
+from ddpui.celeryworkers.tasks import (
+    send_template_emails,
+    delete_org,
+    git_pull_dbtrepo,
+)
+from ddpui.utils.taskprogress import TaskProgress
+from ddpui.utils.taskdag import Step, run_steps
+from ddpui.ddpairbyte import airbyte_service
 from ddpui.ddpprefect import AIRBYTESERVER, AIRBYTECONNECTION, SHELLOPERATION
 
 pytestmark = pytest.mark.django_db
@@ -52,7 +74,7 @@ def test_delete_prefect_deployments(org_with_workspace):
 
 @patch.multiple(
     "ddpui.ddpprefect.prefect_service",
-    delete_shell_block=Mock(),
+    post_prefect_blocks_bulk_delete=Mock(),
 )
 def test_delete_prefect_shell_blocks(org_with_workspace):
     """
@@ -84,8 +106,7 @@ def test_delete_dbt_workspace(org_with_workspace):
 
 @patch.multiple(
     "ddpui.ddpprefect.prefect_service",
-    delete_airbyte_connection_block=Mock(),
-    delete_airbyte_server_block=Mock(),
+    post_prefect_blocks_bulk_delete=Mock(),
 )
 @patch.multiple(
     "ddpui.ddpairbyte.airbyte_service",
@@ -154,6 +175,42 @@ def test_delete_airbyte_workspace(org_with_workspace):
     assert OrgWarehouse.objects.filter(org=org_with_workspace).count() == 0
 
 
+@patch.multiple(
+    "ddpui.ddpairbyte.airbyte_service",
+    get_connections=Mock(side_effect=HttpError(404, "workspace not found")),
+    get_destinations=Mock(side_effect=HttpError(404, "workspace not found")),
+    get_sources=Mock(side_effect=HttpError(404, "workspace not found")),
+    delete_workspace=Mock(),
+)
+@patch.multiple("ddpui.utils.secretsmanager", delete_warehouse_credentials=Mock())
+def test_delete_airbyte_workspace_not_found(org_with_workspace):
+    """a workspace which airbyte no longer has is already empty"""
+    OrgWarehouse.objects.create(org=org_with_workspace)
+    assert delete_airbyte_workspace(org_with_workspace) == 0
+    assert OrgWarehouse.objects.filter(org=org_with_workspace).count() == 0
+    assert org_with_workspace.airbyte_workspace_id is None
+
+
+@patch.multiple(
+    "ddpui.ddpairbyte.airbyte_service",
+    get_connections=Mock(return_value={"connections": []}),
+    get_destinations=Mock(
+        return_value={"destinations": [{"destinationId": "fake-destination-id"}]}
+    ),
+    delete_destination=Mock(side_effect=HttpError(500, "airbyte is down")),
+    get_sources=Mock(return_value={"sources": []}),
+    delete_workspace=Mock(),
+)
+@patch.multiple("ddpui.utils.secretsmanager", delete_warehouse_credentials=Mock())
+def test_delete_airbyte_workspace_keeps_warehouse(org_with_workspace):
+    """the warehouse outlives a destination which could not be deleted"""
+    OrgWarehouse.objects.create(org=org_with_workspace)
+    assert delete_airbyte_workspace(org_with_workspace) == 1
+    assert OrgWarehouse.objects.filter(org=org_with_workspace).count() == 1
+    secretsmanager.delete_warehouse_credentials.assert_not_called()
+    airbyte_service.delete_workspace.assert_not_called()
+
+
 def test_delete_orgusers(org_with_workspace):
     """ensure that orguser.user.delete is called"""
     email = "fake-email"
@@ -168,3 +225,495 @@ def test_delete_orgusers(org_with_workspace):
         OrgUser.objects.filter(user__email=email, org=org_with_workspace).count() == 0
     )
     assert User.objects.filter(email=email).count() == 0
+
+
+def test_delete_prefect_blocks_without_bulk_delete(org_with_workspace):
+    """blocks are deleted one by one when the bulk delete fails"""
+    for idx in range(3):
+        OrgPrefectBlock.objects.create(
+            org=org_with_workspace,
+            block_type=SHELLOPERATION,
+            block_id=f"block-id-{idx}",
+            block_name=f"block-name-{idx}",
+        )
+
+    def prefect_delete_a_block(block_id):
+        if block_id == "block-id-1":
+            raise HttpError(500, "prefect is down")
+        if block_id == "block-id-2":
+            raise HttpError(404, "not found")
+
+    with patch(
+        "ddpui.ddpprefect.prefect_service.post_prefect_blocks_bulk_delete",
+        Mock(side_effect=HttpError(500, "bulk delete failed")),
+    ), patch(
+        "ddpui.ddpprefect.prefect_service.prefect_delete_a_block",
+        Mock(side_effect=prefect_delete_a_block),
+    ):
+        assert delete_prefect_blocks(org_with_workspace, SHELLOPERATION) == 1
+
+    # a block which was not found had already been deleted
+    assert [
+        block.block_id
+        for block in OrgPrefectBlock.objects.filter(org=org_with_workspace)
+    ] == ["block-id-1"]
+
+
+@patch.multiple(
+    "ddpui.ddpairbyte.airbyte_service",
+    get_connections=Mock(return_value={"connections": []}),
+    get_destinations=Mock(return_value={"destinations": []}),
+    delete_destination=Mock(),
+    delete_workspace=Mock(),
+)
+@patch.multiple("ddpui.ddpdbt.dbt_service", delete_dbt_workspace=Mock())
+def test_delete_org_resumes(org_with_workspace):
+    """a failed teardown is reported, and running it again retries what is left"""
+    for idx in range(3):
+        OrgDataFlow.objects.create(
+            org=org_with_workspace,
+            name=f"dataflow-{idx}",
+            deployment_id=f"deployment-id-{idx}",
+        )
+
+    def delete_deployment_by_id(deployment_id):
+        if deployment_id == "deployment-id-1":
+            raise HttpError(500, "prefect is down")
+
+    fakeredis = FakeRedis()
+    with patch(
+        "ddpui.utils.taskprogress.RedisClient.get_instance", return_value=fakeredis
+    ), patch(
+        "ddpui.ddpprefect.prefect_service.delete_deployment_by_id",
+        Mock(side_effect=delete_deployment_by_id),
+    ), patch(
+        "ddpui.ddpairbyte.airbyte_service.get_sources",
+        Mock(return_value={"sources": [{"sourceId": "source-id"}]}),
+    ), patch(
+        "ddpui.ddpairbyte.airbyte_service.delete_source",
+        Mock(side_effect=HttpError(500, "airbyte is down")),
+    ):
+        assert delete_org(org_with_workspace.id) is False
+        progress = TaskProgress.fetch(None)
+
+    assert progress[-1]["status"] == "failed"
+    assert progress[-1]["message"] == (
+        "2 resources could not be deleted, run again to retry them"
+    )
+    assert [
+        dataflow.deployment_id
+        for dataflow in OrgDataFlow.objects.filter(org=org_with_workspace)
+    ] == ["deployment-id-1"]
+    airbyte_service.delete_workspace.assert_not_called()
+
+    with patch(
+        "ddpui.utils.taskprogress.RedisClient.get_instance", return_value=FakeRedis()
+    ), patch(
+        "ddpui.ddpprefect.prefect_service.delete_deployment_by_id"
+    ) as delete_deployment_mock, patch(
+        "ddpui.ddpairbyte.airbyte_service.get_sources",
+        Mock(return_value={"sources": [{"sourceId": "source-id"}]}),
+    ), patch(
+        "ddpui.ddpairbyte.airbyte_service.delete_source"
+    ) as delete_source_mock:
+        assert delete_org(org_with_workspace.id) is True
+
+    delete_deployment_mock.assert_called_once_with("deployment-id-1")
+    delete_source_mock.assert_called_once_with("FAKE-WORKSPACE-ID", "source-id")
+    airbyte_service.delete_workspace.assert_called_once_with("FAKE-WORKSPACE-ID")
+    assert not Org.objects.filter(id=org_with_workspace.id).exists()
+
+
+def test_tieredcache_fetches_once():
+    fakeredis = FakeRedis()
+    fetch = Mock(return_value={"a": 1})
+    with patch(
+        "ddpui.utils.tieredcache.RedisClient.get_instance", return_value=fakeredis
+    ):
+        cache = TieredCache("test", ttl=60, maxsize=10)
+        assert cache.get_or_fetch("scope", "key", fetch) == {"a": 1}
+        assert cache.get_or_fetch("scope", "key", fetch) == {"a": 1}
+        fetch.assert_called_once()
+        # a second process has an empty local cache but shares redis
+        other = TieredCache("test", ttl=60, maxsize=10)
+        assert other.get_or_fetch("scope", "key", fetch) == {"a": 1}
+        fetch.assert_called_once()
+
+
+def test_tieredcache_invalidate():
+    fakeredis = FakeRedis()
+    fetch = Mock(side_effect=[{"a": 1}, {"a": 2}, {"b": 1}])
+    with patch(
+        "ddpui.utils.tieredcache.RedisClient.get_instance", return_value=fakeredis
+    ):
+        cache = TieredCache("test", ttl=60, maxsize=10)
+        other = TieredCache("test", ttl=60, maxsize=10, version_ttl=5)
+        assert cache.get_or_fetch("scope", "key", fetch) == {"a": 1}
+        assert other.get_or_fetch("scope", "key", fetch) == {"a": 1}
+        cache.invalidate("scope")
+        assert cache.get_or_fetch("scope", "key", fetch) == {"a": 2}
+        # the other process sees the new version once it asks redis again
+        assert other.get_or_fetch("scope", "key", fetch) == {"a": 1}
+        with patch(
+            "ddpui.utils.tieredcache.time.monotonic", return_value=time.monotonic() + 6
+        ):
+            assert other.get_or_fetch("scope", "key", fetch) == {"a": 2}
+        assert cache.get_or_fetch("otherscope", "key", fetch) == {"b": 1}
+
+
+def test_tieredcache_hit_in_memory_skips_redis():
+    fakeredis = FakeRedis()
+    with patch(
+        "ddpui.utils.tieredcache.RedisClient.get_instance", return_value=fakeredis
+    ):
+        cache = TieredCache("test", ttl=60, maxsize=10)
+        cache.get_or_fetch("scope", "key", lambda: {"a": 1})
+        fakeredis.get = Mock(side_effect=RedisError("should not be called"))
+        assert cache.get_or_fetch("scope", "key", Mock()) == {"a": 1}
+
+
+def test_tieredcache_evicts_least_recently_used():
+    fakeredis = FakeRedis()
+    with patch(
+        "ddpui.utils.tieredcache.RedisClient.get_instance", return_value=fakeredis
+    ):
+        cache = TieredCache("test", ttl=60, maxsize=2)
+        cache.get_or_fetch("scope", "key1", lambda: 1)
+        cache.get_or_fetch("scope", "key2", lambda: 2)
+        cache.get_or_fetch("scope", "key1", lambda: 1)
+        cache.get_or_fetch("scope", "key3", lambda: 3)
+        assert list(cache._local.keys()) == [
+            "test:scope:0:key1",
+            "test:scope:0:key3",
+        ]
+
+
+def test_tieredcache_without_redis():
+    fakeredis = Mock()
+    fakeredis.get.side_effect = RedisError("connection refused")
+    fetch = Mock(return_value={"a": 1})
+    with patch(
+        "ddpui.utils.tieredcache.RedisClient.get_instance", return_value=fakeredis
+    ):
+        cache = TieredCache("test", ttl=60, maxsize=10)
+        assert cache.get_or_fetch("scope", "key", fetch) == {"a": 1}
+        assert cache.get_or_fetch("scope", "key", fetch) == {"a": 1}
+        assert fetch.call_count == 2
+
+
+def test_remove_nested_attribute():
+    obj = {
+        "icon": "top",
+        "name": "keep",
+        "definitions": [{"icon": "a", "logo": "b", "id": 1}, [{"icon": "c"}]],
+        "nested": {"deeper": {"icon": "d", "value": 2}},
+    }
+    children = obj["definitions"]
+    assert remove_nested_attribute(obj, "icon", "logo") is obj
+    assert obj == {
+        "name": "keep",
+        "definitions": [{"id": 1}, [{}]],
+        "nested": {"deeper": {"value": 2}},
+    }
+    assert obj["definitions"] is children
+
+
+def test_remove_nested_attribute_skip_keys():
+    obj = {"icon": "x", "jsonSchema": {"properties": {"icon": {"type": "string"}}}}
+    remove_nested_attribute(obj, "icon", skip_keys=("jsonSchema",))
+    assert obj == {"jsonSchema": {"properties": {"icon": {"type": "string"}}}}
+
+
+def test_remove_nested_attribute_deeply_nested():
+    obj = leaf = {"icon": "x"}
+    for _ in range(5000):
+        obj = {"properties": {"child": obj}}
+    remove_nested_attribute(obj, "icon")
+    assert leaf == {}
+
+
+def test_secretsmanager_client_is_reused():
+    with patch("ddpui.utils.secretsmanager.boto3.client") as mock_client, patch(
+        "ddpui.utils.secretsmanager._client", None
+    ):
+        assert secretsmanager.get_client() is secretsmanager.get_client()
+        mock_client.assert_called_once()
+
+
+def test_secretsmanager_warehouse_credentials_cache():
+    backend = secretsmanager.InMemorySecretsBackend()
+    backend.get_secret = Mock(side_effect=backend.get_secret)
+    fakeredis = FakeRedis()
+    warehouse = Mock(org=Mock(slug="test-org-slug"))
+    # the cipher is derived from the django secret key, which ci does not set
+    with patch("ddpui.utils.secretsmanager.get_backend", return_value=backend), patch(
+        "ddpui.utils.secretsmanager.RedisClient.get_instance", return_value=fakeredis
+    ), patch(
+        "ddpui.utils.secretsmanager._get_fernet",
+        return_value=Fernet(Fernet.generate_key()),
+    ):
+        warehouse.credentials = secretsmanager.save_warehouse_credentials(
+            warehouse, {"password": "hunter2"}
+        )
+        for _ in range(2):
+            assert secretsmanager.retrieve_warehouse_credentials(warehouse) == {
+                "password": "hunter2"
+            }
+        backend.get_secret.assert_called_once()
+        # never cached in the clear
+        assert b"hunter2" not in fakeredis.store[f"secret:{warehouse.credentials}"]
+
+        secretsmanager.update_warehouse_credentials(warehouse, {"password": "new"})
+        assert secretsmanager.retrieve_warehouse_credentials(warehouse) == {
+            "password": "new"
+        }
+        backend.get_secret.assert_called_once()
+
+        secretsmanager.delete_warehouse_credentials(warehouse)
+        assert f"secret:{warehouse.credentials}" not in fakeredis.store
+        assert backend.secrets == {}
+
+
+def test_secretsmanager_file_backend(tmp_path):
+    backend = secretsmanager.FileSecretsBackend(str(tmp_path / "secrets"))
+    backend.create_secret("name", "a-long-value")
+    backend.update_secret("name", "value")
+    assert backend.get_secret("name") == "value"
+    assert (tmp_path / "secrets" / "name").stat().st_mode & 0o777 == 0o600
+    backend.delete_secret("name")
+    with pytest.raises(FileNotFoundError):
+        backend.get_secret("name")
+
+
+def test_git_pull_dbtrepo_without_org(org_with_workspace):
+    """a pull for an org which is gone or has no workspace reports failure"""
+    for org_id, message in [
+        (org_with_workspace.id + 1000, "no such org"),
+        (Org.objects.create(name="no-slug").id, "org has no dbt workspace"),
+    ]:
+        with patch(
+            "ddpui.utils.taskprogress.RedisClient.get_instance",
+            return_value=FakeRedis(),
+        ), patch("ddpui.celeryworkers.tasks.runcmd") as runcmd_mock:
+            git_pull_dbtrepo(org_id)
+            progress = TaskProgress.fetch(None)
+        runcmd_mock.assert_not_called()
+        assert progress[-1] == {
+            "stepnum": 2,
+            "numsteps": 2,
+            "message": message,
+            "status": "failed",
+        }
+
+
+def test_taskprogress_fetch_since():
+    """steps are appended to a per-task stream and can be read incrementally"""
+    fakeredis = FakeRedis()
+    with patch(
+        "ddpui.utils.taskprogress.RedisClient.get_instance", return_value=fakeredis
+    ):
+        assert TaskProgress.fetch("task-id") is None
+        taskprogress = TaskProgress("task-id")
+        for stepnum in range(3):
+            taskprogress.add({"stepnum": stepnum})
+        assert TaskProgress.fetch("task-id") == [
+            {"stepnum": 0},
+            {"stepnum": 1},
+            {"stepnum": 2},
+        ]
+        result = TaskProgress.read("task-id")
+        assert result["progress"] == [{"stepnum": 0}, {"stepnum": 1}, {"stepnum": 2}]
+        assert TaskProgress.read("task-id", result["next"]) == {
+            "progress": [],
+            "next": result["next"],
+        }
+        assert list(fakeredis.store) == ["taskprogress:task-id"]
+
+
+def test_taskprogress_from_two_workers():
+    """two TaskProgress objects can add steps for the same task"""
+    fakeredis = FakeRedis()
+    with patch(
+        "ddpui.utils.taskprogress.RedisClient.get_instance", return_value=fakeredis
+    ):
+        TaskProgress("task-id").add({"message": "started"})
+        TaskProgress("task-id").add({"message": "resumed"})
+        assert TaskProgress.fetch("task-id") == [
+            {"message": "started"},
+            {"message": "resumed"},
+        ]
+
+
+def test_run_steps_concurrently():
+    """independent steps run at the same time, dependent ones after"""
+    barrier = threading.Barrier(2, timeout=5)
+    order = []
+    steps = [
+        Step("a", lambda: (barrier.wait(), order.append("a")), "a done", "a failed"),
+        Step("b", lambda: (barrier.wait(), order.append("b")), "b done", "b failed"),
+        Step("c", lambda: order.append("c"), "c done", "c failed", after=("a", "b")),
+    ]
+    taskprogress = Mock()
+    assert run_steps(steps, taskprogress, 2, 4) is True
+    assert order[-1] == "c"
+    progress = [call.args[0] for call in taskprogress.add.call_args_list]
+    assert [entry["stepnum"] for entry in progress] == [2, 3, 4]
+    assert progress[-1] == {
+        "stepnum": 4,
+        "numsteps": 4,
+        "message": "c done",
+        "status": "running",
+    }
+
+
+def test_run_steps_failure():
+    """a failed step is reported and the steps after it are not run"""
+    run_after = Mock()
+
+    def fail():
+        raise RuntimeError("boom")
+
+    steps = [
+        Step("a", fail, "a done", "a failed"),
+        Step("b", run_after, "b done", "b failed", after=("a",)),
+    ]
+    taskprogress = Mock()
+    assert run_steps(steps, taskprogress, 1, 2) is False
+    taskprogress.add.assert_called_once_with(
+        {
+            "stepnum": 1,
+            "numsteps": 2,
+            "message": "a failed",
+            "error": "boom",
+            "status": "failed",
+        }
+    )
+    run_after.assert_not_called()
+
+
+def test_run_steps_bad_graph():
+    """dependencies must name steps in the table and must not loop"""
+    with pytest.raises(ValueError):
+        run_steps([Step("a", Mock(), "", "", after=("b",))], Mock(), 1, 1)
+    with pytest.raises(ValueError):
+        run_steps(
+            [
+                Step("a", Mock(), "", "", after=("b",)),
+                Step("b", Mock(), "", "", after=("a",)),
+            ],
+            Mock(),
+            1,
+            2,
+        )
+
+
+def test_sendgrid_file_sink(tmp_path):
+    """the file backend writes messages instead of sending them"""
+    sink = tmp_path / "emails.jsonl"
+    with patch.multiple(
+        "ddpui.utils.sendgrid", EMAIL_BACKEND="file", EMAIL_FILE_SINK=str(sink)
+    ):
+        send_template_emails(
+            "template-id",
+            [
+                {"to_email": "one@example.com", "template_vars": {"url": "1"}},
+                {"to_email": "two@example.com", "template_vars": {"url": "2"}},
+            ],
+        )
+    messages = [json.loads(line) for line in sink.read_text().splitlines()]
+    assert [message["to_email"] for message in messages] == [
+        "one@example.com",
+        "two@example.com",
+    ]
+    assert messages[0]["template_id"] == "template-id"
+
+
+def test_sendgrid_batches_personalizations():
+    """one api call sends a templated email to many recipients"""
+    client = Mock()
+    recipients = [
+        {"to_email": f"user{idx}@example.com", "template_vars": {"idx": idx}}
+        for idx in range(3)
+    ]
+    with patch("ddpui.utils.sendgrid.get_client", return_value=client):
+        sendgrid.deliver_template_messages("template-id", recipients)
+    client.send.assert_called_once()
+    personalizations = client.send.call_args.args[0].get()["personalizations"]
+    assert sorted(p["to"][0]["email"] for p in personalizations) == [
+        "user0@example.com",
+        "user1@example.com",
+        "user2@example.com",
+    ]
+
+
+def test_sendgrid_client_is_reused():
+    """the api client is built once"""
+    with patch("ddpui.utils.sendgrid.SendGridAPIClient") as mock_client, patch(
+        "ddpui.utils.sendgrid._client", None
+    ):
+        assert sendgrid.get_client() is sendgrid.get_client()
+    mock_client.assert_called_once()
+
+
+def test_send_template_emails_retries_transient_errors():
+    """the outbox retries when sendgrid is unavailable but not on bad requests"""
+    unavailable = HTTPError(503, "unavailable", "", {})
+    with patch(
+        "ddpui.utils.sendgrid.deliver_template_messages",
+        Mock(side_effect=unavailable),
+    ), patch.object(send_template_emails, "retry", Mock(side_effect=Retry())) as retry:
+        with pytest.raises(Retry):
+            send_template_emails("template-id", [])
+    assert retry.call_args.kwargs["exc"] is unavailable
+
+    with patch(
+        "ddpui.utils.sendgrid.deliver_template_messages",
+        Mock(side_effect=HTTPError(400, "bad request", "", {})),
+    ), patch.object(send_template_emails, "retry") as retry:
+        with pytest.raises(HTTPError):
+            send_template_emails("template-id", [])
+    retry.assert_not_called()
+
+
+def test_queued_logging_json(tmp_path):
+    """records reach the sink through the listener thread, as json"""
+    logger = logging.getLogger("test-queued-logging")
+    logger.setLevel(logging.INFO)
+    with patch.multiple(
+        "ddpui.utils.queuedlogging", LOG_SINK="process-file", LOG_FORMAT="json"
+    ), patch("ddpui.utils.queuedlogging.settings.BASE_DIR", tmp_path):
+        (tmp_path / "ddpui/logs").mkdir(parents=True)
+        queuedlogging.setup_queued_logger(logger, "test")
+        handler, listener, _ = queuedlogging._queued_loggers[logger.name]
+        assert logger.handlers == [handler]
+        logger.info("hello %s", "world")
+        listener.stop()
+        del queuedlogging._queued_loggers[logger.name]
+        logger.removeHandler(handler)
+
+    logfile = tmp_path / f"ddpui/logs/test-{os.getpid()}.log"
+    entry = json.loads(logfile.read_text())
+    assert entry["message"] == "hello world"
+    assert entry["level"] == "INFO"
+    assert entry["process"] == os.getpid()
+
+
+def test_queued_logging_after_fork():
+    """a forked child starts its own listener"""
+    handler, listener, _ = queuedlogging._queued_loggers["ddpui"]
+    old_queue = handler.queue
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        child_handler, child_listener, _ = queuedlogging._queued_loggers["ddpui"]
+        ok = (
+            child_handler is handler
+            and child_handler.queue is not old_queue
+            and child_listener is not listener
+            and child_listener._thread.is_alive()
+        )
+        os.write(write_fd, b"1" if ok else b"0")
+        os._exit(0)
+    os.waitpid(pid, 0)
+    assert os.read(read_fd, 1) == b"1"
+    assert handler.queue is old_queue
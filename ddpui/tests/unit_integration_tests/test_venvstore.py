@@ -0,0 +1,102 @@
+import os
+from subprocess import CalledProcessError
+from unittest.mock import Mock, patch
+import pytest
+
+from ddpui.ddpdbt import venvstore
+
+
+def fake_runcmd(cmd, cwd):
+    """creates the venv directory instead of running python -m venv"""
+    if " -m venv " in cmd:
+        (cwd / cmd.split()[-1] / "bin").mkdir(parents=True)
+
+
+@pytest.fixture
+def clientdbt_root(tmp_path):
+    """CLIENTDBT_ROOT in a temporary directory"""
+    with patch.dict(os.environ, {"CLIENTDBT_ROOT": str(tmp_path)}):
+        yield tmp_path
+
+
+def test_get_requirements_unknown_warehouse():
+    """only warehouses with a known adapter are supported"""
+    with pytest.raises(ValueError) as excinfo:
+        venvstore.get_requirements("1.4.5", "snowflake")
+    assert str(excinfo.value) == "unsupported warehouse type snowflake"
+
+
+def test_get_venv_digest():
+    """the digest depends on the requirements but not their order"""
+    requirements = venvstore.get_requirements("1.4.5", "postgres")
+    assert venvstore.get_venv_digest(requirements) == venvstore.get_venv_digest(
+        list(reversed(requirements))
+    )
+    assert venvstore.get_venv_digest(requirements) != venvstore.get_venv_digest(
+        venvstore.get_requirements("1.4.6", "postgres")
+    )
+
+
+def test_ensure_venv_builds_once(clientdbt_root):
+    """a venv is built the first time it is needed and reused after that"""
+    runcmd = Mock(side_effect=fake_runcmd)
+    with patch("ddpui.ddpdbt.venvstore.runcmd", runcmd):
+        venv_dir = venvstore.ensure_venv("1.4.5", "postgres")
+        assert venv_dir.parent == clientdbt_root / ".venvs"
+        assert (venv_dir / venvstore.COMPLETE_MARKER).exists()
+        assert runcmd.call_count == 3
+        install = runcmd.call_args_list[2].args[0]
+        assert install.endswith(" dbt-core==1.4.5 dbt-postgres==1.4.5")
+
+        assert venvstore.ensure_venv("1.4.5", "postgres") == venv_dir
+        assert runcmd.call_count == 3
+
+        assert venvstore.ensure_venv("1.4.5", "bigquery") != venv_dir
+        assert runcmd.call_count == 6
+
+
+def test_ensure_venv_rebuilds_incomplete_venv(clientdbt_root):
+    """a build which was interrupted is started over"""
+    requirements = venvstore.get_requirements("1.4.5", "postgres")
+    stale = clientdbt_root / ".venvs" / venvstore.get_venv_digest(requirements)
+    (stale / "bin").mkdir(parents=True)
+    with patch("ddpui.ddpdbt.venvstore.runcmd", Mock(side_effect=fake_runcmd)):
+        assert venvstore.ensure_venv("1.4.5", "postgres") == stale
+    assert (stale / venvstore.COMPLETE_MARKER).exists()
+
+
+def test_link_venv_replaces_private_venv(tmp_path):
+    """a workspace's own venv is replaced by a link to the shared one"""
+    shared = tmp_path / "shared"
+    shared.mkdir()
+    project_dir = tmp_path / "org"
+    (project_dir / "venv/bin").mkdir(parents=True)
+    venvstore.link_venv(project_dir, shared)
+    assert (project_dir / "venv").resolve() == shared
+    venvstore.link_venv(project_dir, shared)
+    assert (project_dir / "venv").resolve() == shared
+
+
+def test_pip_install_from_wheelhouse(clientdbt_root):
+    """installs do not go to the network when the wheelhouse has every wheel"""
+    runcmd = Mock()
+    with patch("ddpui.ddpdbt.venvstore.runcmd", runcmd):
+        venvstore.pip_install("pip", ["dbt-core==1.4.5"], clientdbt_root)
+    runcmd.assert_called_once_with(
+        f"pip install --no-index --find-links {clientdbt_root / '.wheelhouse'}"
+        " dbt-core==1.4.5",
+        clientdbt_root,
+    )
+
+
+def test_pip_install_fills_wheelhouse(clientdbt_root):
+    """missing wheels are downloaded into the wheelhouse and the install retried"""
+    wheelhouse = clientdbt_root / ".wheelhouse"
+    runcmd = Mock(side_effect=[CalledProcessError(1, "pip"), None, None])
+    with patch("ddpui.ddpdbt.venvstore.runcmd", runcmd):
+        venvstore.pip_install("pip", ["dbt-core==1.4.5"], clientdbt_root)
+    assert [call.args[0] for call in runcmd.call_args_list] == [
+        f"pip install --no-index --find-links {wheelhouse} dbt-core==1.4.5",
+        f"pip wheel --wheel-dir {wheelhouse} dbt-core==1.4.5",
+        f"pip install --no-index --find-links {wheelhouse} dbt-core==1.4.5",
+    ]
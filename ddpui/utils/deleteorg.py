@@ -1,102 +1,193 @@
+"""
+tears an org down in prefect, airbyte and our database
+
+each stage deletes its resources concurrently, MAX_CONCURRENT_REQUESTS at a
+time, carries on past the ones which fail, and deletes a resource's row only
+once the resource is gone upstream. the rows which remain, together with what
+airbyte still lists, are the checkpoint: running the teardown again retries
+only what is left. the org itself is deleted once nothing is left
+"""
 from ninja.errors import HttpError
 from ddpui.models.org_user import Org, OrgUser
 from ddpui.models.org import OrgDataFlow, OrgPrefectBlock, OrgWarehouse
 from ddpui.ddpairbyte import airbyte_service
 from ddpui.ddpprefect import prefect_service
-from ddpui.ddpprefect import AIRBYTESERVER, AIRBYTECONNECTION, SHELLOPERATION
+from ddpui.ddpprefect import AIRBYTESERVER, AIRBYTECONNECTION, SHELLOPERATION, DBTCORE
 from ddpui.ddpdbt import dbt_service
 from ddpui.utils import secretsmanager
+from ddpui.utils.helpers import map_concurrently
+from ddpui.utils.taskprogress import TaskProgress
 
 from ddpui.utils.ddp_logger import logger
 
 
-def delete_prefect_deployments(org: Org):  # skipcq: PYL-R0201
-    """fetches and deletes every prefect deployment for this org"""
+def delete_concurrently(delete, items: list) -> list:
+    """
+    calls delete on every item, a few at a time, and returns the items which
+    could not be deleted. an item which is not found has already been deleted.
+    delete runs off the main thread and must not use the db
+    """
+
+    def attempt(item) -> bool:
+        try:
+            delete(item)
+        except HttpError as error:
+            if error.status_code != 404:
+                logger.error("could not delete %s: %s", item, error)
+                return False
+        except Exception as error:  # skipcq PYL-W0703
+            logger.error("could not delete %s: %s", item, error)
+            return False
+        return True
+
+    deleted = map_concurrently(attempt, items)
+    return [item for item, ok in zip(items, deleted) if not ok]
+
+
+def delete_prefect_blocks(org: Org, block_type: str) -> int:
+    """
+    deletes the org's prefect blocks of a type in one request to the proxy,
+    falling back to deleting them one by one. returns the number left over
+    """
+    blocks = list(OrgPrefectBlock.objects.filter(org=org, block_type=block_type))
+    for block in blocks:
+        logger.info("%s %s %s", block.block_type, block.block_name, block.block_id)
+    if len(blocks) == 0:
+        return 0
+
+    block_ids = [block.block_id for block in blocks]
+    try:
+        prefect_service.post_prefect_blocks_bulk_delete(block_ids)
+        failed = []
+    except HttpError as error:
+        logger.info("bulk delete of %s blocks failed: %s", block_type, error)
+        failed = delete_concurrently(prefect_service.prefect_delete_a_block, block_ids)
+
+    OrgPrefectBlock.objects.filter(id__in=[block.id for block in blocks]).exclude(
+        block_id__in=failed
+    ).delete()
+    return len(failed)
+
+
+def delete_prefect_deployments(org: Org) -> int:  # skipcq: PYL-R0201
+    """deletes every prefect deployment for this org, returning the number left"""
     logger.info("=========== OrgDataFlow ===========")
-    for dataflow in OrgDataFlow.objects.filter(org=org):
+    dataflows = list(OrgDataFlow.objects.filter(org=org))
+    for dataflow in dataflows:
         logger.info("%s %s", dataflow.deployment_id, dataflow.connection_id)
-        try:
-            prefect_service.delete_deployment_by_id(dataflow.deployment_id)
-        except HttpError:
-            pass
-        dataflow.delete()
+
+    failed = delete_concurrently(
+        prefect_service.delete_deployment_by_id,
+        [dataflow.deployment_id for dataflow in dataflows if dataflow.deployment_id],
+    )
+    OrgDataFlow.objects.filter(id__in=[dataflow.id for dataflow in dataflows]).exclude(
+        deployment_id__in=failed
+    ).delete()
+    return len(failed)
 
 
-def delete_prefect_shell_blocks(org: Org):  # skipcq: PYL-R0201
-    """fetches and deletes all prefect blocks for this org"""
+def delete_prefect_shell_blocks(org: Org) -> int:  # skipcq: PYL-R0201
+    """deletes all prefect shell blocks for this org, returning the number left"""
     logger.info("=========== OrgPrefectBlock: Shell Operations ===========")
-    for block in OrgPrefectBlock.objects.filter(org=org, block_type=SHELLOPERATION):
-        logger.info(
-            "%s %s %s",
-            block.block_name,
-            block.display_name,
-            block.command,
-        )
-        prefect_service.delete_shell_block(block.block_id)
-        block.delete()
+    return delete_prefect_blocks(org, SHELLOPERATION)
+
 
+def delete_dbt_workspace(org: Org) -> int:  # skipcq: PYL-R0201
+    """deletes the dbt workspace, returning the number of dbt blocks left"""
+    logger.info("=========== OrgPrefectBlock: dbt Core ===========")
+    failed = delete_prefect_blocks(org, DBTCORE)
+    if failed == 0:
+        # there are no blocks left for it to delete one at a time
+        dbt_service.delete_dbt_workspace(org)
+    return failed
 
-def delete_dbt_workspace(org: Org):  # skipcq: PYL-R0201
-    """deletes the dbt workspace"""
-    dbt_service.delete_dbt_workspace(org)
+
+def list_airbyte_resources(list_resources, workspace_id: str, kind: str):
+    """
+    the ids of a workspace's sources, destinations or connections, as named
+    by kind. a workspace which is not found has none left; returns None if
+    airbyte could not be asked
+    """
+    try:
+        response = list_resources(workspace_id)
+    except HttpError as error:
+        if error.status_code == 404:
+            return []
+        logger.error("could not list the %ss of %s: %s", kind, workspace_id, error)
+        return None
+    return [resource[f"{kind}Id"] for resource in response[f"{kind}s"]]
 
 
-def delete_airbyte_workspace(org: Org):  # skipcq: PYL-R0201
+def delete_airbyte_workspace(org: Org) -> int:  # skipcq: PYL-R0201
     """
     deletes airbyte sources, destinations, connections
     deletes airbyte server and connection blocks in prefect
+    the workspace itself is deleted once it is empty. returns the number of
+    resources left over
     """
+    workspace_id = org.airbyte_workspace_id
+    if workspace_id is None:
+        return 0
+
     logger.info("=========== OrgPrefectBlock: Airbyte Connections ===========")
-    for block in OrgPrefectBlock.objects.filter(org=org, block_type=AIRBYTECONNECTION):
-        logger.info(
-            "%s %s %s %s %s",
-            block.block_name,
-            block.block_type,
-            block.display_name,
-            block.dbt_target_schema,
-            block.command,
-        )
-        prefect_service.delete_airbyte_connection_block(block.block_id)
-        block.delete()
+    failed = delete_prefect_blocks(org, AIRBYTECONNECTION)
 
     logger.info("=========== OrgPrefectBlock: Airbyte Server(s) ===========")
-    for block in OrgPrefectBlock.objects.filter(org=org, block_type=AIRBYTESERVER):
-        logger.info(
-            "%s %s %s %s %s",
-            block.block_name,
-            block.block_type,
-            block.display_name,
-            block.dbt_target_schema,
-            block.command,
-        )
-        prefect_service.delete_airbyte_server_block(block.block_id)
-        block.delete()
-
-    for connection in airbyte_service.get_connections(org.airbyte_workspace_id)[
-        "connections"
-    ]:
-        logger.info("deleting connection in Airbyte " + connection["connectionId"])
-        airbyte_service.delete_connection(
-            org.airbyte_workspace_id, connection["connectionId"]
-        )
+    # the connection blocks refer to the server block
+    if failed == 0:
+        failed += delete_prefect_blocks(org, AIRBYTESERVER)
 
-    for destination in airbyte_service.get_destinations(org.airbyte_workspace_id)[
-        "destinations"
-    ]:
-        logger.info("deleting destination in Airbyte " + destination["destinationId"])
-        airbyte_service.delete_destination(
-            org.airbyte_workspace_id, destination["destinationId"]
+    logger.info("=========== Airbyte Connections ===========")
+    connection_ids = list_airbyte_resources(
+        airbyte_service.get_connections, workspace_id, "connection"
+    )
+    if connection_ids is None:
+        failed += 1
+    else:
+        failed += len(
+            delete_concurrently(
+                lambda connection_id: airbyte_service.delete_connection(
+                    workspace_id, connection_id
+                ),
+                connection_ids,
+            )
         )
 
-    for source in airbyte_service.get_sources(org.airbyte_workspace_id)["sources"]:
-        logger.info("deleting source in Airbyte " + source["sourceId"])
-        airbyte_service.delete_source(org.airbyte_workspace_id, source["sourceId"])
+    logger.info("=========== Airbyte Sources and Destinations ===========")
+    destination_ids = list_airbyte_resources(
+        airbyte_service.get_destinations, workspace_id, "destination"
+    )
+    source_ids = list_airbyte_resources(
+        airbyte_service.get_sources, workspace_id, "source"
+    )
+    destinations_listed = destination_ids is not None
+    failed += (destination_ids is None) + (source_ids is None)
+    destination_ids = destination_ids or []
 
-    for warehouse in OrgWarehouse.objects.filter(org=org):
-        secretsmanager.delete_warehouse_credentials(warehouse)
-        warehouse.delete()
+    def delete_source_or_destination(resource_id: str) -> None:
+        if resource_id in destination_ids:
+            airbyte_service.delete_destination(workspace_id, resource_id)
+        else:
+            airbyte_service.delete_source(workspace_id, resource_id)
 
-    airbyte_service.delete_workspace(org.airbyte_workspace_id)
+    left_over = delete_concurrently(
+        delete_source_or_destination, destination_ids + (source_ids or [])
+    )
+    failed += len(left_over)
+
+    # a warehouse's credentials are needed until its destination is gone
+    if destinations_listed and not any(
+        resource_id in destination_ids for resource_id in left_over
+    ):
+        for warehouse in OrgWarehouse.objects.filter(org=org):
+            secretsmanager.delete_warehouse_credentials(warehouse)
+            warehouse.delete()
+
+    if failed == 0:
+        airbyte_service.delete_workspace(workspace_id)
+        org.airbyte_workspace_id = None
+        org.save()
+    return failed
 
 
 def delete_orgusers(org: Org):  # skipcq: PYL-R0201
@@ -106,18 +197,65 @@ def delete_orgusers(org: Org):  # skipcq: PYL-R0201
         # this deletes the orguser as well via CASCADE
 
 
-def delete_one_org(org: Org, yes_really: bool):
-    """delete one org"""
+def delete_one_org(org: Org, yes_really: bool, taskprogress: TaskProgress = None):
+    """
+    delete one org, reporting each stage to taskprogress if given. returns
+    whether the org is gone; if not, calling this again retries what is left
+    """
     logger.info(
         "OrgName: %s   Airbyte workspace ID: %s",
         org.name,
         org.airbyte_workspace_id,
     )
-    if yes_really:
-        delete_prefect_deployments(org)
-        delete_dbt_workspace(org)
-        if org.airbyte_workspace_id:
-            delete_airbyte_workspace(org)
-        delete_prefect_shell_blocks(org)
-        delete_orgusers(org)
-        org.delete()
+    if not yes_really:
+        return False
+
+    stages = [
+        ("prefect deployments", delete_prefect_deployments),
+        ("dbt workspace", delete_dbt_workspace),
+        ("airbyte workspace", delete_airbyte_workspace),
+        ("prefect shell blocks", delete_prefect_shell_blocks),
+    ]
+    numsteps = len(stages) + 1
+    left_over = 0
+    for stepnum, (name, delete_stage) in enumerate(stages, start=1):
+        failed = delete_stage(org)
+        left_over += failed
+        if taskprogress:
+            taskprogress.add(
+                {
+                    "stepnum": stepnum,
+                    "numsteps": numsteps,
+                    "message": f"deleted {name}"
+                    if failed == 0
+                    else f"could not delete {failed} of the {name}",
+                    "status": "running",
+                }
+            )
+
+    if left_over > 0:
+        logger.error("%d resources of org %s are left over", left_over, org.name)
+        if taskprogress:
+            taskprogress.add(
+                {
+                    "stepnum": numsteps,
+                    "numsteps": numsteps,
+                    "message": f"{left_over} resources could not be deleted, "
+                    "run again to retry them",
+                    "status": "failed",
+                }
+            )
+        return False
+
+    delete_orgusers(org)
+    org.delete()
+    if taskprogress:
+        taskprogress.add(
+            {
+                "stepnum": numsteps,
+                "numsteps": numsteps,
+                "message": "deleted org",
+                "status": "completed",
+            }
+        )
+    return True
@@ -1,29 +1,10 @@
 import logging
-import sys
-from logging.handlers import RotatingFileHandler
-from ddpui import settings
+from ddpui.utils.queuedlogging import setup_queued_logger
 
 logger = logging.getLogger("django")
 
 
 def setup_logger():
     """sets up the django logger"""
-    logfilename = settings.BASE_DIR / "ddpui/logs/django.log"
     logger.setLevel(logging.INFO)
-
-    # log to stdout
-    handler = logging.StreamHandler(sys.stdout)
-    handler.setLevel(logging.DEBUG)
-    formatter = logging.Formatter(
-        "%(levelname)s - %(asctime)s - %(name)s - %(message)s"
-    )
-    handler.setFormatter(formatter)
-    logger.addHandler(handler)
-
-    handler = RotatingFileHandler(logfilename, maxBytes=1048576, backupCount=5)
-    handler.setLevel(logging.INFO)
-    formatter = logging.Formatter(
-        "%(levelname)s - %(asctime)s - %(name)s - %(message)s"
-    )
-    handler.setFormatter(formatter)
-    logger.addHandler(handler)
+    setup_queued_logger(logger, "django")
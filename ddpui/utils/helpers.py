@@ -1,6 +1,14 @@
+import os
 import shlex
 import subprocess
 import re
+import fcntl
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+# upper bound on the number of upstream (airbyte / prefect-proxy) requests
+# a single api call will have in flight at any time
+MAX_CONCURRENT_REQUESTS = int(os.getenv("MAX_CONCURRENT_REQUESTS", "8"))
 
 
 def runcmd(cmd, cwd):
@@ -8,25 +16,62 @@ def runcmd(cmd, cwd):
     return subprocess.run(shlex.split(cmd), cwd=str(cwd), check=True)
 
 
-def remove_nested_attribute(obj: dict, attr: str) -> dict:
+@contextmanager
+def locked(lockfile):
+    """holds an exclusive lock on lockfile, shared by processes on this machine"""
+    with open(lockfile, "w", encoding="utf-8") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def map_concurrently(func, items: list, max_workers: int = None) -> list:
     """
-    this function searches for `attr` in the JSON object
-    and removes any occurences it finds
+    calls func on every element of items using a bounded thread pool
+    and returns the results in the same order as items. if any call raises,
+    the exception from the earliest such item is re-raised
     """
-    if attr in obj:
-        del obj[attr]
+    items = list(items)
+    if len(items) == 0:
+        return []
+    max_workers = min(max_workers or MAX_CONCURRENT_REQUESTS, len(items))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(func, items))
 
-    for key in obj:
-        assert key != attr
-        val = obj[key]
 
-        if isinstance(val, dict):
-            obj[key] = remove_nested_attribute(val, attr)
-
-        elif isinstance(val, list):
-            for list_idx, list_val in enumerate(val):
-                if isinstance(list_val, dict):
-                    val[list_idx] = remove_nested_attribute(list_val, attr)
+def remove_nested_attribute(obj, *attrs: str, skip_keys: tuple = ()):
+    """
+    this function searches for the keys `attrs` anywhere in the JSON object
+    and removes any occurences it finds, in place. values stored under any of
+    `skip_keys` are not searched, for subtrees known not to contain `attrs`
+    """
+    # type() checks instead of isinstance, and a single explicit stack, keep
+    # this fast on multi-megabyte catalogs and safe on deeply nested schemas
+    skip_keys = frozenset(skip_keys)
+    stack = [obj]
+    push = stack.append
+    pop = stack.pop
+    while stack:
+        node = pop()
+        if type(node) is dict:
+            for attr in attrs:
+                if attr in node:
+                    del node[attr]
+            if skip_keys:
+                for key, val in node.items():
+                    val_type = type(val)
+                    if (val_type is dict or val_type is list) and key not in skip_keys:
+                        push(val)
+                continue
+            children = node.values()
+        else:
+            children = node
+        for val in children:
+            val_type = type(val)
+            if val_type is dict or val_type is list:
+                push(val)
 
     return obj
 
@@ -0,0 +1,80 @@
+"""a per-process pool of keep-alive http connections to a single upstream server"""
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class PooledSession:
+    """
+    wraps a requests.Session whose connection pool is reused across calls
+
+    the session is created lazily and re-created whenever the pid changes, so
+    gunicorn workers and celery prefork children each get their own sockets
+    instead of sharing the ones their parent opened before forking
+    """
+
+    def __init__(self, pool_size: int, headers: dict = None) -> None:
+        self.pool_size = pool_size
+        self.headers = headers or {}
+        self._session = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _build_session(self) -> requests.Session:
+        """a new session with a single adapter holding up to pool_size connections"""
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_maxsize=self.pool_size)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        session.headers.update({"Connection": "keep-alive"})
+        session.headers.update(self.headers)
+        return session
+
+    def session(self) -> requests.Session:
+        """returns this process' session, creating it if required"""
+        pid = os.getpid()
+        if self._session is None or self._pid != pid:
+            with self._lock:
+                if self._session is None or self._pid != pid:
+                    self._session = self._build_session()
+                    self._pid = pid
+        return self._session
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        """POST through the pooled session"""
+        return self.session().post(url, **kwargs)
+
+    def stats(self) -> dict:
+        """
+        counts requests made through this process' session, and how many of
+        them had to open a new connection (misses) vs. reused one (hits)
+        """
+        num_requests = 0
+        num_connections = 0
+        if self._session is not None and self._pid == os.getpid():
+            adapters = {
+                id(adapter): adapter for adapter in self._session.adapters.values()
+            }
+            for adapter in adapters.values():
+                pools = adapter.poolmanager.pools
+                for pool_key in pools.keys():
+                    pool = pools.get(pool_key)
+                    if pool is None:
+                        continue
+                    num_requests += pool.num_requests
+                    num_connections += pool.num_connections
+        return {
+            "requests": num_requests,
+            "hits": max(num_requests - num_connections, 0),
+            "misses": num_connections,
+        }
+
+    def close(self) -> None:
+        """closes all pooled connections held by this process"""
+        with self._lock:
+            if self._session is not None and self._pid == os.getpid():
+                self._session.close()
+            self._session = None
+            self._pid = None
@@ -0,0 +1,115 @@
+"""
+logging which never blocks the caller: loggers put records on a queue and a
+listener thread in each process writes them out
+
+LOG_SINK chooses where they go:
+    file          ddpui/logs/<name>.log, shared by all processes (the default)
+    process-file  ddpui/logs/<name>-<pid>.log, so that no two processes
+                  rotate the same file
+    socket        a logging.handlers.SocketHandler to LOG_SOCKET_HOST:LOG_SOCKET_PORT
+with LOG_FORMAT=json every line written to a file or to stdout is a json object
+"""
+import os
+import sys
+import json
+import queue
+import atexit
+import logging
+from logging.handlers import (
+    QueueHandler,
+    QueueListener,
+    RotatingFileHandler,
+    SocketHandler,
+    DEFAULT_TCP_LOGGING_PORT,
+)
+from ddpui import settings
+
+LOG_SINK = os.getenv("LOG_SINK", "file")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+LOG_SOCKET_HOST = os.getenv("LOG_SOCKET_HOST") or "localhost"
+LOG_SOCKET_PORT = int(os.getenv("LOG_SOCKET_PORT") or DEFAULT_TCP_LOGGING_PORT)
+
+# logger name => (its QueueHandler, the QueueListener draining it, its log name)
+_queued_loggers = {}
+
+
+class JsonFormatter(logging.Formatter):
+    """formats a record as a single line of json"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "process": record.process,
+            "message": record.getMessage(),
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc_info"] = record.exc_text
+        return json.dumps(entry)
+
+
+def get_formatter() -> logging.Formatter:
+    """the formatter chosen by LOG_FORMAT"""
+    if LOG_FORMAT == "json":
+        return JsonFormatter()
+    return logging.Formatter("%(levelname)s - %(asctime)s - %(name)s - %(message)s")
+
+
+def get_handlers(logname: str) -> list:
+    """the handlers the listener writes a logger's records to"""
+    # log to stdout
+    stdout_handler = logging.StreamHandler(sys.stdout)
+    stdout_handler.setLevel(logging.DEBUG)
+    stdout_handler.setFormatter(get_formatter())
+
+    if LOG_SINK == "socket":
+        sink_handler = SocketHandler(LOG_SOCKET_HOST, LOG_SOCKET_PORT)
+    else:
+        if LOG_SINK == "process-file":
+            logname = f"{logname}-{os.getpid()}"
+        logfilename = settings.BASE_DIR / f"ddpui/logs/{logname}.log"
+        sink_handler = RotatingFileHandler(logfilename, maxBytes=1048576, backupCount=5)
+        sink_handler.setFormatter(get_formatter())
+    sink_handler.setLevel(logging.INFO)
+
+    return [stdout_handler, sink_handler]
+
+
+def start_listener(logname: str, handler: QueueHandler) -> QueueListener:
+    """starts a thread writing out what is put on the handler's queue"""
+    listener = QueueListener(
+        handler.queue, *get_handlers(logname), respect_handler_level=True
+    )
+    listener.start()
+    return listener
+
+
+def setup_queued_logger(logger: logging.Logger, logname: str) -> None:
+    """sends a logger's records through a queue to stdout and to LOG_SINK"""
+    handler = QueueHandler(queue.SimpleQueue())
+    logger.addHandler(handler)
+    _queued_loggers[logger.name] = (handler, start_listener(logname, handler), logname)
+
+
+def restart_listeners() -> None:
+    """
+    a forked child inherits the queues but not the listener threads, so it
+    gets fresh queues and listeners of its own
+    """
+    for name, (handler, _, logname) in list(_queued_loggers.items()):
+        handler.queue = queue.SimpleQueue()
+        _queued_loggers[name] = (handler, start_listener(logname, handler), logname)
+
+
+def stop_listeners() -> None:
+    """writes out whatever is still queued"""
+    for _, listener, _ in _queued_loggers.values():
+        if listener._thread is not None:  # pylint: disable=protected-access
+            listener.stop()
+
+
+os.register_at_fork(after_in_child=restart_listeners)
+atexit.register(stop_listeners)
@@ -0,0 +1,18 @@
+"""a single redis client per process"""
+from redis import Redis
+
+
+class RedisClient:
+    """
+    hands out one Redis client per process so that callers share its
+    connection pool instead of opening new sockets on every call
+    """
+
+    _instance = None
+
+    @classmethod
+    def get_instance(cls) -> Redis:
+        """returns the shared client, creating it if required"""
+        if cls._instance is None:
+            cls._instance = Redis()
+        return cls._instance
@@ -1,21 +1,191 @@
 import os
 import json
+import base64
+import hashlib
+import threading
 from uuid import uuid4
 import boto3
+from cryptography.fernet import Fernet, InvalidToken
+from django.conf import settings
+from redis.exceptions import RedisError
 from ddpui.utils.ddp_logger import logger
+from ddpui.utils.redis_client import RedisClient
+
+# "aws" (the default), "file" or "memory"; the last two are for tests and local dev
+SECRETS_BACKEND = os.getenv("SECRETS_BACKEND", "aws")
+SECRETS_FILE_DIR = os.getenv("SECRETS_FILE_DIR") or "secrets"
+SECRETS_CACHE_TTL = int(os.getenv("SECRETS_CACHE_TTL", "300"))
+
+_client = None
+_client_pid = None
+_backend = None
+_lock = threading.Lock()
 
 
 def get_client():
-    """creates a boto3 client for AWS Secrets Manager in ap-south-1"""
-    secretsmanager = boto3.client(
-        "secretsmanager",
-        "ap-south-1",
-        aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
-        aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
-    )
-    return secretsmanager
+    """
+    returns this process' boto3 client for AWS Secrets Manager in ap-south-1,
+    creating it on first use. building a client loads botocore's service
+    models, so it is done once per process rather than once per call
+    """
+    global _client, _client_pid  # pylint: disable=global-statement
+    pid = os.getpid()
+    if _client is None or _client_pid != pid:
+        with _lock:
+            if _client is None or _client_pid != pid:
+                _client = boto3.client(
+                    "secretsmanager",
+                    "ap-south-1",
+                    aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
+                    aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
+                )
+                _client_pid = pid
+    return _client
+
+
+class AwsSecretsBackend:
+    """secrets kept in AWS Secrets Manager"""
+
+    def create_secret(self, name: str, value: str) -> None:
+        """stores a new secret"""
+        get_client().create_secret(Name=name, SecretString=value)
+
+    def update_secret(self, name: str, value: str) -> None:
+        """replaces the value of an existing secret"""
+        get_client().update_secret(SecretId=name, SecretString=value)
+
+    def get_secret(self, name: str) -> str | None:
+        """returns the value of a secret"""
+        response = get_client().get_secret_value(SecretId=name)
+        return response.get("SecretString")
+
+    def delete_secret(self, name: str) -> None:
+        """deletes a secret"""
+        get_client().delete_secret(SecretId=name)
+
+
+class FileSecretsBackend:
+    """secrets kept in files under a directory, readable only by this user"""
+
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def create_secret(self, name: str, value: str) -> None:
+        """stores a new secret"""
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+        descriptor = os.open(
+            self._path(name), os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600
+        )
+        with os.fdopen(descriptor, "w", encoding="utf-8") as secret_file:
+            secret_file.write(value)
+
+    def update_secret(self, name: str, value: str) -> None:
+        """replaces the value of an existing secret"""
+        with open(self._path(name), "r+", encoding="utf-8") as secret_file:
+            secret_file.truncate()
+            secret_file.write(value)
+
+    def get_secret(self, name: str) -> str | None:
+        """returns the value of a secret"""
+        with open(self._path(name), "r", encoding="utf-8") as secret_file:
+            return secret_file.read()
+
+    def delete_secret(self, name: str) -> None:
+        """deletes a secret"""
+        os.remove(self._path(name))
+
+
+class InMemorySecretsBackend:
+    """secrets kept in a dict, for tests"""
+
+    def __init__(self) -> None:
+        self.secrets = {}
 
+    def create_secret(self, name: str, value: str) -> None:
+        """stores a new secret"""
+        if name in self.secrets:
+            raise KeyError(f"secret {name} already exists")
+        self.secrets[name] = value
 
+    def update_secret(self, name: str, value: str) -> None:
+        """replaces the value of an existing secret"""
+        if name not in self.secrets:
+            raise KeyError(f"secret {name} not found")
+        self.secrets[name] = value
+
+    def get_secret(self, name: str) -> str | None:
+        """returns the value of a secret"""
+        return self.secrets[name]
+
+    def delete_secret(self, name: str) -> None:
+        """deletes a secret"""
+        del self.secrets[name]
+
+
+def get_backend():
+    """returns the secrets backend configured by SECRETS_BACKEND"""
+    global _backend  # pylint: disable=global-statement
+    if _backend is None:
+        with _lock:
+            if _backend is None:
+                if SECRETS_BACKEND == "file":
+                    _backend = FileSecretsBackend(SECRETS_FILE_DIR)
+                elif SECRETS_BACKEND == "memory":
+                    _backend = InMemorySecretsBackend()
+                else:
+                    _backend = AwsSecretsBackend()
+    return _backend
+
+
+# ================================================================================
+# secrets are cached in redis for SECRETS_CACHE_TTL seconds, encrypted with a key
+# derived from the django secret key so that they are never stored in the clear
+def _get_fernet() -> Fernet:
+    """the cipher for cached secrets"""
+    key = hashlib.sha256(f"secretsmanager:{settings.SECRET_KEY}".encode("utf-8"))
+    return Fernet(base64.urlsafe_b64encode(key.digest()))
+
+
+def cache_secret(name: str, value: str) -> None:
+    """caches the value of a secret, encrypted"""
+    try:
+        RedisClient.get_instance().set(
+            f"secret:{name}",
+            _get_fernet().encrypt(value.encode("utf-8")),
+            ex=SECRETS_CACHE_TTL,
+        )
+    except RedisError as error:
+        logger.warning("secrets cache unavailable: %s", error)
+
+
+def get_cached_secret(name: str) -> str | None:
+    """returns the cached value of a secret, if there is one"""
+    try:
+        encrypted = RedisClient.get_instance().get(f"secret:{name}")
+    except RedisError as error:
+        logger.warning("secrets cache unavailable: %s", error)
+        return None
+    if encrypted is None:
+        return None
+    try:
+        return _get_fernet().decrypt(encrypted).decode("utf-8")
+    except InvalidToken:
+        # the django secret key has changed since this was cached
+        return None
+
+
+def evict_secret(name: str) -> None:
+    """drops a secret from the cache"""
+    try:
+        RedisClient.get_instance().delete(f"secret:{name}")
+    except RedisError as error:
+        logger.error("could not evict %s from the secrets cache: %s", name, error)
+
+
+# ================================================================================
 def generate_github_token_name(org):
     """
     for orgs whose github repos require an access token,
@@ -31,14 +201,10 @@ def generate_warehouse_credentials_name(org):
 
 def save_github_token(org, access_token):
     """saves a github auth token for an org under a predefined secret name"""
-    aws_sm = get_client()
     secret_name = generate_github_token_name(org)
-    response = aws_sm.create_secret(
-        Name=secret_name,
-        SecretString=access_token,
-    )
+    get_backend().create_secret(secret_name, access_token)
     logger.info(
-        "saved github access token in secrets manager under name=" + response["Name"]
+        "saved github access token in secrets manager under name=" + secret_name
     )
     org.dbt.gitrepo_access_token_secret = secret_name
     org.dbt.save()
@@ -47,55 +213,52 @@ def save_github_token(org, access_token):
 def delete_github_token(org):
     """deletes a secret corresponding to a github auth token for an org, if it exists"""
     if org.dbt and org.dbt.gitrepo_access_token_secret:
-        aws_sm = get_client()
         secret_name = org.dbt.gitrepo_access_token_secret
         try:
-            aws_sm.delete_secret(SecretId=secret_name)
+            get_backend().delete_secret(secret_name)
         except Exception:
             # no secret to delete, carry on
             pass
+        evict_secret(secret_name)
         org.dbt.gitrepo_access_token_secret = None
         org.dbt.save()
 
 
 def save_warehouse_credentials(warehouse, credentials: dict):
     """saves warehouse credentials for an org under a predefined secret name"""
-    aws_sm = get_client()
     secret_name = generate_warehouse_credentials_name(warehouse.org)
-    response = aws_sm.create_secret(
-        Name=secret_name,
-        SecretString=json.dumps(credentials),
-    )
+    get_backend().create_secret(secret_name, json.dumps(credentials))
     logger.info(
-        "saved warehouse credentials in secrets manager under name=" + response["Name"]
+        "saved warehouse credentials in secrets manager under name=" + secret_name
     )
     return secret_name
 
 
 def update_warehouse_credentials(warehouse, credentials: dict):
     """udpates warehouse credentials for an org"""
-    aws_sm = get_client()
-    response = aws_sm.update_secret(
-        SecretId=warehouse.credentials,
-        SecretString=json.dumps(credentials),
-    )
+    get_backend().update_secret(warehouse.credentials, json.dumps(credentials))
+    cache_secret(warehouse.credentials, json.dumps(credentials))
     logger.info(
         "updated warehouse credentials in secrets manager under name="
-        + response["Name"]
+        + warehouse.credentials
     )
 
 
 def retrieve_warehouse_credentials(warehouse) -> dict | None:
     """decodes and returns the saved warehouse credentials for an org"""
-    aws_sm = get_client()
-    response = aws_sm.get_secret_value(SecretId=warehouse.credentials)
-    return json.loads(response["SecretString"]) if "SecretString" in response else None
+    secret = get_cached_secret(warehouse.credentials)
+    if secret is None:
+        secret = get_backend().get_secret(warehouse.credentials)
+        if secret is None:
+            return None
+        cache_secret(warehouse.credentials, secret)
+    return json.loads(secret)
 
 
 def delete_warehouse_credentials(warehouse) -> None:
     """deletes the secret from SM corresponding to a warehouse's credentials"""
-    aws_sm = get_client()
     try:
-        aws_sm.delete_secret(SecretId=warehouse.credentials)
+        get_backend().delete_secret(warehouse.credentials)
     except Exception:
         pass
+    evict_secret(warehouse.credentials)
@@ -1,17 +1,57 @@
 import os
+import json
+import threading
+from datetime import datetime
 from sendgrid import SendGridAPIClient
-from sendgrid.helpers.mail import Mail, Content
+from sendgrid.helpers.mail import Mail, Content, Personalization, To
+from python_http_client.exceptions import HTTPError
 from ddpui.utils.ddp_logger import logger
 
 SENDGRID_APIKEY = os.getenv("SENDGRID_APIKEY")
 SENDGRID_SENDER = os.getenv("SENDGRID_SENDER")
 
+# "sendgrid" (the default) or "file", which appends each message to
+# EMAIL_FILE_SINK as a line of json instead of sending it, for tests and local dev
+EMAIL_BACKEND = os.getenv("EMAIL_BACKEND", "sendgrid")
+EMAIL_FILE_SINK = os.getenv("EMAIL_FILE_SINK") or "emails.jsonl"
 
-def send_text_message(to_email, subject, message):
-    """
-    send a plain-text email using sendgrid
-    """
-    sendgrid_client = SendGridAPIClient(SENDGRID_APIKEY)
+# sendgrid accepts up to 1000 personalizations in one request
+MAX_PERSONALIZATIONS = 1000
+
+_client = None
+_lock = threading.Lock()
+
+
+def get_client() -> SendGridAPIClient:
+    """returns the sendgrid client, creating it on first use"""
+    global _client  # pylint: disable=global-statement
+    if _client is None:
+        with _lock:
+            if _client is None:
+                _client = SendGridAPIClient(SENDGRID_APIKEY)
+    return _client
+
+
+def is_transient(error: Exception) -> bool:
+    """whether sending again later might succeed"""
+    if isinstance(error, HTTPError):
+        return error.status_code == 429 or error.status_code >= 500
+    # network errors and timeouts
+    return isinstance(error, OSError)
+
+
+def write_to_sink(message: dict) -> None:
+    """appends a message to the file sink"""
+    message = dict(message, sent_at=datetime.utcnow().isoformat())
+    with _lock, open(EMAIL_FILE_SINK, "a", encoding="utf-8") as sink:
+        sink.write(json.dumps(message) + "\n")
+
+
+def deliver_text_message(to_email, subject, message):
+    """sends a plain-text email right away"""
+    if EMAIL_BACKEND == "file":
+        write_to_sink({"to_email": to_email, "subject": subject, "message": message})
+        return
 
     content = Content("text/plain", message)
     message = Mail(
@@ -22,39 +62,69 @@ def send_text_message(to_email, subject, message):
     )
 
     try:
-        sendgrid_client.send(message)
+        get_client().send(message)
     except Exception as error:
         logger.exception(error)
         raise
 
 
-def send_template_message(template_id: str, to_email: str, template_vars: dict) -> None:
+def deliver_template_messages(template_id: str, recipients: list) -> None:
     """
-    this function sends a templated email to a single recipient
-    using sendgrid's api.
+    sends a templated email right away to each of a list of
+    {"to_email": ..., "template_vars": {...}}, in as few api calls as possible
     """
-    sendgrid_client = SendGridAPIClient(SENDGRID_APIKEY)
+    if EMAIL_BACKEND == "file":
+        for recipient in recipients:
+            write_to_sink(dict(recipient, template_id=template_id))
+        return
 
-    message = Mail(from_email=SENDGRID_SENDER, to_emails=[to_email])
-    message.template_id = template_id
-    message.dynamic_template_data = template_vars
+    for start in range(0, len(recipients), MAX_PERSONALIZATIONS):
+        message = Mail(from_email=SENDGRID_SENDER)
+        message.template_id = template_id
+        for recipient in recipients[start : start + MAX_PERSONALIZATIONS]:
+            personalization = Personalization()
+            personalization.add_to(To(recipient["to_email"]))
+            personalization.dynamic_template_data = recipient["template_vars"]
+            message.add_personalization(personalization)
 
-    try:
-        sendgrid_client.send(message)
-    except Exception as error:
-        logger.exception(error)
-        raise
+        try:
+            get_client().send(message)
+        except Exception as error:
+            logger.exception(error)
+            raise
 
 
-def send_password_reset_email(to_email: str, reset_url: str) -> None:
-    """send a password reset email"""
-    send_template_message(
-        os.getenv("SENDGRID_RESET_PASSWORD_TEMPLATE"), to_email, {"url": reset_url}
-    )
+# ================================================================================
+# the functions below build the (template_id, recipients) of the app's emails.
+# callers queue them on the celery outbox with send_template_emails.delay(), which
+# delivers them with retries, so that requests do not wait on sendgrid
+def password_reset_email(to_email: str, reset_url: str) -> tuple:
+    """a password reset email"""
+    return os.getenv("SENDGRID_RESET_PASSWORD_TEMPLATE"), [
+        {"to_email": to_email, "template_vars": {"url": reset_url}}
+    ]
 
 
-def send_signup_email(to_email: str, verification_url: str) -> None:
-    """send a signup email with an email verification link"""
-    send_template_message(
-        os.getenv("SENDGRID_SIGNUP_TEMPLATE"), to_email, {"url": verification_url}
-    )
+def signup_email(to_email: str, verification_url: str) -> tuple:
+    """a signup email with an email verification link"""
+    return os.getenv("SENDGRID_SIGNUP_TEMPLATE"), [
+        {"to_email": to_email, "template_vars": {"url": verification_url}}
+    ]
+
+
+def invite_user_emails(invitations: list) -> tuple:
+    """
+    invitation emails to a list of {"to_email": ..., "invited_by": ...,
+    "invite_url": ...}, sent in a single batch. the template id is None if
+    SENDGRID_INVITE_USERS_TEMPLATE is not set
+    """
+    return os.getenv("SENDGRID_INVITE_USERS_TEMPLATE") or None, [
+        {
+            "to_email": invitation["to_email"],
+            "template_vars": {
+                "url": invitation["invite_url"],
+                "invited_by": invitation["invited_by"],
+            },
+        }
+        for invitation in invitations
+    ]
@@ -0,0 +1,78 @@
+"""runs the steps of a celery task as a small dependency graph"""
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable, NamedTuple
+
+from ddpui.utils.taskprogress import TaskProgress
+from ddpui.utils.ddp_logger import logger
+
+
+class Step(NamedTuple):
+    """one step of a task, which runs once the steps named in `after` are done"""
+
+    name: str
+    run: Callable
+    message: str  # reported when the step succeeds
+    failure: str  # reported when it raises
+    after: tuple = ()
+
+
+def run_steps(
+    steps: list, taskprogress: TaskProgress, stepnum: int, numsteps: int
+) -> bool:
+    """
+    runs each step on a thread as soon as its dependencies are done, adding
+    to taskprogress as steps finish, numbered from stepnum in the order they
+    finish. after a failure no more steps are started; returns whether every
+    step succeeded. steps run off the main thread and must not use the db
+    """
+    names = {step.name for step in steps}
+    for step in steps:
+        if not set(step.after) <= names:
+            raise ValueError(f"step {step.name} depends on an unknown step")
+
+    pending = list(steps)
+    running = {}
+    done = set()
+    failed = False
+    with ThreadPoolExecutor(max_workers=len(steps) or 1) as executor:
+        while pending or running:
+            if not failed:
+                for step in [step for step in pending if set(step.after) <= done]:
+                    pending.remove(step)
+                    running[executor.submit(step.run)] = step
+            if not running:
+                if failed:
+                    break
+                raise ValueError("the steps' dependencies form a cycle")
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                step = running.pop(future)
+                error = future.exception()
+                if failed:
+                    continue
+                if error is None:
+                    done.add(step.name)
+                    taskprogress.add(
+                        {
+                            "stepnum": stepnum,
+                            "numsteps": numsteps,
+                            "message": step.message,
+                            "status": "running",
+                        }
+                    )
+                    stepnum += 1
+                else:
+                    failed = True
+                    taskprogress.add(
+                        {
+                            "stepnum": stepnum,
+                            "numsteps": numsteps,
+                            "message": step.failure,
+                            "error": str(error),
+                            "status": "failed",
+                        }
+                    )
+                    logger.error("step %s failed", step.name, exc_info=error)
+
+    return not failed
@@ -1,29 +1,80 @@
 """simple helper for a celery task to update its progress for its invoker to check on"""
+import os
 import json
-from redis import Redis
+from ddpui.utils.redis_client import RedisClient
+
+TASK_PROGRESS_TTL = int(os.getenv("TASK_PROGRESS_TTL", "86400"))
 
 
 class TaskProgress:
     """
-    maintain a list of steps, store in redis under the name "taskprogress"
-    with the task_id as the key
+    append each step to a redis stream named "taskprogress:<task_id>" which
+    expires TASK_PROGRESS_TTL seconds after the last step. redis assigns the
+    entry ids, so any number of TaskProgress objects, in any number of
+    processes, can add steps for the same task
     """
 
     def __init__(self, task_id) -> None:
         self.task_id = task_id
-        self.taskprogress = []
-        self.redis = Redis()
+
+    @staticmethod
+    def key(task_id) -> str:
+        """the redis key of a task's stream"""
+        return f"taskprogress:{task_id}"
 
     def add(self, progress) -> None:
-        """append the latest progress to the list and update in redis"""
-        self.taskprogress.append(progress)
-        self.redis.hset('taskprogress', self.task_id, json.dumps(self.taskprogress))
+        """append the latest progress to the stream"""
+        key = TaskProgress.key(self.task_id)
+        pipeline = RedisClient.get_instance().pipeline()
+        pipeline.xadd(key, {"progress": json.dumps(progress)})
+        pipeline.expire(key, TASK_PROGRESS_TTL)
+        pipeline.execute()
+
+    @staticmethod
+    def parse(entries) -> list:
+        """the progress in a list of stream entries"""
+        return [json.loads(fields[b"progress"]) for _, fields in entries]
+
+    @staticmethod
+    def read(task_id, since: str = None):
+        """
+        look up the progress by task_id after the stream id `since`, returning
+        {"progress": [...], "next": the id to pass as since next time}, or None
+        for an unknown task
+        """
+        redis = RedisClient.get_instance()
+        key = TaskProgress.key(task_id)
+        # "(" makes the range exclude since itself
+        entries = redis.xrange(key, min=f"({since}" if since else "-")
+        if not entries and not redis.exists(key):
+            return None
+        return {
+            "progress": TaskProgress.parse(entries),
+            "next": entries[-1][0].decode("utf-8") if entries else since,
+        }
 
     @staticmethod
     def fetch(task_id):
-        """look up progress by task_id"""
-        redis = Redis()
-        result = redis.hget('taskprogress', task_id)
-        if result:
-            return json.loads(result)
-        return None
+        """look up all the progress by task_id, or None for an unknown task"""
+        result = TaskProgress.read(task_id)
+        return result["progress"] if result else None
+
+    @staticmethod
+    def wait(task_id, since: str = None, timeout: int = 25):
+        """
+        like read, but if there are no steps after `since` it blocks for up to
+        `timeout` seconds until the task adds one
+        """
+        redis = RedisClient.get_instance()
+        key = TaskProgress.key(task_id)
+        # XREAD returns straight away if there are entries after since
+        streams = redis.xread({key: since or "0-0"}, block=timeout * 1000)
+        if streams:
+            entries = streams[0][1]
+            return {
+                "progress": TaskProgress.parse(entries),
+                "next": entries[-1][0].decode("utf-8"),
+            }
+        if not redis.exists(key):
+            return None
+        return {"progress": [], "next": since}
@@ -0,0 +1,130 @@
+"""an in-process LRU cache in front of redis"""
+import os
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from redis.exceptions import RedisError
+
+from ddpui.utils.ddp_logger import logger
+from ddpui.utils.redis_client import RedisClient
+
+# how long a process keeps using a scope's version before asking redis again
+TIEREDCACHE_VERSION_TTL = float(os.getenv("TIEREDCACHE_VERSION_TTL") or 5)
+
+
+class TieredCache:
+    """
+    caches json-serializable values in redis, and keeps the most recently used
+    ones already decoded in this process' memory
+
+    every entry belongs to a scope (e.g. an airbyte workspace). invalidating a
+    scope bumps a version counter in redis which is part of every key in that
+    scope, so that all processes stop serving the old entries and the old redis
+    keys are left to expire. each process remembers a scope's version for
+    version_ttl seconds, so that a hit in memory makes no request to redis;
+    other processes see an invalidation within that time
+
+    values served from memory are shared between callers and must not be mutated
+    """
+
+    def __init__(
+        self,
+        namespace: str,
+        ttl: int,
+        maxsize: int,
+        version_ttl: float = TIEREDCACHE_VERSION_TTL,
+    ) -> None:
+        self.namespace = namespace
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.version_ttl = version_ttl
+        self._local = OrderedDict()
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def _version(self, scope: str) -> str:
+        """the current version of a scope, read from redis every version_ttl"""
+        with self._lock:
+            entry = self._versions.get(scope)
+        if entry is not None and entry[0] >= time.monotonic():
+            return entry[1]
+        version = RedisClient.get_instance().get(f"{self.namespace}:{scope}:version")
+        version = version.decode("utf-8") if version else "0"
+        self._set_version(scope, version)
+        return version
+
+    def _set_version(self, scope: str, version: str) -> None:
+        """remembers a scope's version for version_ttl seconds"""
+        with self._lock:
+            self._versions[scope] = (time.monotonic() + self.version_ttl, version)
+
+    def _local_get(self, rediskey: str):
+        """looks up an unexpired entry in the process-local LRU"""
+        with self._lock:
+            entry = self._local.get(rediskey)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._local[rediskey]
+                return None
+            self._local.move_to_end(rediskey)
+            return value
+
+    def _local_set(self, rediskey: str, value, ttl: float) -> None:
+        """adds an entry to the process-local LRU, evicting the oldest if full"""
+        with self._lock:
+            self._local[rediskey] = (time.monotonic() + ttl, value)
+            self._local.move_to_end(rediskey)
+            while len(self._local) > self.maxsize:
+                self._local.popitem(last=False)
+
+    def get_or_fetch(self, scope: str, key: str, fetch):
+        """
+        returns the cached value for key in scope, calling fetch() and caching
+        its result on a miss. if redis is unreachable the cache is bypassed.
+        the value may be shared with other callers, so it must not be mutated
+        """
+        try:
+            rediskey = f"{self.namespace}:{scope}:{self._version(scope)}:{key}"
+        except RedisError as error:
+            logger.warning("%s cache unavailable: %s", self.namespace, error)
+            return fetch()
+
+        value = self._local_get(rediskey)
+        if value is not None:
+            return value
+
+        try:
+            redis = RedisClient.get_instance()
+            cached = redis.get(rediskey)
+            if cached is not None:
+                value = json.loads(cached)
+                self._local_set(rediskey, value, max(redis.ttl(rediskey), 0))
+                return value
+        except RedisError as error:
+            logger.warning("%s cache unavailable: %s", self.namespace, error)
+            return fetch()
+
+        value = fetch()
+        try:
+            RedisClient.get_instance().set(rediskey, json.dumps(value), ex=self.ttl)
+        except RedisError as error:
+            logger.warning("%s cache unavailable: %s", self.namespace, error)
+            return value
+        self._local_set(rediskey, value, self.ttl)
+        return value
+
+    def invalidate(self, scope: str) -> None:
+        """drops every entry in scope, in all processes"""
+        try:
+            version = RedisClient.get_instance().incr(
+                f"{self.namespace}:{scope}:version"
+            )
+        except RedisError as error:
+            logger.error("could not invalidate %s:%s: %s", self.namespace, scope, error)
+            return
+        # this process stops serving the old entries straight away
+        self._set_version(scope, str(version))
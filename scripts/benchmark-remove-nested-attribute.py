@@ -0,0 +1,155 @@
+"""
+compares ddpui.utils.helpers.remove_nested_attribute against the recursive
+implementation it replaced
+
+run the script:
+    PYTHONPATH=. python scripts/benchmark-remove-nested-attribute.py
+                                --fixture sources-discover_schema.json
+                                --fixture source_definitions-list.json
+
+each --fixture is a saved airbyte response, e.g. captured with
+    curl -u airbyte:password -H "Content-Type: application/json" \\
+        -d '{"sourceId": "..."}' $AIRBYTE_URL/sources/discover_schema
+
+--skip-key names subtrees the third run does not search (jsonSchema by default)
+
+without any --fixture a synthetic discover catalog and definitions list,
+shaped like airbyte's, are generated instead
+"""
+import argparse
+import copy
+import json
+import sys
+import timeit
+
+from ddpui.utils.helpers import remove_nested_attribute
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--fixture", action="append", default=[])
+parser.add_argument("--repeat", type=int, default=20)
+parser.add_argument("--streams", type=int, default=200)
+parser.add_argument("--depth", type=int, default=5000)
+parser.add_argument("--skip-key", action="append", default=["jsonSchema"])
+args = parser.parse_args()
+
+
+def old_remove_nested_attribute(obj: dict, attr: str) -> dict:
+    """the recursive implementation, kept here for comparison"""
+    if attr in obj:
+        del obj[attr]
+
+    for key in obj:
+        assert key != attr
+        val = obj[key]
+
+        if isinstance(val, dict):
+            obj[key] = old_remove_nested_attribute(val, attr)
+
+        elif isinstance(val, list):
+            for list_idx, list_val in enumerate(val):
+                if isinstance(list_val, dict):
+                    val[list_idx] = old_remove_nested_attribute(list_val, attr)
+
+    return obj
+
+
+def synthetic_catalog(num_streams: int) -> dict:
+    """a discover_schema response with num_streams twenty-column streams"""
+    columns = {
+        f"column_{idx}": {
+            "type": ["null", "object"],
+            "properties": {
+                "value": {"type": ["null", "string"]},
+                "label": {"type": ["null", "string"], "format": "date-time"},
+            },
+        }
+        for idx in range(20)
+    }
+    streams = [
+        {
+            "stream": {
+                "name": f"stream_{idx}",
+                "jsonSchema": {"type": "object", "properties": copy.deepcopy(columns)},
+                "supportedSyncModes": ["full_refresh", "incremental"],
+                "defaultCursorField": [],
+                "sourceDefinedPrimaryKey": [["id"]],
+            },
+            "config": {
+                "syncMode": "full_refresh",
+                "cursorField": [],
+                "destinationSyncMode": "append",
+                "primaryKey": [["id"]],
+                "selected": True,
+            },
+        }
+        for idx in range(num_streams)
+    ]
+    return {
+        "catalog": {"streams": streams},
+        "jobInfo": {"id": "job-id", "succeeded": True, "logs": {"logLines": []}},
+        "catalogId": "catalog-id",
+    }
+
+
+def synthetic_definitions(num_definitions: int) -> dict:
+    """a list_for_workspace response with a 20kB icon per definition"""
+    return {
+        "sourceDefinitions": [
+            {
+                "sourceDefinitionId": f"definition-{idx}",
+                "name": f"Source {idx}",
+                "dockerRepository": f"airbyte/source-{idx}",
+                "dockerImageTag": "1.0.0",
+                "icon": "<svg>" + "x" * 20000 + "</svg>",
+                "releaseStage": "generally_available",
+                "resourceRequirements": {"default": {"cpu_request": "1"}},
+            }
+            for idx in range(num_definitions)
+        ]
+    }
+
+
+def deeply_nested(depth: int) -> dict:
+    """a json schema nested deeper than python's default recursion limit"""
+    obj = {"icon": "x"}
+    for _ in range(depth):
+        obj = {"type": "object", "properties": {"child": obj}}
+    return obj
+
+
+def bench(name: str, func, fixture) -> float:
+    """best time over args.repeat runs, each on a fresh copy of fixture"""
+    copies = [copy.deepcopy(fixture) for _ in range(args.repeat)]
+    times = timeit.repeat(lambda: func(copies.pop()), number=1, repeat=args.repeat)
+    best = min(times) * 1000
+    print(f"  {name:>8}: {best:8.2f} ms")
+    return best
+
+
+fixtures = {}
+for path in args.fixture:
+    with open(path, "r", encoding="utf-8") as fixture_file:
+        fixtures[path] = json.load(fixture_file)
+if not fixtures:
+    fixtures["synthetic catalog"] = synthetic_catalog(args.streams)
+    fixtures["synthetic definitions"] = synthetic_definitions(400)
+
+for fixture_name, fixture in fixtures.items():
+    print(f"{fixture_name} ({len(json.dumps(fixture)) // 1024} kB)")
+    old = bench("old", lambda obj: old_remove_nested_attribute(obj, "icon"), fixture)
+    new = bench("new", lambda obj: remove_nested_attribute(obj, "icon"), fixture)
+    skip = bench(
+        "new+skip",
+        lambda obj: remove_nested_attribute(obj, "icon", skip_keys=args.skip_key),
+        fixture,
+    )
+    print(f"  {'speedup':>8}: {old / new:8.2f}x, {old / skip:.2f}x skipping")
+
+print(f"nested {args.depth} levels deep")
+try:
+    old_remove_nested_attribute(deeply_nested(args.depth), "icon")
+    print(f"  {'old':>8}: ok")
+except RecursionError:
+    print(f"  {'old':>8}: RecursionError (limit {sys.getrecursionlimit()})")
+remove_nested_attribute(deeply_nested(args.depth), "icon")
+print(f"  {'new':>8}: ok")
@@ -5,6 +5,9 @@
 #     --error-logfile /home/ddp/DDP_backend/ddpui/logs/gunicorn-error.log \
 #     --access-logfile /home/ddp/DDP_backend/ddpui/logs/gunicorn-access.log
 
+# threaded workers, so that long polls on /api/tasks/{task_id}/wait
+# do not hold up other requests
 /home/ddp/DDP_backend/venv/bin/gunicorn -b localhost:8002 ddpui.wsgi \
+    --threads 8 \
     --capture-output \
     --log-config /home/ddp/DDP_backend/gunicorn-log.conf